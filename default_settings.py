@@ -8,6 +8,8 @@ from celery.schedules import crontab
 from os.path import abspath, dirname, basename, join
 
 from secrets import *
+from universal.site_settings import SiteID
+import version
 
 djcelery.setup_loader()
 
@@ -226,6 +228,10 @@ CELERYBEAT_SCHEDULE = {
         'task': 'tasks.update_solr_from_log',
         'schedule': crontab(hour='*/1'),
     },
+    'daily-autocomplete-update': {
+        'task': 'tasks.update_autocomplete',
+        'schedule': crontab(minute=0, hour=4),
+    },
     'morning-sitemap-ping': {
         'task': 'tasks.submit_all_sitemaps',
         'schedule': crontab(hour=13, minute=0)
@@ -424,13 +430,18 @@ FIXTURE_DIRS = (
 )
 
 
-# Default site settings
-SITE_ID = 1
+# Default site settings. MultiHostMiddleware overrides these for each request
+# through universal.site_settings; SITE_ID follows the override.
+SITE_ID = SiteID(default=1)
 SITE_NAME = ""
 SITE_BUIDS = []
 SITE_PACKAGES =[]
 DEFAULT_FACET = ""
 
+VERSION = version.marketing_version
+BUILD = version.build_calculated
+FULL_VERSION = version.release_number
+
 DEFAULT_PAGE_SIZE = 40
 DEFAULT_SORT_DIRECTION = '-num_jobs'
 SLUG_TAG_PARSING_REGEX = re.compile('([/\w\(\)-]+?)/(jobs|jobs-in|new-jobs|'
@@ -464,6 +475,13 @@ FEED_VIEW_SOURCES = {
     'indeed': 27,
     'sitemap': 28,
 }
+# Number of jobs read from Solr per request when building a syndication
+# feed. Feeds of more jobs than this are streamed a page at a time, and so
+# aren't page cached.
+FEED_PAGE_SIZE = 100
+
+# Number of saved search feeds tasks.send_search_digests downloads at once.
+SAVED_SEARCH_FEED_WORKERS = 10
 
 # Solr/Haystack
 HAYSTACK_LIMIT_TO_REGISTERED_MODELS = False
@@ -472,6 +490,26 @@ TEST_SOLR_INSTANCE = {
     'all': 'http://127.0.0.1:8983/solr/myjobs_test/',
     'current': 'http://127.0.0.1:8983/solr/myjobs_test_current/'
 }
+# Number of processes used to transform HR-XML jobs during a job source
+# import (import_jobs.update_job_source). 1 transforms them in the worker
+# itself.
+JOB_TRANSFORM_PROCESSES = 1
+# Number of concurrent update requests, and the approximate maximum size in
+# bytes of each one, used when sending jobs to Solr (import_jobs.solr_writer).
+SOLR_WRITER_THREADS = 4
+SOLR_WRITER_BATCH_BYTES = 1024 * 1024 * 4
+# Filter queries on at least this many business units are sent with Solr's
+# terms query parser (Solr 4.10+) instead of as a boolean query. None always
+# uses boolean queries.
+SOLR_TERMS_FILTER_MIN_VALUES = None
+# Seconds it takes for updates to the Solr master to reach the slaves that
+# serve searches. Caches of a business unit's jobs are cleared this long
+# after its jobs are imported.
+SOLR_REPLICATION_DELAY = 60 * 25
+# Whether imports and the daily sitemap task build sites' sitemap files
+# (see seo.sitemap.build_site_sitemaps) and submit the changed ones to
+# Google.
+BUILD_SITEMAPS = True
 
 
 # Caching
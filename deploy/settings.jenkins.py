@@ -40,6 +40,8 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 JENKINS_TEST_RUNNER = 'silent_testrunner.SilentTestRunner'
 TEST_SOLR_INSTANCE = SOLR
 CELERY_ALWAYS_EAGER = True
+# Tests build sitemaps themselves, without submitting them to Google
+BUILD_SITEMAPS = False
 
 CC_AUTH = TESTING_CC_AUTH
 
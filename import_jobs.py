@@ -2,23 +2,26 @@ import json
 import os
 import sys
 import urllib
-import datetime
 import logging
-from itertools import izip_longest
+from itertools import islice
 import urllib2
 import base64
+import hashlib
 import zipfile
-import shutil
+import tempfile
+from collections import deque
 
 from slugify import slugify
 from lxml import etree
 from django.conf import settings
-from django.db import IntegrityError
-from billiard import current_process
-
-from seo_pysolr import Solr
-from xmlparse import DEv2JobFeed
-from seo.helpers import slices, create_businessunit
+from django.db import IntegrityError, connections
+from django.utils import timezone
+from billiard import Pool, current_process
+import pysolr
+
+from seo_pysolr import Solr, SolrWriter
+from xmlparse import DEv2JobFeed, MocResolver
+from seo.helpers import create_businessunit
 from seo.models import BusinessUnit, Company
 import tasks
 from transform import hr_xml_to_json, make_redirect
@@ -32,10 +35,17 @@ sys.path.insert(0, os.path.join(BASE_DIR))
 sys.path.insert(0, os.path.join(BASE_DIR, '../'))
 os.environ['DJANGO_SETTINGS_MODULE'] = 'directseo.settings'
 FEED_FILE_PREFIX = "dseo_feed_"
+# Fields of a solr-ready job that are not part of its content hash.
+CONTENT_HASH_EXCLUDED_FIELDS = ('content_hash', 'salted_date')
+# JobsFS archives larger than this many bytes are spooled to a temporary
+# file instead of being held in memory.
+ZIPFILE_SPOOL_SIZE = 1024 * 1024 * 64
 
 
 def update_job_source(guid, buid, name, clear_cache=False):
-    """Composed method for resopnding to a guid update."""
+    """Composed method for resopnding to a guid update.
+
+    Returns the counts reported by sync_solr_jobs."""
 
     logger.info("Updating Job Source %s", guid)
     # Make the BusinessUnit and Company
@@ -47,21 +57,111 @@ def update_job_source(guid, buid, name, clear_cache=False):
 
     # Lookup the jobs, filter then, transform them, and then load the jobs
     zf = get_jobsfs_zipfile(guid)
-    jobs = get_jobs_from_zipfile(zf, guid)
-    jobs = filter_current_jobs(jobs, bu)
-    jobs = [hr_xml_to_json(job, bu) for job in jobs]
-    for job in jobs:
-        job['link'] = make_redirect(job, bu).make_link()
-    add_jobs(jobs)
-    remove_expired_jobs(buid, jobs)
+    job_files = get_job_files_from_zipfile(zf, guid)
+    moc_resolver = MocResolver(bu.id)
+    jobs = transform_jobs(job_files, bu, moc_resolver)
+
+    jobs = _add_redirect_links(jobs, bu)
+    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
+    solr_hashes = solr_content_hashes(conn, buid, key='id')
+    counts = sync_solr_jobs(buid, jobs, solr_hashes, key='id')
 
     # Update business information
-    bu.associated_jobs = len(jobs)
-    bu.date_updated = datetime.datetime.utcnow()
+    bu.associated_jobs = (counts['added'] + counts['changed'] +
+                          counts['unchanged'])
+    bu.date_updated = timezone.now()
     bu.save()
     if clear_cache:
-        # Clear cache in 25 minutes to allow for solr replication
-        tasks.task_clear_bu_cache.delay(buid=bu.id, countdown=1500)
+        # Clear cache once the jobs have been replicated to the Solr slaves
+        tasks.task_clear_bu_cache.delay(
+            buid=bu.id, countdown=settings.SOLR_REPLICATION_DELAY)
+    return counts
+
+
+def _add_redirect_links(jobs, bu):
+    """Point the link of each job at a (new or updated) redirect."""
+    for job in jobs:
+        job['link'] = make_redirect(job, bu).make_link()
+        yield job
+
+
+def transform_jobs(job_files, bu, moc_resolver=None, processes=None,
+                   chunk_size=16):
+    """
+    Parses, filters and transforms the HR-XML job documents of a job source
+    into solr-ready jobs, spreading the work across a pool of processes.
+
+    Inputs:
+        :job_files: An iterable of HR-XML documents, as strings.
+        :bu: The BusinessUnit these jobs are associated with.
+        :moc_resolver: An optional MocResolver for `bu`, shared by the
+            worker processes.
+        :processes: The size of the process pool. Defaults to
+            settings.JOB_TRANSFORM_PROCESSES. With a single process the
+            jobs are transformed in this process.
+        :chunk_size: The number of documents sent to a worker at once.
+
+    Returns: a generator of solr-ready jobs, in the same order as
+    `job_files`. Jobs removed by filter_current_jobs are skipped. At most
+    two chunks per process are in flight at any time, so memory use does
+    not grow with the size of the job source.
+    """
+    if processes is None:
+        processes = getattr(settings, 'JOB_TRANSFORM_PROCESSES', 1)
+
+    if processes <= 1:
+        for job in _transform_job_files(job_files, bu, moc_resolver):
+            yield job
+        return
+
+    # Load the MOC mappings once so that every worker inherits them.
+    if moc_resolver is not None:
+        moc_resolver.ensure_loaded()
+    # Forked workers must not share this process' database connections.
+    # They are reopened on demand by each process.
+    for conn in connections.all():
+        conn.close()
+
+    pool = Pool(processes, initializer=_init_transform_worker,
+                initargs=(bu, moc_resolver))
+    try:
+        pending = deque()
+        for job_group in iter_chunks(job_files, chunk_size):
+            pending.append(pool.apply_async(_transform_worker, (job_group, )))
+            if len(pending) >= processes * 2:
+                for job in pending.popleft().get():
+                    yield job
+        while pending:
+            for job in pending.popleft().get():
+                yield job
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+# State of a transform_jobs worker process, set by _init_transform_worker.
+_worker_bu = None
+_worker_moc_resolver = None
+
+
+def _init_transform_worker(bu, moc_resolver):
+    global _worker_bu, _worker_moc_resolver
+    _worker_bu = bu
+    _worker_moc_resolver = moc_resolver
+
+
+def _transform_worker(job_files):
+    return list(_transform_job_files(job_files, _worker_bu,
+                                     _worker_moc_resolver))
+
+
+def _transform_job_files(job_files, bu, moc_resolver=None):
+    jobs = (etree.fromstring(job_file) for job_file in job_files)
+    for job in filter_current_jobs(jobs, bu):
+        yield hr_xml_to_json(job, bu, moc_resolver)
 
 
 def filter_current_jobs(jobs, bu):
@@ -109,56 +209,60 @@ def get_jobs_from_zipfile(zipfileobject, guid):
     Input:
         :guid: A guid used to access the jobsfs server.
     :return: [lxml.eTree, lxml.eTree,...]"""
-    logger.debug("Getting current Jobs for guid: %s", guid)
-
-
-    # Get current worker process id, to prevent race conditions.
-    try:
-        p = current_process()
-        process_id =  p.index
-    except AttributeError:
-        process_id = 0
+    for job_file in get_job_files_from_zipfile(zipfileobject, guid):
+        yield etree.fromstring(job_file)
 
 
-    # Delete any existing data and use the guid to create a unique folder.
-    directory = "/tmp/%s/%s" % (process_id, guid)
-    prefix =  os.path.commonprefix(['/tmp/%s' % process_id, os.path.abspath(directory)])
-    assert prefix == '/tmp/%s' % process_id, "Directory should be located in /tmp/%s" % process_id
+def get_job_files_from_zipfile(zipfileobject, guid):
+    """Get the unparsed xml documents representing all the current jobs.
 
-    if os.path.exists(directory):
-        shutil.rmtree(directory)
-    os.makedirs(directory)
+    Input:
+        :guid: A guid used to access the jobsfs server.
+    :return: A generator of strings, one per job."""
+    logger.debug("Getting current Jobs for guid: %s", guid)
 
-    # Write zipfile to filesystem
-    filename = os.path.join(directory, '%s.zip' % guid)
-    with open(filename, 'wb') as f:
+    # Spool the download into memory (or a temporary file, for very large
+    # job sources) and read each job straight out of the archive rather than
+    # extracting it to disk.
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIPFILE_SPOOL_SIZE)
+    try:
         for chunk in iter(lambda: zipfileobject.read(1024 * 16), ''):
-            f.write(chunk)
+            spool.write(chunk)
+        spool.seek(0)
 
-    # Extact all files from zipfile.
-    # Note: Using try/finally because zipfile doesn't support context managers
-    #       until python 2.7.  Upon migration to python 2.7, can be replaced.
-    zf = zipfile.ZipFile(filename)
-    try:
-        zf.extractall(directory)
+        zf = zipfile.ZipFile(spool)
+        try:
+            # Only the files directly inside the active directory are jobs.
+            active_directory = 'ActiveDirectory_%s/' % guid
+            members = []
+            folders = set()
+            for info in zf.infolist():
+                if not info.filename.startswith(active_directory):
+                    continue
+                name = info.filename[len(active_directory):]
+                if not name:
+                    continue
+                if '/' in name:
+                    folder = name.split('/')[0]
+                    if folder not in folders:
+                        folders.add(folder)
+                        logger.warn("Found folder '%s' inside active jobs for "
+                                    "JSID: %s", folder, guid)
+                    continue
+                members.append(info)
+
+            logger.info("Found %s jobs for guid %s", len(members), guid)
+            for info in members:
+                member = zf.open(info)
+                try:
+                    yield member.read()
+                finally:
+                    member.close()
+        finally:
+            zf.close()
     finally:
-        zf.close()
-
-    # Process the files.
-    active_directory = os.path.join(directory, 'ActiveDirectory_%s' % guid)
-    files = os.listdir(active_directory)
-    logger.info("Found %s jobs for guid %s", len(files), guid)
-    for f in files:
-        path = os.path.join(active_directory, f)
-        if os.path.isdir(path):
-            logger.warn("Found folder '%s' inside active jobs for JSID: %s",
-                        f, guid)
-            continue
-        with open(path) as _f:
-            yield etree.fromstring(_f.read())
+        spool.close()
 
-    # clean up after ourselves.
-    shutil.rmtree(directory)
 
 class FeedImportError(Exception):
     def __init__(self, msg):
@@ -252,13 +356,14 @@ def update_solr(buid, download=True, force=True, set_title=False,
     :download: Boolean. If False, this process will not download a new
     feedfile, but instead use the one on disk. Should only be false for
     the purposes of our test suite.
-    :force: Boolean. If True, every job seen in the feed file will be
-    updated in the index. Otherwise, only the jobs seen in the feed file
-    but not seen in the index will be updated. This latter option will
-    soon be deprecated.
+    :force: Boolean. If True, every job seen in the feed file that is
+    not in the index, or whose content has changed, will be updated in the
+    index. Otherwise, only the jobs seen in the feed file but not seen in
+    the index will be updated. This latter option will soon be deprecated.
 
     Returns:
-    A 2-tuple consisting of the number of jobs added and the number deleted.
+    A 2-tuple consisting of the number of jobs added or changed and the
+    number deleted. The full counts are logged by sync_solr_jobs.
 
     Writes/Modifies:
     Job data found in the feed file is used to modify the Solr index. This
@@ -283,8 +388,10 @@ def update_solr(buid, download=True, force=True, set_title=False,
         co = bu.company_set.all()[0]
     except IndexError:
         co = None
+    # Parse the feed in streaming mode so that neither the XML document nor
+    # the full list of Solr documents is ever held in memory at once.
     jobfeed = DEv2JobFeed(filepath, jsid=buid, markdown=bu.enable_markdown,
-                          company=co)
+                          company=co, stream=True)
     # If the feed file did not pass validation, return. The return value is
     # '(0, 0)' to match what's returned on a successful parse.
     if jobfeed.errors:
@@ -297,117 +404,190 @@ def update_solr(buid, download=True, force=True, set_title=False,
     # A dictionary of uids
     jobs = jobfeed.jobparse()
 
-    # Build a set of all the UIDs for all those instances.
-    job_uids = set([long(i.get('uid')) for i in jobs if i.get('uid')])
     conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-    step1 = 1024
-
-    # Get the count of all the results in the Solr index for this BUID.
-    hits = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                       mlt="false").hits
-    # Create (start-index, stop-index) tuples to facilitate handling results
-    # in ``step1``-sized chunks. So if ``hits`` returns 2048 results,
-    # ``job_slices`` will look like ``[(0,1024), (1024, 2048)]``. Those
-    # values are then used to slice up the total results.
+
+    # The (uid -> content hash) of every job for this BUID currently in the
+    # Solr index. Only the jobs in the feed file that are new or whose
+    # content differs from what is indexed are sent to Solr, and only the
+    # jobs missing from the feed file are deleted.
+    solr_hashes = solr_content_hashes(conn, buid, key='uid')
+
+    # When ``force`` is False, jobs that are already in the index are left
+    # alone even if they have changed; only new documents are added. This
+    # latter option will soon be deprecated.
     #
-    # This was put in place because part of the logic to figuring out what
-    # jobs to delete from and add jobs to the Solr index is using set
-    # algebra. We convert the total list of UIDs in the index and the UIDs
-    # in the XML feed to sets, then compare them via ``.difference()``
-    # (seen below). However for very large feed files, say 10,000+ jobs,
-    # this process was taking so long that the connection would time out. To
-    # address this problem we break up the comparisons as described above.
-    # This results in more requests but it alleviates the connection timeout
-    # issue.
-    job_slices = slices(range(hits), step=step1)
-    results = [_solr_results_chunk(tup, buid, step1) for tup in job_slices]
-    solr_uids = reduce(lambda x, y: x | y, results) if results else set()
-    # Return the job UIDs that are in the Solr index but not in the feed
-    # file.
-    solr_del_uids = solr_uids.difference(job_uids)
-
-    if not force:
-        # Return the job UIDs that are in the feed file but not in the Solr
-        # index.
-        solr_add_uids = job_uids.difference(solr_uids)
-        # ``jobfeed.solr_jobs()`` yields a list of dictionaries. We want to
-        # filter out any dictionaries whose "uid" key is not in
-        # ``solr_add_uids``. This is because by default we only want to add
-        # new documents (which each ``solr_jobs()`` dictionary represents),
-        # not update.
-        add_docs = filter(lambda x: int(x.get("uid", 0)) in solr_add_uids,
-                          jobfeed.solr_jobs())
-    else:
-        # This might seem redundant to refer to the same value
-        # twice with two different variable names. However, this decision
-        # was made during the implementation of the "force Solr update"
-        # feature to this function.
-        #
-        # Instead of adding only the documents with UIDs that are in the feed
-        # file but not in the Solr index, we're going to add ALL the documents
-        # in the feed file. This will add the new documents of course, but it
-        # will also update existing documents with any new data. Uniqueness of
-        # the documents is ensured by the ``id`` field defined in the Solr
-        # schema (the template for which can be seen in
-        # templates/search_configuration/solr.xml). At the very bottom you'll
-        # see <uniqueKey>id</uniqueKey>. This serves as the equivalent of the pk
-        # (i.e. globally unique) in a database.
-        solr_add_uids = job_uids
-        add_docs = jobfeed.solr_jobs()
-
-    # Slice up ``add_docs`` in chunks of 4096. This is because the
-    # maxBooleanClauses setting in solrconfig.xml is set to 4096. This means
-    # if we used any more than that Solr would throw an error and our
-    # updates wouldn't get processed.
-    add_steps = slices(range(len(solr_add_uids)), step=4096)
-    # Same concept as ``add_docs``.
-    del_steps = slices(range(len(solr_del_uids)), step=4096)
-    # Create a generator that yields 2-tuples with each invocation. The
-    # 2-tuples consist of one tuple each from del_steps & add_steps. Any
-    # mismatched values (e.g. there are more del_steps than add_steps)
-    # will be compensated for with the ``fillvalue``.
-    zipped_steps = izip_longest(del_steps, add_steps, fillvalue=(0, 0))
-
-    for tup in zipped_steps:
-        update_chunk = add_docs[tup[1][0]:tup[1][1] + 1]
-
-        if update_chunk:
-            logging.debug("BUID:%s - SOLR - Update chunk: %s" %
-                         (buid, [i['uid'] for i in update_chunk]))
-            # Pass 'commitWithin' so that Solr doesn't try to commit the new
-            # docs right away. This will help relieve some of the resource
-            # stress during the daily update. The value is expressed in
-            # milliseconds.
-            conn.add(update_chunk, commitWithin="30000")
-
-        delete_chunk = _build_solr_delete_query(
-            list(solr_del_uids)[tup[0][0]:tup[0][1] + 1])
-
-        if delete_chunk:
-            # Post-a-job jobs should not be deleted during import
-            delete_chunk = "(%s) AND -is_posted:true" % delete_chunk
-            logging.debug("BUID:%s - SOLR - Delete chunk: %s" %
-                         (buid, list(solr_del_uids)))
-            conn.delete(q=delete_chunk)
+    # Uniqueness of the documents is ensured by the ``id`` field defined in
+    # the Solr schema (the template for which can be seen in
+    # templates/search_configuration/solr.xml). At the very bottom you'll
+    # see <uniqueKey>id</uniqueKey>. This serves as the equivalent of the pk
+    # (i.e. globally unique) in a database, so adding a changed document
+    # replaces the one in the index.
+    #
+    # Pass 'commitWithin' so that Solr doesn't try to commit the new
+    # docs right away. This will help relieve some of the resource
+    # stress during the daily update. The value is expressed in
+    # milliseconds.
+    counts = sync_solr_jobs(buid, jobfeed.iter_solr_jobs(), solr_hashes,
+                            key='uid', update_existing=force,
+                            commitWithin="30000")
 
     #Update business unit information: title, dates, and associated_jobs
     if set_title or not bu.title or (bu.title != jobfeed.job_source_name and
                                      jobfeed.job_source_name):
         bu.title = jobfeed.job_source_name
-    updated = bool(solr_add_uids) or bool(solr_del_uids)
+    num_added = counts['added'] + counts['changed']
+    updated = bool(num_added) or bool(counts['deleted'])
     _update_business_unit_modified_dates(bu, jobfeed.crawled_date,
                                          updated=updated)
     bu.associated_jobs = len(jobs)
     bu.save()
     if clear_cache:
-        # Clear cache in 25 minutes to allow for solr replication
-        tasks.task_clear_bu_cache.delay(buid=bu.id, countdown=1500)
+        # Clear cache once the jobs have been replicated to the Solr slaves
+        tasks.task_clear_bu_cache.delay(
+            buid=bu.id, countdown=settings.SOLR_REPLICATION_DELAY)
     #Update the Django database to reflect company additions and name changes
     add_company(bu)
     if delete_feed:
         os.remove(filepath)
         logging.info("BUID:%s - Deleted feed file." % buid)
-    return len(solr_add_uids), len(solr_del_uids)
+    return num_added, counts['deleted']
+
+
+def content_hash(job):
+    """
+    Returns a hash of the content of a solr-ready job. Fields that change
+    every time a job is transformed, such as salted_date, are not part of
+    the hash.
+
+    """
+    content = dict((k, v) for k, v in job.iteritems()
+                   if k not in CONTENT_HASH_EXCLUDED_FIELDS)
+    return hashlib.md5(json.dumps(content, sort_keys=True,
+                                  default=unicode)).hexdigest()
+
+
+def solr_content_hashes(conn, buid, key='uid'):
+    """
+    Gets the content hash of every job for a business unit in the Solr
+    index, in a single cursor-paged pass.
+
+    Inputs:
+        :conn: A Solr connection.
+        :buid: The id of the business unit.
+        :key: The field identifying a job, 'uid' or 'id'.
+
+    Returns:
+        A dictionary of {unicode(<key>): <content hash>}. Jobs indexed
+        before content hashes existed have a hash of None.
+    """
+    docs = _iter_buid_docs(conn, buid, fl="%s,content_hash" % key)
+    return dict((unicode(doc[key]), doc.get('content_hash'))
+                for doc in docs if key in doc)
+
+
+def solr_uids(conn, buid, key='uid'):
+    """
+    Gets the uid (or any other identifying field) of every job for a
+    business unit in the Solr index.
+
+    Only `key` is fetched, and the results are paged through with Solr's
+    cursorMark, so this takes linear time however many jobs the business
+    unit has.
+
+    Inputs:
+        :conn: A Solr connection.
+        :buid: The id of the business unit.
+        :key: The field identifying a job, 'uid' or 'id'.
+
+    Returns:
+        A set of the values of `key`.
+    """
+    docs = _iter_buid_docs(conn, buid, fl=key)
+    return set(doc[key] for doc in docs if key in doc)
+
+
+def _iter_buid_docs(conn, buid, fl, rows=1024):
+    return conn.iter_search("*:*", fq="buid:%s" % buid, fl=fl, rows=rows,
+                            facet="false", mlt="false")
+
+
+def sync_solr_jobs(buid, jobs, solr_hashes, key='uid', update_existing=True,
+                   **kwargs):
+    """
+    Brings the Solr index up to date with the current jobs of a business
+    unit, sending only the jobs that are new or have changed.
+
+    Inputs:
+        :buid: The id of the business unit.
+        :jobs: An iterable of all of the business unit's solr-ready jobs.
+        :solr_hashes: The result of solr_content_hashes for the business unit.
+        :key: The field identifying a job, 'uid' or 'id'.
+        :update_existing: If False, jobs already in the index are never
+            updated, whether or not they have changed.
+        :kwargs: Passed on to solr_writer.
+
+    Returns:
+        A dictionary with the number of jobs 'added', 'changed',
+        'unchanged', 'deleted' and 'failed' (rejected by Solr).
+
+    Writes/Modifies:
+        Jobs in the index that are not in `jobs` are deleted, except for
+        post-a-job jobs.
+    """
+    counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
+    seen = set()
+
+    def changed_jobs():
+        for job in jobs:
+            job['content_hash'] = content_hash(job)
+            job_key = unicode(job[key])
+            seen.add(job_key)
+            if job_key not in solr_hashes:
+                counts['added'] += 1
+            elif (update_existing and
+                    solr_hashes[job_key] != job['content_hash']):
+                counts['changed'] += 1
+            else:
+                counts['unchanged'] += 1
+                continue
+            yield job
+
+    with solr_writer(**kwargs) as writer:
+        writer.add(changed_jobs())
+
+        deleted = [job_key for job_key in solr_hashes if job_key not in seen]
+        for del_keys in chunk(deleted, 4096):
+            delete_chunk = _build_solr_delete_query(del_keys, key)
+            # Post-a-job jobs should not be deleted during import
+            delete_chunk = "(%s) AND -is_posted:true" % delete_chunk
+            logging.debug("BUID:%s - SOLR - Delete chunk: %s" %
+                          (buid, del_keys))
+            writer.delete(q=delete_chunk)
+    counts['deleted'] = len(deleted)
+    counts['failed'] = len(writer.failed_docs)
+
+    logging.info("BUID:%s - SOLR - %s added, %s changed, %s unchanged, "
+                 "%s deleted, %s failed" % (buid, counts['added'],
+                                            counts['changed'],
+                                            counts['unchanged'],
+                                            counts['deleted'],
+                                            counts['failed']))
+    return counts
+
+
+def solr_writer(**kwargs):
+    """
+    Returns a SolrWriter for the default Solr index, configured by
+    settings.SOLR_WRITER_THREADS and settings.SOLR_WRITER_BATCH_BYTES.
+    Any kwargs are passed on to SolrWriter.
+
+    """
+    kwargs.setdefault('threads', getattr(settings, 'SOLR_WRITER_THREADS', 4))
+    kwargs.setdefault('max_batch_bytes',
+                      getattr(settings, 'SOLR_WRITER_BATCH_BYTES',
+                              4 * 1024 * 1024))
+    return SolrWriter(settings.HAYSTACK_CONNECTIONS['default']['URL'],
+                      **kwargs)
 
 
 def clear_solr(buid):
@@ -419,19 +599,6 @@ def clear_solr(buid):
     logging.info("BUID:%s - SOLR - All jobs deleted." % buid)
 
 
-def _solr_results_chunk(tup, buid, step):
-    """
-    Takes a (start_index, stop_index) tuple and gets the results in that
-    range from the Solr index.
-
-    """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-    results = conn.search("*:*", fq="buid:%s" % buid, fl="uid",
-                          rows=step, start=tup[0], facet="false",
-                          mlt="false").docs
-    return set([i['uid'] for i in results if 'uid' in i])
-
-
 def _job_filter(job):
     if job.uid:
         return long(job.uid)
@@ -496,7 +663,7 @@ def _update_business_unit_modified_dates(business_unit, crawled_date,
     if crawled_date:
         business_unit.date_crawled = crawled_date
     if updated:
-        business_unit.date_updated = datetime.datetime.utcnow()
+        business_unit.date_updated = timezone.now()
     return business_unit
 
 
@@ -563,9 +730,10 @@ def generate_feed_url(buid, task=None):
     return the_url
 
 
-def _build_solr_delete_query(old_jobs):
+def _build_solr_delete_query(old_jobs, key='uid'):
     if old_jobs:
-        delete_query = ("uid:(%s)" % " OR ".join([str(x) for x in old_jobs]))
+        delete_query = ("%s:(%s)" % (key, " OR ".join([str(x) for x in
+                                                       old_jobs])))
     else:
         delete_query = None
 
@@ -581,18 +749,28 @@ def chunk(l, chunk_size=1024):
         yield l[i:i + chunk_size]
 
 
+def iter_chunks(iterable, chunk_size=1024):
+    """
+    Create list chunks from any iterable, including generators, without
+    consuming more than ``chunk_size`` items at a time.
+
+    """
+    iterator = iter(iterable)
+    while True:
+        group = list(islice(iterator, chunk_size))
+        if not group:
+            break
+        yield group
+
+
 def remove_expired_jobs(buid, active_jobs, upload_chunk_size=1024):
     """
     Given a job source id and a list of active jobs for that job source,
     Remove the jobs on solr that are not among the active jobs.
     """
     conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
-    count = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                                      mlt="false").hits
-    old_jobs = conn.search("*:*", fq="buid:%s" % buid, facet="false",
-                           rows=count, mlt="false").docs
     active_ids = set(j['id'] for j in active_jobs)
-    old_ids = set(j['id'] for j in old_jobs)
+    old_ids = solr_uids(conn, buid, key='id')
     expired = old_ids - active_ids
     chunks = chunk(list(expired), upload_chunk_size)
     for jobs in chunks:
@@ -610,22 +788,23 @@ def add_jobs(jobs, upload_chunk_size=1024):
 
     outputs:
         The number of jobs loaded into solr.
+
+    Raises a SolrError if Solr rejects any of the jobs.
     """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
     num_jobs = len(jobs)
-    # AT&T Showed that large numbers of MOCs can cause import issues due to the size of documents.
-    # Therefore, when processing AT&T lower the document chunk size.
     for job in jobs:
-        if int(job.get('buid', 0)) == 19389:
-            logger.warn("AT&T has large amounts of mapped_mocs, that cause problems.  Reducing chunk size.")
-            upload_chunk_size = 64
-            break
-            
-    
-    # Chunk them
-    jobs = chunk(jobs, upload_chunk_size)
-    for job_group in jobs:
-        conn.add(list(job_group))
+        job['content_hash'] = content_hash(job)
+
+    # The writer batches the jobs by size, so jobs with very large
+    # documents (e.g. many mapped_mocs) are sent in smaller batches.
+    with solr_writer(max_batch_docs=upload_chunk_size) as writer:
+        writer.add(jobs)
+    if writer.failed_docs:
+        raise pysolr.SolrError(
+            "Solr rejected %s of %s jobs: %s" % (
+                len(writer.failed_docs), num_jobs,
+                ", ".join(unicode(doc.get('id'))
+                          for doc in writer.failed_docs)))
     return num_jobs
 
 
@@ -641,12 +820,12 @@ def delete_by_guid(guids):
         be higher than the number of actual jobs deleted if a guid
         passed in did not correspond to a job in solr.
     """
-    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
     if not guids:
         return 0
     num_guids = len(guids)
     guids = chunk(guids)
-    for guid_group in guids:
-        delete_str = " OR ".join(guid_group)
-        conn.delete(q="guid: (%s)" % delete_str)
+    with solr_writer() as writer:
+        for guid_group in guids:
+            delete_str = " OR ".join(guid_group)
+            writer.delete(q="guid: (%s)" % delete_str)
     return num_guids
@@ -5,13 +5,10 @@ from django import http
 from django.core.urlresolvers import reverse
 from django.utils.timezone import activate
 from django.conf import settings
-from django.contrib.sites.models import Site
-from django.core.cache import cache
 from django.shortcuts import redirect
 
-from postajob.models import SitePackage
-from seo.models import SeoSite, SeoSiteRedirect, SeoSiteFacet
-import version
+from seo.models import SeoSiteRedirect
+from seo.site_context import activate_site_context, get_site_context
 
 
 if settings.NEW_RELIC_TRACKING:
@@ -164,10 +161,9 @@ class MultiHostMiddleware:
     def process_request(self, request):
         """
         get the host name
-        see if we have the settings for the site cached
-            - if so, load those
-            - if not, grab them from that database
-                - store them in cache
+        load the site context for that host (see seo.site_context)
+        make it the site settings for this request (see
+            universal.site_settings)
 
         """
         host = None
@@ -182,104 +178,7 @@ class MultiHostMiddleware:
         #             127.0.0.1:8000,
         #             find.ibm.jobs:80
         host = host.split(":")[0]
-        site_cache_key = '%s:SeoSite' % host
-        MINUTES_TO_CACHE = getattr(settings, 'MINUTES_TO_CACHE', 120)
-        ## REMINDER: make domain a unique field on site model
-        # see if the cache has it
-        my_site = cache.get(site_cache_key)
-        if not my_site:
-            #DO NOT add filters to prefetched objects. Use only with .all()
-            sites = SeoSite.objects.select_related('group',
-                                                   'microsite_carousel',
-                                                   'view_sources',
-                                                   ).prefetch_related('billboard_images',
-                                                                      'business_units',
-                                                                      'featured_companies',
-                                                                      'site_tags',
-                                                                      'google_analytics')
-            # the cache didn't have it, so lets get it and set the cache
-            try:
-                my_site = sites.get(domain=host)
-            except Site.MultipleObjectsReturned:
-                my_site = sites.filter(domain=host)[:1][0]
-            except Site.DoesNotExist:
-                my_site = sites.get(id=1)
-            cache.set(site_cache_key, my_site, MINUTES_TO_CACHE*60)
-        settings.SITE = my_site
-        my_buids = [bu.id for bu in my_site.business_units.all()]
-        settings.SITE_ID = my_site.id
-        settings.SITE_NAME = my_site.name
-        settings.SITE_BUIDS = my_buids
-        settings.SITE_TAGS = [tag.site_tag for tag in my_site.site_tags.all()]
-        # version information
-        settings.VERSION = version.marketing_version
-        settings.BUILD = version.build_calculated
-        settings.FULL_VERSION = version.release_number
-
-        # Place variables that need a non blank default value here
-        if my_site.site_title:  # title defaults to site name
-            settings.SITE_TITLE = my_site.site_title
-        else:
-            settings.SITE_TITLE = my_site.name
-        if my_site.site_heading:  # heading defaults to site name
-            settings.SITE_HEADING = my_site.site_heading
-        else:
-            settings.SITE_HEADING = my_site.name
-        if my_site.site_description:
-            settings.SITE_DESCRIPTION = my_site.site_description
-        else:
-            settings.SITE_DESCRIPTION = None
-
-        # Default variable loading. Assigns empty string as default
-        site_flags = {
-            'ats_source_codes': 'ATS_SOURCE_CODES',
-            'google_analytics_campaigns': 'GA_CAMPAIGN',
-            'special_commitments': 'COMMITMENTS',
-            'view_sources': 'VIEW_SOURCE'
-        }
-
-        for k, v in site_flags.items():
-            attr = getattr(my_site, k)
-            if attr:
-                setattr(settings, v, attr)
-            else:
-                setattr(settings, v, '')
-
-        site_facets = SeoSiteFacet.objects.filter(seosite=my_site)
-        site_facets = site_facets.select_related('customfacet')
-
-        settings.CACHE_MIDDLEWARE_KEY_PREFIX = "%s" % my_site.domain
-
-        default = SeoSiteFacet.DEFAULT
-        default_site_facets = site_facets.filter(facet_type=default)
-        settings.DEFAULT_FACET = custom_facets_ops_groups(default_site_facets)
-
-        featured = SeoSiteFacet.FEATURED
-        featured_site_facets = site_facets.filter(facet_type=featured)
-        settings.FEATURED_FACET = custom_facets_ops_groups(featured_site_facets)
-
-        standard = SeoSiteFacet.STANDARD
-        standard_site_facets = site_facets.filter(facet_type=standard)
-        settings.STANDARD_FACET = custom_facets_ops_groups(standard_site_facets)
-
-        packages = SitePackage.objects.filter(sites=my_site)
-        settings.SITE_PACKAGES = [int(site_package.pk)
-                                  for site_package in packages]
-
-
-def custom_facets_ops_groups(site_facets):
-    """
-    Returns a list of custom facets with boolean_operation attributes set
-    from site facets
-
-    """
-    custom_facets = []
-    for site_facet in site_facets:
-        custom_facet = site_facet.customfacet
-        setattr(custom_facet, 'boolean_operation', site_facet.boolean_operation)
-        setattr(custom_facet, 'facet_group', site_facet.facet_group)
-        custom_facets.append(custom_facet)
-    return custom_facets
+        activate_site_context(get_site_context(host))
 
 
 def filter_custom_facets_by_production_status(custom_facets):
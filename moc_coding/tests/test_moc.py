@@ -7,7 +7,7 @@ from seo.tests.setup import DirectSEOBase
 
 from moc_coding.tests.factories import (CustomCareerFactory, MocFactory,
                                         MocDetailFactory, OnetFactory)
-from xmlparse import DEv2JobFeed
+from xmlparse import DEv2JobFeed, MocResolver, get_mapped_mocs
 
 
 class MocTestCase(DirectSEOBase):
@@ -63,6 +63,33 @@ class MocTestCase(DirectSEOBase):
 
         self.assertEqual(len(mocs), 2)
 
+    def test_moc_resolver_matches_queries(self):
+        new_onet = OnetFactory(code="22222222")
+        CustomCareerFactory(object_id=1, onet_id="22222222")
+        new_moc = MocFactory(code="2")
+        new_moc.onets = [new_onet, self.onet]
+        new_moc.save()
+
+        file_path = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+                                 'dseo_feed_2.xml')
+        feed = DEv2JobFeed(file_path, jsid=self.mapping.object_id)
+        bu = BusinessUnit(id=self.mapping.object_id)
+        resolver = MocResolver(self.mapping.object_id)
+        resolver.load()
+
+        for onets in (['99999999', '22222222'], ['22222222'], []):
+            job = {'onet_code': onets}
+            mocs = feed.job_mocs(job)
+            with self.assertNumQueries(0):
+                resolver.moc_data(onets)
+            self.assertEqual(resolver.job_mocs(onets), mocs)
+            self.assertEqual(resolver.moc_data(onets), feed.moc_data(mocs))
+            self.assertItemsEqual(resolver.mapped_moc_data(onets).ids or [],
+                                  feed.mapped_mocs(mocs, job).ids or [])
+            self.assertItemsEqual(
+                get_mapped_mocs(bu, onets, resolver).ids or [],
+                get_mapped_mocs(bu, onets).ids or [])
+
     def test_authentication(self):
         #If user isn't logged in, redirect to login view
         resp = self.client.get('/mocmaps/newmap/?onet=99999999')
@@ -11,6 +11,7 @@ from seo import cache, helpers
 from seo.breadbox import Breadbox
 from seo.search_backend import DESearchQuerySet
 from seo.templatetags.job_setup import create_arranged_jobs
+from universal.site_settings import site_settings
 
 
 class Memoized(object):
@@ -79,6 +80,8 @@ def get_custom_facet_counts(request):
     site_config = get_site_config(request)
 
     if site_config.browse_facet_show:
+        # The custom facet counts are fetched and cached along with the jobs.
+        get_jobs_and_counts(request)
         cached_custom_facets = cache.get_custom_facets(request, filters=filters,
                                                        query_string=querystring)
 
@@ -130,7 +133,7 @@ def get_filters(request):
 
 @Memoized
 def get_google_analytics(request):
-    return settings.SITE.google_analytics.all()
+    return site_settings.SITE.google_analytics.all()
 
 @Memoized
 def get_job(request, job_id):
@@ -157,14 +160,11 @@ def get_jobs_and_counts(request):
     num_jobs = int(site_config.num_job_items_to_show) * 2
     percent_featured = site_config.percent_featured
 
-    args = (request, filters, num_jobs)
-    kwargs = {'fl': fl}
-    default_jobs, featured_jobs, facet_counts = helpers.jobs_and_counts(*args, **kwargs)
+    (default_jobs, total_default_jobs, featured_jobs, total_featured_jobs,
+     facet_counts) = cache.get_jobs_and_counts(request, filters, num_jobs,
+                                               fl=fl)
 
-    total_default_jobs = default_jobs.count()
-    total_featured_jobs = featured_jobs.count()
-
-    args = (featured_jobs.count(), default_jobs.count(), num_jobs,
+    args = (total_featured_jobs, total_default_jobs, num_jobs,
             percent_featured)
     featured_needed, default_needed, _, _ = helpers.featured_default_jobs(*args)
 
@@ -258,7 +258,7 @@ def get_search_url(request):
 
 @Memoized
 def get_site_commitments_string(request):
-    return helpers.make_specialcommit_string(settings.COMMITMENTS.all())
+    return helpers.make_specialcommit_string(site_settings.COMMITMENTS.all())
 
 
 @Memoized
@@ -1,8 +1,8 @@
-from django.conf import settings
 from django.core.urlresolvers import reverse
 
 from myblocks import context_tools
 from myblocks.tests.setup import BlocksTestBase
+from universal.site_settings import site_settings
 
 
 class ContextToolsTests(BlocksTestBase):
@@ -54,7 +54,7 @@ class ContextToolsTests(BlocksTestBase):
         jobs = context_tools.get_featured_jobs(self.search_results_request)
         self.assertEqual(len(jobs), 0)
 
-        settings.FEATURED_FACET = [self.facet]
+        site_settings.FEATURED_FACET = [self.facet]
         jobs = context_tools.get_featured_jobs(self.search_results_request)
         self.assertEqual(len(jobs), 1)
 
@@ -1,6 +1,5 @@
 from urllib import urlencode
 
-from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.http import Http404
 
@@ -8,6 +7,7 @@ from myblocks import models
 from myblocks.tests import factories
 from myblocks.tests.setup import BlocksTestBase
 from seo.tests.factories import SeoSiteFactory
+from universal.site_settings import site_settings
 
 
 class ModelsTests(BlocksTestBase):
@@ -551,7 +551,7 @@ class ModelsTests(BlocksTestBase):
 
         # If we don't have access to the job on this site it should
         # redirect to the home page.
-        settings.SITE_BUIDS = settings.SITE_PACKAGES = [100]
+        site_settings.SITE_BUIDS = site_settings.SITE_PACKAGES = [100]
         redirect = page.handle_job_detail_redirect(self.job_detail_request,
                                                    **self.job_detail_kwargs)
         self.assertEqual(redirect.url, reverse('home'))
@@ -1,9 +1,9 @@
-from django.conf import settings
 from django.http import Http404, HttpResponse
 
 from django.views.generic import View
 
 from myblocks.models import Page
+from universal.site_settings import site_settings
 
 
 class BlockView(View):
@@ -47,7 +47,7 @@ class BlockView(View):
         """
         if request.user.is_authenticated() and request.user.is_staff:
             try:
-                page = Page.objects.filter(sites=settings.SITE,
+                page = Page.objects.filter(sites=site_settings.SITE,
                                            status=Page.STAGING,
                                            page_type=self.page_type)[0]
                 setattr(self, 'page', page)
@@ -55,7 +55,7 @@ class BlockView(View):
                 pass
 
         try:
-            page = Page.objects.filter(sites=settings.SITE,
+            page = Page.objects.filter(sites=site_settings.SITE,
                                        status=Page.PRODUCTION,
                                        page_type=self.page_type)[0]
         except IndexError:
@@ -1,4 +1,3 @@
-from django.conf import settings
 from django.contrib.admin import AdminSite
 from django.db import connection
 from django.test import RequestFactory
@@ -9,13 +8,14 @@ from myjobs.tests.factories import UserFactory
 from myjobs.tests.setup import MyJobsBase
 from seo.models import SeoSite
 from seo.tests.factories import CompanyUserFactory
+from universal.site_settings import site_settings
 
 
 class AdminTests(MyJobsBase):
     def setUp(self):
         super(AdminTests, self).setUp()
         self.site = AdminSite()
-        settings.SITE = SeoSite.objects.first()
+        site_settings.SITE = SeoSite.objects.first()
         self.request = RequestFactory().get('/')
         self.user = UserFactory(is_superuser=True)
         self.request.user = self.user
@@ -27,6 +27,7 @@ from default_settings import GRAVATAR_URL_PREFIX, GRAVATAR_URL_DEFAULT
 from registration import signals as custom_signals
 from mymessages.models import Message, MessageInfo
 from universal.helpers import get_domain, send_email
+from universal.site_settings import site_settings
 
 BAD_EMAIL = ['dropped', 'bounce']
 STOP_SENDING = ['unsubscribe', 'spamreport']
@@ -140,8 +141,8 @@ class CustomUserManager(BaseUserManager):
                 user_args['source'] = request_source
             elif last_microsite_source:
                 user_args['source'] = last_microsite_source
-            elif hasattr(settings, 'SITE') and settings.SITE:
-                user_args['source'] = settings.SITE.domain
+            elif hasattr(site_settings, 'SITE') and site_settings.SITE:
+                user_args['source'] = site_settings.SITE.domain
 
             user = self.model(**user_args)
             user.set_password(password)
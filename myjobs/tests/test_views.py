@@ -1008,7 +1008,7 @@ class MyJobsViewsTests(MyJobsBase):
                           'password1': '5UuYquA@',
                           'password2': '5UuYquA@'})
         user = User.objects.get(email='default@example.com')
-        # settings.SITE.domain == jobs.directemployers.org.
+        # site_settings.SITE.domain == jobs.directemployers.org.
         self.assertEqual(user.source, 'jobs.directemployers.org')
 
         self.client.get(
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from os import path
 from re import sub
@@ -9,6 +10,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.sql import aggregates as sql_aggregates
 from django.db.models.signals import pre_delete, pre_save
 from django.dispatch import receiver
 
@@ -602,6 +604,56 @@ class PartnerLibrary(models.Model):
         super(PartnerLibrary, self).save(*args, **kwargs)
 
 
+class SQLContactTypeAggregate(sql_aggregates.Aggregate):
+    """
+    Renders an aggregate over only the rows with (or without) certain contact
+    types, e.g. COUNT(DISTINCT CASE WHEN contact_type IN ('email') THEN id
+    END).
+
+    """
+    sql_template = ('%(function)s(%(distinct)sCASE WHEN %(contact_type)s '
+                    '%(operator)s (%(placeholders)s) THEN %(field)s END)')
+
+    def __init__(self, col, function, contact_types, exclude=False,
+                 distinct=False, **extra):
+        self.sql_function = function
+        self.is_ordinal = function == 'COUNT'
+        self.contact_types = list(contact_types)
+        self.exclude = exclude
+        super(SQLContactTypeAggregate, self).__init__(
+            col, distinct='DISTINCT ' if distinct else '',
+            operator='NOT IN' if exclude else 'IN',
+            placeholders=', '.join(['%s'] * len(self.contact_types)),
+            **extra)
+
+    def as_sql(self, qn, connection):
+        # contact_type is a column of the same table as the aggregated field.
+        self.extra = dict(self.extra, contact_type='%s.%s' % (
+            qn(self.col[0]), qn('contact_type')))
+        sql, params = super(SQLContactTypeAggregate, self).as_sql(
+            qn, connection)
+        return sql, self.contact_types + list(params)
+
+
+class ContactTypeAggregate(models.Aggregate):
+    """
+    Aggregates a field of the contact records with (or without) certain
+    contact types, so that several counts can be computed in one query.
+
+    Inputs:
+        :lookup: The field to aggregate
+        :function: The SQL aggregate function, e.g. 'COUNT' or 'SUM'
+        :contact_types: The contact types to include
+        :exclude: Include every contact type except `contact_types` instead
+        :distinct: Only aggregate distinct values
+    """
+    name = 'ContactTypeAggregate'
+
+    def add_to_query(self, query, alias, col, source, is_summary):
+        query.aggregates[alias] = SQLContactTypeAggregate(
+            col, source=source, is_summary=is_summary, **self.extra)
+
+
 class ContactRecordQuerySet(SearchParameterQuerySet):
     @property
     def communication_activity(self):
@@ -654,22 +706,77 @@ class ContactRecordQuerySet(SearchParameterQuerySet):
 
     @property
     def contacts(self):
-        contacts = self.exclude(
-            contact_type='job').values(
-                'partner__name', 'partner', 'contact__name',
-                'contact_email').annotate(
-                    records=models.Count('contact__name')).distinct().order_by(
-                        '-records')
+        """
+        Returns a list of the records' contacts, most communication records
+        first. Each is a dictionary of the contact's 'partner__name',
+        'partner', 'contact__name' and 'contact_email', and its number of
+        communication 'records' and of 'referrals'.
 
-        referrals = dict(self.filter(contact_type='job').values_list(
-            'contact__name').annotate(
-                referrals=models.Count('contact__name')).distinct())
+        """
+        # Communication records and referrals are counted in one query, by
+        # grouping on the contact type as well.
+        rows = self.values(
+            'partner__name', 'partner', 'contact__name', 'contact_email',
+            'contact_type').annotate(
+                records=models.Count('contact__name')).order_by()
+
+        contacts = OrderedDict()
+        referrals = {}
+        for row in rows:
+            contact_type = row.pop('contact_type')
+            if contact_type == 'job':
+                name = row['contact__name']
+                referrals[name] = referrals.get(name, 0) + row['records']
+            else:
+                key = (row['partner__name'], row['partner'],
+                       row['contact__name'], row['contact_email'])
+                if key in contacts:
+                    contacts[key]['records'] += row['records']
+                else:
+                    contacts[key] = row
 
+        contacts = sorted(contacts.values(),
+                          key=lambda contact: -contact['records'])
         for contact in contacts:
             contact['referrals'] = referrals.get(contact['contact__name'], 0)
 
         return contacts
 
+    def summary(self):
+        """
+        Counts the records' communications and referrals, with a single
+        query, and lists their contacts (see `contacts`), with one more.
+
+        Outputs:
+            A dictionary of the 'emails', 'calls', 'searches', 'meetings',
+            'communications' and 'referrals' counts, the 'applications',
+            'interviews' and 'hires' totals, and the 'contacts' list
+        """
+        def count(*contact_types, **kwargs):
+            # Records are counted once each, like count() counts a distinct
+            # queryset.
+            return ContactTypeAggregate('id', function='COUNT', distinct=True,
+                                        contact_types=contact_types, **kwargs)
+
+        def total(field):
+            return ContactTypeAggregate(field, function='SUM',
+                                        contact_types=['job'])
+
+        summary = self.order_by().aggregate(
+            emails=count('email'),
+            calls=count('phone'),
+            searches=count('pssemail'),
+            meetings=count('meetingorevent'),
+            communications=count('job', exclude=True),
+            referrals=count('job'),
+            applications=total('job_applications'),
+            interviews=total('job_interviews'),
+            hires=total('job_hires'))
+
+        summary = {key: int(value or 0) for key, value in summary.items()}
+        summary['contacts'] = self.contacts
+        return summary
+
 
 class ContactRecordManager(SearchParameterManager):
     def __init__(self, *args, **kwargs):
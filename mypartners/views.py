@@ -941,16 +941,18 @@ def get_uploaded_file(request):
 def partner_main_reports(request):
     company, partner, user = prm_worthy(request)
     dt_range, date_str, records = get_records_from_request(request)
+    summary = records.summary()
+    contacts = summary['contacts']
 
     ctx = {
         'admin_id': request.REQUEST.get('admin'),
         'partner': partner,
         'company': company,
-        'contacts': records.contacts,
-        'total_records': records.communication_activity.count(),
-        'referral': records.referrals,
-        'top_contacts': records.contacts[:3],
-        'others': sum(contact['records'] for contact in records.contacts[3:]),
+        'contacts': contacts,
+        'total_records': summary['communications'],
+        'referral': summary['referrals'],
+        'top_contacts': contacts[:3],
+        'others': sum(contact['records'] for contact in contacts[3:]),
         'view_name': 'PRM',
         'date_start': dt_range[0],
         'date_end': dt_range[1],
@@ -1,10 +1,22 @@
+from hashlib import md5
 import json
+import time
+
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db import models
 from django.db.models.loading import get_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 
 from myreports.helpers import serialize
-from mypartners.models import SearchParameterManager
+from mypartners.models import ContactRecord, SearchParameterManager
+
+# Contact record summaries (see Report.summary) are cached under a global
+# version number, which saving or deleting a contact record bumps. Changes to
+# related objects, e.g. renaming a contact, show up once the summary expires.
+REPORT_SUMMARY_VERSION_KEY = 'report_summary:version'
+REPORT_SUMMARY_TIMEOUT = 60 * 10
 
 
 class Report(models.Model):
@@ -61,6 +73,20 @@ class Report(models.Model):
         params = json.loads(self.params)
         return model.objects.from_search(self.owner, params)
 
+    def summary(self):
+        """
+        Returns the summary of a contact record report's records (see
+        ContactRecordQuerySet.summary), cached per report and parameters.
+        """
+        key = 'report_summary::%s::%s::%s' % (
+            self.pk, md5(self.params.encode('utf-8')).hexdigest(),
+            get_report_summary_version())
+        summary = cache.get(key)
+        if summary is None:
+            summary = self.queryset.summary()
+            cache.set(key, summary, REPORT_SUMMARY_TIMEOUT)
+        return summary
+
     def __unicode__(self):
         return self.name
 
@@ -74,3 +100,27 @@ class Report(models.Model):
 
         self.results.save('%s-%s.json' % (self.name, self.pk), results)
         self._results = contents
+
+
+def get_report_summary_version():
+    version = cache.get(REPORT_SUMMARY_VERSION_KEY)
+    if version is None:
+        # If memcached loses the version, start over from a number that
+        # can't match any summary cached under the old one.
+        cache.add(REPORT_SUMMARY_VERSION_KEY, int(time.time()), None)
+        version = cache.get(REPORT_SUMMARY_VERSION_KEY)
+    return version
+
+
+@receiver(post_save, sender=ContactRecord,
+          dispatch_uid='post_save_contactrecord_report_summary')
+@receiver(post_delete, sender=ContactRecord,
+          dispatch_uid='post_delete_contactrecord_report_summary')
+@receiver(m2m_changed, sender=ContactRecord.tags.through,
+          dispatch_uid='m2m_changed_contactrecord_report_summary')
+def bump_report_summary_version(**kwargs):
+    """Expires every cached contact record report summary."""
+    try:
+        cache.incr(REPORT_SUMMARY_VERSION_KEY)
+    except ValueError:
+        cache.set(REPORT_SUMMARY_VERSION_KEY, int(time.time()), None)
@@ -220,6 +220,27 @@ class TestReportView(MyReportsTestCase):
         self.assertEqual(data['contacts'][0]['records'], 1)
         self.assertEqual(data['contacts'][0]['referrals'], 10)
 
+    def test_report_summary(self):
+        """
+        Test that a report's summary is counted with two queries and matches
+        the counts of its records.
+        """
+
+        report_name = self.test_create_report()
+        report = Report.objects.get(name=report_name)
+        records = report.queryset
+
+        with self.assertNumQueries(2):
+            summary = records.summary()
+
+        for key in ['emails', 'calls', 'searches', 'meetings', 'applications',
+                    'interviews', 'hires', 'referrals']:
+            self.assertEqual(summary[key], getattr(records, key))
+        self.assertEqual(summary['communications'],
+                         records.communication_activity.count())
+        self.assertEqual(summary['referrals'], 10)
+        self.assertEqual(summary['contacts'], records.contacts)
+
 
 class TestDownloads(MyReportsTestCase):
     """Tests the reports view."""
@@ -168,18 +168,7 @@ class ReportView(View):
         report = Report.objects.get(id=report_id)
 
         if report.model == "contactrecord":
-            records = report.queryset
-            ctx = json.dumps({
-                'emails': records.emails,
-                'calls': records.calls,
-                'searches': records.searches,
-                'meetings': records.meetings,
-                'applications': records.applications,
-                'interviews': records.interviews,
-                'hires': records.hires,
-                'communications': records.communication_activity.count(),
-                'referrals': records.referrals,
-                'contacts': list(records.contacts)})
+            ctx = json.dumps(report.summary())
             status = 200
         elif report.results:
             ctx = report.json
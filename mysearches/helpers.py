@@ -1,6 +1,14 @@
+import cPickle as pickle
+import hashlib
 import json
+import logging
+from multiprocessing.pool import ThreadPool
+import threading
+import time
 import urllib
 import urllib2
+import uuid
+import zlib
 from urlparse import urlparse, urlunparse, parse_qs, parse_qsl
 from urllib import urlencode
 import datetime
@@ -8,11 +16,29 @@ import datetime
 from bs4 import BeautifulSoup
 from dateutil import parser as dateparser
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.encoding import smart_str, smart_unicode
 
 from universal.helpers import get_domain
 
 
+logger = logging.getLogger(__name__)
+
+# Feed items are shown with the logos of member companies, which are looked
+# up by name for every job of every json feed. They're loaded with a single
+# query and kept by each process for FEED_COMPANIES_TIMEOUT seconds, or until
+# a company is saved or deleted (see expire_feed_companies).
+FEED_COMPANIES_TIMEOUT = 60 * 10
+FEED_COMPANIES_VERSION_KEY = 'feed_companies:version'
+
+# Feeds shared by a run of saved search emails (see SharedFeeds) are kept
+# long enough for every email of the run to be sent.
+SHARED_FEED_TIMEOUT = 60 * 60 * 12
+
+_feed_companies = {'expires': 0, 'version': None, 'companies': {}}
+_feed_companies_lock = threading.Lock()
+
+
 def update_url_if_protected(url, user):
     """
     Adds a key that bypasses authorization on protected sites
@@ -159,58 +185,136 @@ def parse_feed(feed_url, frequency='W', num_items=100, offset=0,
     :tuple:         First index is a list of :return_items: jobs
                     Second index is the total job count
     """
-    return_items = return_items or num_items
-    if feed_url.find('?') > -1:
-        separator = '&'
-    else:
-        separator = '?'
+    prefix, suffix = feed_request_url(feed_url, frequency, offset, use_json,
+                                      last_sent, ignore_dates)
+    feed_url = prefix + str(num_items) + suffix
+    items = parse_feed_items(fetch_feed(feed_url), 'feed/json' in feed_url)
+    return filter_feed_items(items, frequency, return_items or num_items,
+                             last_sent, ignore_dates)
 
-    if use_json:
-        feed_url = feed_url.replace('feed/rss', 'feed/json')
 
+def feed_dates(frequency, last_sent=None):
+    """
+    Returns the first and last publish dates of the jobs sent for a search,
+    and the number of days from the first to the date it was last sent.
+
+    """
     interval = get_interval_from_frequency(frequency)
 
     end = datetime.date.today()
     start = end + datetime.timedelta(days=interval)
+    last_sent_diff = None
     if last_sent is not None:
         last_sent_date = last_sent.date()
         last_sent_diff = last_sent_date - start
         start = min([start, last_sent_date])
+    return start, end, last_sent_diff
 
-    item_list = []
 
-    feed_url += '%snum_items=%s&offset=%s' % (
-        separator, str(num_items), str(offset))
+def feed_request_url(feed_url, frequency='W', offset=0, use_json=True,
+                     last_sent=None, ignore_dates=False):
+    """
+    Builds the url parse_feed requests a feed from. Everything but the number
+    of items is decided here, so that searches that only differ in how many
+    jobs they send can share a request (see SharedFeeds).
+
+    Outputs:
+    :tuple:         The url before and after the number of items
+    """
+    if feed_url.find('?') > -1:
+        separator = '&'
+    else:
+        separator = '?'
+
+    if use_json:
+        feed_url = feed_url.replace('feed/rss', 'feed/json')
 
+    suffix = '&offset=%s' % str(offset)
     if (('days_ago=' not in feed_url) and (last_sent is not None)
             and (not ignore_dates)):
-        feed_url += '&days_ago=%s' % -last_sent_diff.days
+        last_sent_diff = feed_dates(frequency, last_sent)[2]
+        suffix += '&days_ago=%s' % -last_sent_diff.days
 
-    is_json = 'feed/json' in feed_url
-    if is_json:
-        items = get_json(feed_url)
+    return feed_url + '%snum_items=' % separator, suffix
+
+
+def fetch_feed(feed_url):
+    """
+    Downloads a feed. This only touches the network, so it can be run on
+    several feeds at once.
+
+    Outputs:
+    A list of dictionaries for json feeds, or of BeautifulSoup items for RSS
+    feeds
+    """
+    if 'feed/json' in feed_url:
+        return get_json(feed_url)
     else:
         rss_soup = get_rss_soup(feed_url)
-        items = rss_soup.find_all('item')
+        return rss_soup.find_all('item')
+
+
+def feed_companies():
+    """
+    Returns the member companies whose logos are shown in feed items.
 
+    Outputs:
+    A dictionary of {company name: {'name', 'logo_url', 'member'}}
+    """
+    version = cache.get(FEED_COMPANIES_VERSION_KEY)
+    with _feed_companies_lock:
+        if (_feed_companies['expires'] > time.time() and
+                _feed_companies['version'] == version):
+            return _feed_companies['companies']
+
+    from seo.models import Company
+    companies = {}
+    # Company names are only unique among companies that were or weren't
+    # created by users; prefer the ones that weren't.
+    members = Company.objects.filter(member=True).order_by('user_created')
+    for name, logo_url in members.values_list('name', 'logo_url'):
+        companies.setdefault(name, {'name': name, 'logo_url': logo_url,
+                                    'member': True})
+
+    with _feed_companies_lock:
+        _feed_companies.update(expires=time.time() + FEED_COMPANIES_TIMEOUT,
+                               version=version, companies=companies)
+    return companies
+
+
+def expire_feed_companies(**kwargs):
+    """
+    Makes every process reload feed_companies. Takes **kwargs so that it can
+    be connected directly to model signals.
+
+    """
+    with _feed_companies_lock:
+        _feed_companies['expires'] = 0
+    try:
+        cache.incr(FEED_COMPANIES_VERSION_KEY)
+    except ValueError:
+        cache.set(FEED_COMPANIES_VERSION_KEY, int(time.time()), None)
+
+
+def parse_feed_items(items, is_json):
+    """
+    Turns the items of a feed downloaded by fetch_feed into job dictionaries.
+
+    """
+    if is_json:
+        companies = feed_companies()
+    item_list = []
     for item in items:
         if is_json:
             item['link'] = item.pop('url')
             item['pubdate'] = dateparser.parse(item.pop('date_new'))
             item_dict = item
-            from seo.models import Company
-            try:
-                # The json feed provides company name, while the rss feed does
-                # not; only try retrieving a company if we're pulling the
-                # json feed
-                company = Company.objects.get(name=item_dict['company'])
-            except Company.DoesNotExist:
-                pass
-            else:
-                if company.member:
-                    # All companies have logos specified, but only members
-                    # should have their logos shown
-                    item_dict['company'] = company
+            # The json feed provides company name, while the rss feed does
+            # not. All companies have logos specified, but only members
+            # should have their logos shown
+            company = companies.get(item_dict.get('company'))
+            if company is not None:
+                item_dict['company'] = company
         else:
             item_dict = {}
             item_dict['title'] = item.findChild('title').text
@@ -218,9 +322,27 @@ def parse_feed(feed_url, frequency='W', num_items=100, offset=0,
             item_dict['pubdate'] = dateparser.parse(
                 item.findChild('pubdate').text)
             item_dict['description'] = item.findChild('description').text
+        item_list.append(item_dict)
+    return item_list
 
-        if ignore_dates or date_in_range(start, end,
-                                         item_dict['pubdate'].date()):
+
+def filter_feed_items(items, frequency, return_items, last_sent=None,
+                      ignore_dates=False):
+    """
+    Picks the jobs a search sends out of the parsed items of its feed (see
+    parse_feed). The items themselves aren't changed, so they can be shared
+    by several searches.
+
+    Outputs:
+    :tuple:         First index is a list of :return_items: jobs
+                    Second index is the total job count
+    """
+    start, end, _ = feed_dates(frequency, last_sent)
+
+    item_list = []
+    for item in items:
+        if ignore_dates or date_in_range(start, end, item['pubdate'].date()):
+            item_dict = dict(item)
             if ignore_dates and start <= item_dict['pubdate'].date():
                 item_dict['new'] = True
 
@@ -232,6 +354,113 @@ def parse_feed(feed_url, frequency='W', num_items=100, offset=0,
     return item_list, len(item_list)
 
 
+class SharedFeeds(object):
+    """
+    Feed items downloaded once for every saved search that requests the same
+    feed, so that a run of saved search emails fetches each feed only once.
+
+    Searches register the feeds they will parse with `request`; `fetch`
+    then downloads them, several at a time, and stores each one in the cache
+    under a key scoped to the run. The task sending each email reads them
+    with `parse_feed`, in place of the module-level parse_feed, from a
+    SharedFeeds created with the same run id. Feeds that weren't fetched,
+    failed to download or are no longer cached are fetched by parse_feed as
+    usual.
+
+    """
+    def __init__(self, run=None):
+        """
+        Inputs:
+        :run: The id of the run whose feeds are read; a new run by default
+
+        """
+        self.run = run or uuid.uuid4().hex
+        self.requests = {}
+
+    def _key(self, feed_url, frequency='W', num_items=100, offset=0,
+             return_items=None, use_json=True, last_sent=None,
+             ignore_dates=False):
+        return feed_request_url(feed_url, frequency, offset, use_json,
+                                last_sent, ignore_dates)
+
+    def _cache_key(self, key):
+        return 'saved_search_feed::%s::%s' % (
+            self.run, hashlib.md5(smart_str(repr(key))).hexdigest())
+
+    def request(self, **parse_feed_args):
+        """
+        Registers a feed to be fetched, with the arguments parse_feed will be
+        called with. Returns the feed's key.
+
+        """
+        key = self._key(**parse_feed_args)
+        num_items = parse_feed_args.get('num_items', 100)
+        self.requests[key] = max(self.requests.get(key, 0), num_items)
+        return key
+
+    def fetch(self, workers):
+        """
+        Downloads every requested feed, `workers` at a time, parsing and
+        storing each one as soon as it has been downloaded.
+
+        Outputs:
+        An iterator of the keys of the feeds fetched, in the order they
+        finished; feeds that couldn't be downloaded are included, but can't
+        be read with parse_feed
+        """
+        requests = self.requests.items()
+        self.requests = {}
+        if not requests:
+            return
+
+        def download(request):
+            (prefix, suffix), num_items = request
+            feed_url = prefix + str(num_items) + suffix
+            try:
+                return request, fetch_feed(feed_url)
+            except Exception:
+                logger.exception("Error fetching feed %s", feed_url)
+                return request, None
+
+        pool = ThreadPool(min(workers, len(requests)))
+        try:
+            for (key, num_items), items in pool.imap_unordered(download,
+                                                               requests):
+                if items is not None:
+                    is_json = 'feed/json' in key[0]
+                    fetched = (num_items, parse_feed_items(items, is_json))
+                    # Feeds compress well; this keeps large ones under
+                    # memcached's size limit.
+                    cache.set(self._cache_key(key),
+                              zlib.compress(pickle.dumps(
+                                  fetched, pickle.HIGHEST_PROTOCOL)),
+                              SHARED_FEED_TIMEOUT)
+                yield key
+        finally:
+            pool.terminate()
+
+    def parse_feed(self, **parse_feed_args):
+        """
+        Takes the same arguments, and returns the same results, as the
+        module-level parse_feed, using the fetched feed if there is one.
+
+        """
+        num_items = parse_feed_args.get('num_items', 100)
+        data = cache.get(self._cache_key(self._key(**parse_feed_args)))
+        fetched = pickle.loads(zlib.decompress(data)) if data else None
+        if fetched is None or fetched[0] < num_items:
+            return parse_feed(**parse_feed_args)
+
+        # A feed's first items are the same however many are requested, so
+        # searches that send fewer jobs read the beginning of a larger feed.
+        return filter_feed_items(
+            fetched[1][:num_items],
+            parse_feed_args.get('frequency', 'W'),
+            parse_feed_args.get('return_items') or num_items,
+            parse_feed_args.get('last_sent'),
+            parse_feed_args.get('ignore_dates', False))
+
+
 def date_in_range(start, end, x):
     return start <= x <= end
 
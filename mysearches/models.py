@@ -125,7 +125,11 @@ class SavedSearch(models.Model):
             if choice[0] == self.day_of_week:
                 return choice[1]
 
-    def get_feed_items(self, num_items=None):
+    def get_feed_args(self, num_items=None):
+        """
+        Returns the keyword arguments this search calls parse_feed with.
+
+        """
         num_items = num_items or self.jobs_per_email
         url_of_feed = url_sort_options(self.feed, self.sort_by, self.frequency,
                                        hasattr(self, 'partnersavedsearch'))
@@ -139,11 +143,22 @@ class SavedSearch(models.Model):
         }
         if hasattr(self, 'partnersavedsearch'):
             parse_feed_args['ignore_dates'] = True
-        items = parse_feed(**parse_feed_args)
-        return items
+        return parse_feed_args
+
+    def get_feed_items(self, num_items=None, feeds=None):
+        """
+        Inputs:
+        :num_items: Number of jobs to retrieve; Default: jobs_per_email
+        :feeds: SharedFeeds to read this search's feed from, if it has
+            already been fetched; Default: None
+        """
+        parse_feed_args = self.get_feed_args(num_items)
+        if feeds is not None:
+            return feeds.parse_feed(**parse_feed_args)
+        return parse_feed(**parse_feed_args)
 
     def send_email(self, custom_msg=None, additional_categories=None,
-                   additional_headers=None):
+                   additional_headers=None, feeds=None):
         log_kwargs = {
             'was_sent': False,
             'was_received': False,
@@ -154,7 +169,7 @@ class SavedSearch(models.Model):
             'uuid': uuid.uuid4().hex
         }
         if self.user.can_receive_myjobs_email():
-            items, count = self.get_feed_items()
+            items, count = self.get_feed_items(feeds=feeds)
             is_pss = hasattr(self, 'partnersavedsearch')
             if items or is_pss:
                 log_kwargs['was_sent'] = True
@@ -413,7 +428,7 @@ class SavedSearchDigest(models.Model):
                 SavedSearchDigest).pk
         return CONTENT_TYPES['ssd']
 
-    def send_email(self, custom_msg=None):
+    def send_email(self, custom_msg=None, feeds=None):
         log_kwargs = {
             'was_sent': False,
             'was_received': False,
@@ -428,7 +443,7 @@ class SavedSearchDigest(models.Model):
         search_list = []
         contains_pss = False
         for search in saved_searches:
-            items, count = search.get_feed_items()
+            items, count = search.get_feed_items(feeds=feeds)
             total_jobs += count
             pss = None
             if hasattr(search, 'partnersavedsearch'):
@@ -1,6 +1,5 @@
 from mock import patch
 
-from django.conf import settings
 from django.core import mail
 from django.core.urlresolvers import reverse
 from django.test import RequestFactory
@@ -17,6 +16,7 @@ from myjobs.tests.factories import UserFactory
 from registration.models import Invitation
 from seo.models import SeoSite
 from seo.tests import CompanyFactory
+from universal.site_settings import site_settings
 
 
 class SavedSearchFormTests(MyJobsBase):
@@ -97,7 +97,7 @@ class PartnerSavedSearchFormTests(MyJobsBase):
             'email': self.contact.email,
         }
 
-        settings.SITE = SeoSite.objects.first()
+        site_settings.SITE = SeoSite.objects.first()
         # This request is only used in RequestForms, where all we care about
         # is request.user.
         self.request = RequestFactory().get(
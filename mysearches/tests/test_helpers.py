@@ -9,12 +9,13 @@ from mock import patch
 
 from myjobs.tests.setup import MyJobsBase
 from mysearches.models import SavedSearch
-from mysearches.helpers import (date_in_range, parse_feed,
+from mysearches.helpers import (date_in_range, feed_companies, parse_feed,
                                 update_url_if_protected, url_sort_options,
                                 validate_dotjobs_url)
 
 from mysearches.tests.helpers import return_file
 from myjobs.tests.factories import UserFactory
+from seo.tests.factories import CompanyFactory
 
 
 class SavedSearchHelperTests(MyJobsBase):
@@ -104,6 +105,26 @@ class SavedSearchHelperTests(MyJobsBase):
         items, count = parse_feed(feed_url, num_items=num_items)
         self.assertEqual(count, num_items)
 
+    def test_parse_feed_member_companies(self):
+        """
+        Member companies are found in feeds without a query per item, and
+        feeds are up to date with companies as soon as they're saved.
+        """
+        company = CompanyFactory(name='DE',
+                                 logo_url='http://example.com/de.png')
+        feed_url = 'http://www.my.jobs/feed/json'
+
+        feed_companies()
+        with self.assertNumQueries(0):
+            items, _ = parse_feed(feed_url)
+        self.assertEqual(items[0]['company']['logo_url'],
+                         'http://example.com/de.png')
+
+        company.member = False
+        company.save()
+        items, _ = parse_feed(feed_url)
+        self.assertEqual(items[0]['company'], 'DE')
+
     def test_url_sort_options(self):
         feed = 'http://www.my.jobs/jobs/feed/rss?date_sort=False'
 
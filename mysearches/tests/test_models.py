@@ -4,6 +4,7 @@ import re
 
 from django.conf import settings
 from django.core import mail
+from django.core.cache import get_cache
 
 from bs4 import BeautifulSoup
 from mock import patch, Mock
@@ -15,6 +16,7 @@ from mymessages.models import MessageInfo
 from mypartners.models import ContactRecord
 from mypartners.tests.factories import PartnerFactory, ContactFactory
 from myprofile.tests.factories import PrimaryNameFactory
+from mysearches import helpers
 from mysearches.models import SavedSearch, SavedSearchLog
 from mysearches.templatetags.email_tags import get_activation_link
 from mysearches.tests.local.fake_feed_data import jobs, no_jobs
@@ -109,6 +111,59 @@ class SavedSearchModelsTests(MyJobsBase):
         send_search_digests()
         self.assertEqual(len(mail.outbox), 1)
     
+    def test_shared_feed_fetched_once(self):
+        """
+        Saved searches of the same feed are sent from a single download of
+        it, however many jobs each of them sends.
+        """
+        self.patcher.stop()
+        urlopen = Mock(side_effect=return_file())
+        locmem_cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache')
+        with patch('urllib2.urlopen', urlopen), \
+                patch.object(helpers, 'cache', locmem_cache):
+            other = UserFactory(email='bob@example.com')
+            for user, jobs_per_email in [(self.user, 5), (other, 10)]:
+                SavedSearchDigestFactory(user=user, email=user.email,
+                                         is_active=False)
+                SavedSearchFactory(user=user, email=user.email,
+                                   frequency='D',
+                                   jobs_per_email=jobs_per_email)
+            urlopen.reset_mock()
+            send_search_digests()
+
+        feed_urls = [args[0] for args, _ in urlopen.call_args_list
+                     if 'feed/json' in args[0]]
+        self.assertEqual(len(feed_urls), 1)
+        self.assertIn('num_items=10', feed_urls[0])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(SavedSearchLog.objects.filter(was_sent=True).count(),
+                         2)
+
+    def test_shared_feed_not_cached(self):
+        """
+        Saved searches whose shared feed is no longer cached fetch it
+        themselves.
+        """
+        self.patcher.stop()
+        urlopen = Mock(side_effect=return_file())
+        locmem_cache = get_cache(
+            'django.core.cache.backends.locmem.LocMemCache')
+        with patch('urllib2.urlopen', urlopen), \
+                patch.object(helpers, 'cache', locmem_cache):
+            search = SavedSearchFactory(user=self.user, frequency='D')
+            feeds = helpers.SharedFeeds()
+            feeds.request(**search.get_feed_args())
+            list(feeds.fetch(1))
+            locmem_cache.clear()
+            urlopen.reset_mock()
+            search.send_email(feeds=helpers.SharedFeeds(feeds.run))
+
+        feed_urls = [args[0] for args, _ in urlopen.call_args_list
+                     if 'feed/json' in args[0]]
+        self.assertEqual(len(feed_urls), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
     def test_initial_email(self):
         search = SavedSearchFactory(user=self.user, is_active=False,
                                     url='www.my.jobs/search?q=new+search')
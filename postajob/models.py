@@ -15,6 +15,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from location_data import countries, all_regions, country_list, state_list
 from universal.helpers import send_email
+from universal.site_settings import site_settings
 
 
 class BaseManagerMixin(object):
@@ -865,7 +866,7 @@ class Request(BaseModel):
                 'requester': self.requesting_company().name,
             }
             body = render_to_string('postajob/request_email.html', data)
-            site = getattr(settings, 'SITE', None)
+            site = getattr(site_settings, 'SITE', None)
             headers = {
                 'X-SMTPAPI': '{"category": "Request Created (%s)"}' % self.pk
             }
@@ -1063,7 +1064,7 @@ class Invoice(BaseModel):
         recipients = set(other_recipients + list(owner_admins))
         if recipients:
             body = render_to_string('postajob/invoice_email.html', data)
-            site = getattr(settings, 'SITE', None)
+            site = getattr(site_settings, 'SITE', None)
             headers = {
                 'X-SMTPAPI': '{"category": "Invoice sent (%s)"}' % self.pk
             }
@@ -2,7 +2,6 @@ from datetime import date, timedelta
 
 from django.contrib.auth.models import Group
 from django.core import mail
-from django.conf import settings
 
 from mydashboard.tests.factories import (BusinessUnitFactory, CompanyFactory,
                                          SeoSiteFactory)
@@ -23,6 +22,7 @@ from postajob.tests.factories import (JobFactory,
                                       PurchasedProductFactory,
                                       SitePackageFactory)
 from myjobs.tests.setup import MyJobsBase
+from universal.site_settings import site_settings
 
 
 class ModelTests(MyJobsBase):
@@ -39,7 +39,7 @@ class ModelTests(MyJobsBase):
         self.company.save()
 
         # Use the newly created site for testing instead of secure.my.jobs.
-        settings.SITE = self.site
+        site_settings.SITE = self.site
 
         self.request_data = {
             'title': 'title',
@@ -26,6 +26,7 @@ from postajob.models import (CompanyProfile, Job, OfflinePurchase, Package,
                              ProductOrder, JobLocation)
 from seo.models import Company, SeoSite
 from universal.helpers import build_url
+from universal.site_settings import site_settings
 
 
 class PostajobTestBase(MyJobsBase):
@@ -929,7 +930,7 @@ class ViewTests(PostajobTestBase):
         self.assertTrue('There are no products configured for purchase'
                         in response.content)
         site_package = SitePackageFactory()
-        site_package.sites.add(SeoSite.objects.get(id=1), settings.SITE)
+        site_package.sites.add(SeoSite.objects.get(id=1), site_settings.SITE)
         self.product.package = site_package
         self.product.save()
         productgrouping = ProductGroupingFactory(owner=self.company)
@@ -27,13 +27,14 @@ from postajob.models import (CompanyProfile, Invoice, Job, OfflinePurchase,
 from universal.helpers import (get_company, get_object_or_none,
                                get_company_or_404)
 from universal.views import RequestFormViewBase
+from universal.site_settings import site_settings
 
 
 @user_is_allowed()
 @company_has_access('posting_access')
 def jobs_overview(request):
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         jobs = Job.objects.filter_by_sites(sites)
     else:
         jobs = Job.objects.all()
@@ -98,8 +99,8 @@ def view_invoice(request, purchased_product):
 @company_has_access(None)
 def purchasedproducts_overview(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         products = PurchasedProduct.objects.filter_by_sites(sites)
         jobs = PurchasedJob.objects.filter_by_sites(sites)
     else:
@@ -119,7 +120,7 @@ def purchasedproducts_overview(request):
 
 def purchasedjobs_overview(request, purchased_product, admin):
     """
-    Normally we would need to filter by settings.SITE for objects in postajob
+    Normally we would need to filter by site_settings.SITE for objects in postajob
     but this is already done from a previous view.
     """
     company = get_company_or_404(request)
@@ -146,8 +147,8 @@ def purchasedjobs_overview(request, purchased_product, admin):
 @company_has_access('product_access')
 def purchasedmicrosite_admin_overview(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         products = Product.objects.filter_by_sites(sites)
         purchased = PurchasedProduct.objects.filter_by_sites(sites)
         groupings = ProductGrouping.objects.filter_by_sites(sites)
@@ -178,8 +179,8 @@ def purchasedmicrosite_admin_overview(request):
 @company_has_access('product_access')
 def admin_products(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         products = Product.objects.filter_by_sites(sites)
     else:
         products = Product.objects.all()
@@ -196,8 +197,8 @@ def admin_products(request):
 @company_has_access('product_access')
 def admin_groupings(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         grouping = ProductGrouping.objects.filter_by_sites(sites)
     else:
         grouping = ProductGrouping.objects.all()
@@ -214,8 +215,8 @@ def admin_groupings(request):
 @company_has_access('product_access')
 def admin_offlinepurchase(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         purchases = OfflinePurchase.objects.filter_by_sites(sites)
     else:
         purchases = OfflinePurchase.objects.all()
@@ -232,8 +233,8 @@ def admin_offlinepurchase(request):
 @company_has_access('product_access')
 def admin_request(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         requests = Request.objects.filter_by_sites(sites)
     else:
         requests = Request.objects.all()
@@ -252,8 +253,8 @@ def admin_request(request):
 @company_has_access('product_access')
 def admin_purchasedproduct(request):
     company = get_company(request)
-    if settings.SITE:
-        sites = settings.SITE.postajob_site_list()
+    if site_settings.SITE:
+        sites = site_settings.SITE.postajob_site_list()
         purchases = PurchasedProduct.objects.filter_by_sites(sites)
     else:
         purchases = Request.objects.all()
@@ -357,7 +358,7 @@ def process_admin_request(request, pk, approve=True,
 
 
 def product_listing(request):
-    site = settings.SITE
+    site = site_settings.SITE
     company = get_company(request)
 
     # Get all site packages and products for a site.
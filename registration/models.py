@@ -14,6 +14,7 @@ from django.utils.timezone import now as datetime_now
 from django.utils.translation import ugettext_lazy as _
 
 from universal.helpers import send_email
+from universal.site_settings import site_settings
 
 
 SHA1_RE = re.compile('^[a-f0-9]{40}$')
@@ -120,7 +121,7 @@ class ActivationProfile(models.Model):
                                    ctx_dict)
         message = Pynliner().from_string(message).run()
 
-        site = getattr(settings, 'SITE', None)
+        site = getattr(site_settings, 'SITE', None)
 
         headers = {
             'X-SMTPAPI': '{"category": "Activation sent (%s)"}' % self.pk
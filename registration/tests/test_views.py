@@ -19,6 +19,7 @@ from registration.tests.factories import InvitationFactory
 from seo.tests.setup import DirectSEOBase
 from seo.models import SeoSite
 from universal.helpers import build_url
+from universal.site_settings import site_settings
 
 
 class RegistrationViewTests(MyJobsBase):
@@ -131,7 +132,7 @@ class RegistrationViewTests(MyJobsBase):
         self.assertEqual(len(mail.outbox), 4)
 
     def test_site_name_in_password_reset_email(self):
-        domain = settings.SITE.domain.lower()
+        domain = site_settings.SITE.domain.lower()
         mail.outbox = []
         self.user.is_active = True
         self.user.save()
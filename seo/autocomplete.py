@@ -0,0 +1,189 @@
+from bisect import bisect_left
+from collections import OrderedDict
+import json
+import re
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from seo.helpers import (_sqs_narrow_by_buid_and_site_package,
+                         sqs_apply_custom_facets)
+from seo.search_backend import DESearchQuerySet
+from seo.site_context import get_site_context, site_context_settings
+from universal import site_settings as site_settings_module
+from universal.site_settings import site_settings
+
+# The search box's suggestions (see seo.views.search_views.solr_ac) are made
+# from the facet counts of each site's titles and locations. They're counted
+# in Solr after each import (see build_site_autocomplete), stored in
+# memcached, and searched in the memory of each process that needs them.
+# Sites whose suggestions haven't been counted yet are searched in Solr.
+
+# Facet fields suggested for each lookup type, in the order their
+# suggestions are listed.
+AUTOCOMPLETE_FIELDS = {
+    'title': ('title', ),
+    'location': ('country', 'state', 'location'),
+}
+
+# Maximum number of values of each field kept for a site, by job count.
+AUTOCOMPLETE_MAX_VALUES = getattr(settings, 'AUTOCOMPLETE_MAX_VALUES', 20000)
+
+# Maximum number of sites whose suggestions each process keeps in memory.
+AUTOCOMPLETE_CACHE_SIZE = getattr(settings, 'AUTOCOMPLETE_CACHE_SIZE', 64)
+
+# Suggestions are counted again after every import and once a day (see
+# tasks.update_autocomplete in CELERYBEAT_SCHEDULE), so they're kept for two
+# days.
+AUTOCOMPLETE_TIMEOUT = 60 * 60 * 24 * 2
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _words(text):
+    return WORD_RE.findall(text.lower())
+
+
+class FieldIndex(object):
+    """
+    The values of a facet field and their job counts, searchable by the
+    beginnings of the words in them.
+
+    Every word of every value is kept in a sorted list, so that the values
+    with a word beginning with a prefix are found by bisecting it.
+
+    """
+    def __init__(self, counts):
+        """
+        Inputs:
+        :counts: A list of (value, job count) pairs
+
+        """
+        self.values = [value for value, count in counts]
+        self.counts = [count for value, count in counts]
+        words = sorted((word, i) for i, value in enumerate(self.values)
+                       for word in set(_words(value)))
+        self.words = [word for word, i in words]
+        self.ids = [i for word, i in words]
+
+    def _prefixed(self, prefix):
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + u'\uffff', start)
+        return set(self.ids[start:end])
+
+    def search(self, term, limit):
+        """
+        Returns up to `limit` (value, job count) pairs, most jobs first, of
+        the values with a word beginning with each word of `term`.
+
+        """
+        words = _words(term)
+        if not words:
+            return []
+        # Start from the longest word, which is likely to match the fewest
+        # values.
+        words.sort(key=len, reverse=True)
+        ids = self._prefixed(words[0])
+        for word in words[1:]:
+            if not ids:
+                break
+            ids &= self._prefixed(word)
+        ids = sorted(ids, key=lambda i: (-self.counts[i], self.values[i]))
+        return [(self.values[i], self.counts[i]) for i in ids[:limit]]
+
+
+class SiteAutocomplete(object):
+    """The search box suggestions for a site."""
+    def __init__(self, facet_counts):
+        """
+        Inputs:
+        :facet_counts: A dictionary of {<facet field>: [(value, count), ...]}
+
+        """
+        self.fields = dict((field, FieldIndex(counts))
+                           for field, counts in facet_counts.iteritems())
+
+    def suggest(self, lookup_type, term, limit):
+        """
+        Returns the (value, job count) suggestions for a term, up to `limit`
+        for each field of the lookup type.
+
+        """
+        suggestions = []
+        for field in AUTOCOMPLETE_FIELDS.get(lookup_type, ()):
+            suggestions.extend(self.fields[field].search(term, limit))
+        return suggestions
+
+
+_local_autocompletes = OrderedDict()
+_local_autocompletes_lock = threading.Lock()
+
+
+def autocomplete_version_key(site_id):
+    return 'autocomplete_version::%s' % site_id
+
+
+def autocomplete_key(site_id, version):
+    return 'autocomplete::%s::%s' % (site_id, version)
+
+
+def get_site_autocomplete(site_id):
+    """
+    Returns the SiteAutocomplete for a site, or None if its suggestions
+    haven't been counted.
+
+    """
+    version = cache.get(autocomplete_version_key(site_id))
+    if version is None:
+        return None
+    with _local_autocompletes_lock:
+        cached = _local_autocompletes.pop(site_id, None)
+        if cached is not None and cached[0] == version:
+            # Re-insert to mark the site as the most recently used.
+            _local_autocompletes[site_id] = cached
+            return cached[1]
+
+    data = cache.get(autocomplete_key(site_id, version))
+    if data is None:
+        return None
+    autocomplete = SiteAutocomplete(json.loads(zlib.decompress(data)))
+
+    with _local_autocompletes_lock:
+        _local_autocompletes[site_id] = (version, autocomplete)
+        while len(_local_autocompletes) > AUTOCOMPLETE_CACHE_SIZE:
+            _local_autocompletes.popitem(last=False)
+    return autocomplete
+
+
+def build_site_autocomplete(site):
+    """
+    Counts a site's suggestions in Solr, with a single facet query, and
+    stores them for get_site_autocomplete.
+
+    """
+    context = get_site_context(site.domain)
+    with site_settings_module.override(site_context_settings(context)):
+        sqs = DESearchQuerySet().facet_mincount(1).facet_sort("count")\
+                                .facet_limit(AUTOCOMPLETE_MAX_VALUES)
+        sqs = _sqs_narrow_by_buid_and_site_package(sqs)
+        sqs = sqs_apply_custom_facets(site_settings.DEFAULT_FACET, sqs=sqs)
+        for fields in AUTOCOMPLETE_FIELDS.values():
+            for field in fields:
+                sqs = sqs.facet(field)
+        # Only the facet counts are needed.
+        sqs.query.start_offset = 0
+        sqs.query.end_offset = 1
+        facet_counts = sqs.facet_counts().get('fields', {})
+
+    counts = dict((field, facet_counts.get(field, []))
+                  for fields in AUTOCOMPLETE_FIELDS.values()
+                  for field in fields)
+    # Facet values compress well; this keeps most sites' suggestions under
+    # memcached's size limit.
+    data = zlib.compress(json.dumps(counts))
+    version = int(time.time() * 1000)
+    cache.set(autocomplete_key(site.pk, version), data, AUTOCOMPLETE_TIMEOUT)
+    cache.set(autocomplete_version_key(site.pk), version, AUTOCOMPLETE_TIMEOUT)
@@ -1,12 +1,29 @@
+import datetime
 import hashlib
+import json
+import time
+import zlib
 
 from django.core.cache import cache
+from django.db.models import Max
 from django.http import HttpRequest
+from django.utils import timezone
 from django.utils.cache import get_cache_key
-from seo.helpers import get_jobs, get_solr_facet
+from seo.helpers import (_sqs_narrow_by_buid_and_site_package,
+                         build_filter_dict, company_thumbnails,
+                         featured_default_jobs, get_featured_jobs, get_jobs,
+                         get_solr_facet, jobs_and_counts,
+                         prepare_sqs_from_search_params, search_fields,
+                         sqs_apply_custom_facets)
 
-from seo.models import Configuration
+from postajob.models import Job
+from seo.models import BusinessUnit, Company, Configuration
+from seo.site_context import (get_site_context, get_site_context_version,
+                              site_context_settings)
 from django.conf import settings
+from universal import site_settings as site_settings_module
+from universal.site_settings import site_settings
+from xmlparse import text_fields
 
 # This module is currently a holding place for low-level caching that was
 # scattered across different modules. It's not much better than throwing
@@ -16,6 +33,33 @@ from django.conf import settings
 # Time to cache data affected by regular job updates
 MINUTES_TO_CACHE_JOB_DATA = 10
 
+# The search parameters used by prepare_sqs_from_search_params; anything else
+# in the query string doesn't change which jobs are found.
+JOB_RESULTS_PARAMS = ('q', 'location', 'moc', 'moc_id', 'company',
+                      'exact_title')
+
+# Custom facet counts are precomputed for a site's home page and for the
+# pages of this many of its standard facets, by number of jobs.
+MATERIALIZED_FACET_PATHS = 20
+
+# Precomputed custom facet counts are refreshed after every import, so they
+# are kept for a day.
+CUSTOM_FACET_COUNTS_TIMEOUT = 60 * 60 * 24
+
+# Company directories are rebuilt after every import and whenever a company
+# changes, so they are kept for a day.
+COMPANY_DIRECTORY_TIMEOUT = 60 * 60 * 24
+
+# A site's company directory is rebuilt at most once this many seconds after
+# its companies change, however many of them change in the meantime.
+COMPANY_DIRECTORY_DELAY = 60
+
+# Jobs added to Solr aren't served until they've been replicated, so an
+# update isn't treated as a modification of the pages that show it until
+# this long afterwards.
+SOLR_REPLICATION_DELAY = datetime.timedelta(
+    seconds=settings.SOLR_REPLICATION_DELAY)
+
 
 def cache_page_prefix(request):
     """Returns the key prefix based on the input request"""
@@ -39,7 +83,7 @@ def site_item_key(item_key):
         :item_key: A string to uniquely identify the cached item within a site
 
     """
-    return "%s::%s" % (item_key, settings.SITE_ID)
+    return "%s::%s" % (item_key, site_settings.SITE_ID)
 
 
 def get_total_jobs_count():
@@ -47,12 +91,118 @@ def get_total_jobs_count():
     jobs_count_key = site_item_key('jobs_count')
     jobs_count = cache.get(jobs_count_key)
     if not jobs_count:
-        jobs_count = get_jobs(custom_facets=settings.DEFAULT_FACET,
-                              jsids=settings.SITE_BUIDS).count()
+        jobs_count = get_jobs(custom_facets=site_settings.DEFAULT_FACET,
+                              jsids=site_settings.SITE_BUIDS).count()
         cache.set(jobs_count_key, jobs_count, MINUTES_TO_CACHE_JOB_DATA*60)
     return jobs_count
 
 
+def job_results_key(item_key, filters, params, *args):
+    """
+    Returns a key to cache the results of a job search on the current site.
+
+    The key changes whenever the site's context changes (e.g. its custom
+    facets) or SeoSite.clear_caches is called for the site, which happens
+    whenever its configuration or business units are updated.
+
+    Inputs:
+        :item_key: A string identifying what is being cached
+        :filters: The search's filter dictionary (see build_filter_dict)
+        :params: The search's query string parameters
+        :args: Anything else the results depend on (sort order, number of
+               jobs, etc.)
+
+    """
+    search = [sorted((k, v) for k, v in filters.iteritems() if v),
+              [(k, params.get(k, '').strip()) for k in JOB_RESULTS_PARAMS]]
+    search.extend(args)
+
+    version_key = site_item_key('job_results_version')
+    version = cache.get(version_key)
+    if version is None:
+        # Start from a number that can't match a version used before the
+        # key was cleared.
+        cache.add(version_key, int(time.time()), None)
+        version = cache.get(version_key)
+
+    #We use a hash to ensure key length is under memcache's 250 character limit
+    return "%s::%s::%s::%s::%s" % (
+        item_key, site_settings.SITE_ID, get_site_context_version(), version,
+        hashlib.md5(repr(search)).hexdigest())
+
+
+def get_jobs_and_counts(request, filters, num_jobs, fl=search_fields):
+    """
+    Caches seo.helpers.jobs_and_counts for the current site and search.
+
+    Returns a tuple of the first `num_jobs` default jobs, the total number of
+    default jobs, the first `num_jobs` featured jobs, the total number of
+    featured jobs, and the combined facet counts.
+
+    The custom facet counts fetched along with the jobs are cached for
+    get_custom_facets.
+
+    """
+    sort_order = request.GET.get('sort', 'relevance')
+    key = job_results_key('jobs_and_counts', filters, request.GET, sort_order,
+                          num_jobs, list(fl))
+    results = cache.get(key)
+    if results is None:
+        results = jobs_and_counts(request, filters, num_jobs, fl=fl)
+        custom_facet_key = get_facet_count_key(
+            filters, request.META.get('QUERY_STRING', None))
+        cache.set(custom_facet_key, results[-1])
+        results = results[:-1]
+        cache.set(key, results, MINUTES_TO_CACHE_JOB_DATA*60)
+    return results
+
+
+def get_more_jobs(request, filters, offset, num_items, percent_featured):
+    """
+    Returns the default and featured jobs to show after the first `offset`
+    jobs of a search on the current site, as used by the "more jobs" ajax
+    request. The results are cached.
+
+    Inputs:
+        :offset: Number of jobs already shown
+        :num_items: Number of jobs to return
+        :percent_featured: Percent of those jobs that should be featured
+
+    """
+    sort_order = request.REQUEST.get('sort', 'relevance')
+    key = job_results_key('more_jobs', filters, request.GET, sort_order,
+                          offset, num_items, percent_featured)
+    jobs = cache.get(key)
+    if jobs is None:
+        sqs = prepare_sqs_from_search_params(request.GET)
+        default_jobs = get_jobs(default_sqs=sqs,
+                                custom_facets=site_settings.DEFAULT_FACET,
+                                exclude_facets=site_settings.FEATURED_FACET,
+                                jsids=site_settings.SITE_BUIDS,
+                                filters=filters,
+                                sort_order=sort_order)
+        featured_jobs = get_featured_jobs(default_sqs=sqs,
+                                          jsids=site_settings.SITE_BUIDS,
+                                          filters=filters,
+                                          sort_order=sort_order)
+        (num_featured_jobs, num_default_jobs, featured_offset,
+         default_offset) = featured_default_jobs(featured_jobs.count(),
+                                                 default_jobs.count(),
+                                                 num_items, percent_featured,
+                                                 offset)
+
+        default_jobs = list(
+            default_jobs[default_offset:default_offset+num_default_jobs])
+        featured_jobs = list(
+            featured_jobs[featured_offset:featured_offset+num_featured_jobs])
+        for job in default_jobs + featured_jobs:
+            text = filter(None, [getattr(job, x, "None") for x in text_fields])
+            setattr(job, 'text', " ".join(text))
+        jobs = (default_jobs, featured_jobs)
+        cache.set(key, jobs, MINUTES_TO_CACHE_JOB_DATA*60)
+    return jobs
+
+
 def get_facet_count_key(filters=None, query_string=None):
     """
     Returns a unique key for the current site and filter path
@@ -66,24 +216,252 @@ def get_facet_count_key(filters=None, query_string=None):
 
     #We use a hash to ensure key length is under memcache's 250 character limit
     return "browsefacets::%s%s%s" % (
-        settings.SITE_ID,
+        site_settings.SITE_ID,
         hashlib.md5(unicode(filters)).hexdigest(),
         hashlib.md5(unicode(query_string)).hexdigest()
     )
 
 
 def get_custom_facets(request, filters=None, query_string=None):
+    # Searches with parameters are never precomputed.
+    if not query_string and not request.GET:
+        custom_facets = get_materialized_custom_facets(filters)
+        if custom_facets is not None:
+            return custom_facets
+
     custom_facet_key = get_facet_count_key(filters, query_string)
     custom_facets = cache.get(custom_facet_key)
 
     if not custom_facets:
-        custom_facets = get_solr_facet(settings.SITE_BUIDS, filters=filters,
+        custom_facets = get_solr_facet(site_settings.SITE_BUIDS, filters=filters,
                                        params=request.GET)
         cache.set(custom_facet_key, custom_facets)
 
     return custom_facets
 
 
+def custom_facet_counts_key(site_id):
+    return "custom_facet_counts::%s" % site_id
+
+
+def _filters_key(filters):
+    return tuple(sorted((k, v) for k, v in (filters or {}).iteritems() if v))
+
+
+def _custom_facets_signature():
+    """
+    Returns a hash of everything in the current site settings that the
+    site's custom facet counts depend on.
+
+    """
+    standard = [(cf.pk, cf.saved_querystring, cf.always_show)
+                for cf in site_settings.STANDARD_FACET]
+    default = [(cf.pk, cf.saved_querystring,
+                getattr(cf, 'boolean_operation', ''))
+               for cf in site_settings.DEFAULT_FACET]
+    return hashlib.md5(repr([standard, default,
+                             sorted(site_settings.SITE_BUIDS),
+                             sorted(site_settings.SITE_PACKAGES)])).hexdigest()
+
+
+def materialize_custom_facet_counts(site):
+    """
+    Precomputes the custom facet counts of a site's home page, and of the
+    pages of its MATERIALIZED_FACET_PATHS standard facets with the most jobs,
+    for get_custom_facets.
+
+    The counts of every path are stored together, as (custom facet id, count)
+    pairs, along with a signature of the site's facets, business units and
+    packages. They are ignored as soon as any of those change.
+
+    Inputs:
+        :site: The SeoSite to compute counts for
+
+    """
+    context = get_site_context(site.domain)
+    with site_settings_module.override(site_context_settings(context)):
+        if not site_settings.STANDARD_FACET:
+            cache.delete(custom_facet_counts_key(context.site_id))
+            return
+
+        buids = site_settings.SITE_BUIDS
+        home_counts = get_solr_facet(buids)
+        paths = {(): tuple((cf.pk, count) for cf, count in home_counts)}
+
+        top_facets = [cf for cf, count in home_counts if count and cf.url_slab]
+        for custom_facet in top_facets[:MATERIALIZED_FACET_PATHS]:
+            path = '/%s/' % custom_facet.url_slab.split('::')[0]
+            filters = build_filter_dict(path)
+            counts = get_solr_facet(buids, filters=filters)
+            paths[_filters_key(filters)] = tuple((cf.pk, count)
+                                                 for cf, count in counts)
+
+        cache.set(custom_facet_counts_key(context.site_id),
+                  {'signature': _custom_facets_signature(), 'paths': paths},
+                  CUSTOM_FACET_COUNTS_TIMEOUT)
+
+
+def get_materialized_custom_facets(filters=None):
+    """
+    Returns the precomputed custom facet counts of the current site for
+    `filters` (see materialize_custom_facet_counts), in the same format as
+    get_solr_facet. Returns None if they haven't been computed for the
+    site's current settings.
+
+    """
+    materialized = cache.get(custom_facet_counts_key(site_settings.SITE_ID))
+    if (not materialized or
+            materialized['signature'] != _custom_facets_signature()):
+        return None
+
+    counts = materialized['paths'].get(_filters_key(filters))
+    if counts is None:
+        return None
+
+    custom_facets = dict((cf.pk, cf) for cf in site_settings.STANDARD_FACET)
+    return [(custom_facets[pk], count) for pk, count in counts]
+
+
+def company_directory_key(site_id):
+    return "company_directory::%s" % site_id
+
+
+def company_directory_pending_key(site_id):
+    return "company_directory_pending::%s" % site_id
+
+
+def schedule_company_directories(site_ids):
+    """
+    Rebuilds the company directories of sites COMPANY_DIRECTORY_DELAY seconds
+    from now, unless they're already due to be rebuilt.
+
+    """
+    # Imported here to avoid a circular import; tasks imports seo.cache.
+    from tasks import task_update_company_directories
+
+    site_ids = [site_id for site_id in site_ids
+                if cache.add(company_directory_pending_key(site_id), True,
+                             COMPANY_DIRECTORY_DELAY)]
+    if site_ids:
+        task_update_company_directories.apply_async(
+            kwargs={'site_ids': site_ids}, countdown=COMPANY_DIRECTORY_DELAY)
+
+
+def _dump_company_directory(directory):
+    # Directories of sites with every company can be large; they compress
+    # well enough to stay under memcached's size limit.
+    return zlib.compress(json.dumps(directory))
+
+
+def _load_company_directory(data):
+    return json.loads(zlib.decompress(data))
+
+
+def company_alpha_filter(slug):
+    """Returns the alpha filter a company is listed under, by its slug."""
+    return slug[0] if slug[0].isalpha() else '0-9'
+
+
+def sort_alpha_filters(alpha_filters):
+    """
+    Sorts alpha filters, moving '0-9' to the back if it is present. This does
+    two things--a letter will always be selected on the root page, and the
+    0-9 button appears after the letters on the web page.
+
+    """
+    alpha_filters = sorted(alpha_filters)
+    if alpha_filters and alpha_filters[0] == '0-9':
+        alpha_filters = alpha_filters[1:] + alpha_filters[:1]
+    return alpha_filters
+
+
+def build_company_directory():
+    """
+    Lists the companies with jobs on the current site for the company
+    listing pages, with a single facet query and a single company query.
+
+    Returns:
+    A dictionary of:
+        :alpha_filters: The sorted alpha filters of all companies ('all')
+                        and of member companies ('member')
+        :companies: The company thumbnails (see
+                    seo.helpers.company_thumbnails) listed under each alpha
+                    filter, sorted by slug, each with a 'member' flag
+        :signature: A signature of the site settings the directory was
+                    built from
+
+    """
+    sqs = sqs_apply_custom_facets(site_settings.DEFAULT_FACET)
+    sqs = _sqs_narrow_by_buid_and_site_package(sqs)
+    counts = sqs.facet("buid").facet_limit(-1).fields(['buid']).\
+             facet_mincount(1).facet_counts()
+    buids = [item[0] for item in counts['fields']['buid']]
+
+    # Some companies are associated with multiple BUIDs, so we use distinct()
+    companies = Company.objects.filter(job_source_ids__in=buids).\
+        exclude(company_slug='').distinct().\
+        only('name', 'company_slug', 'logo_url', 'canonical_microsite',
+             'member')
+
+    listings = {}
+    member_filters = set()
+    for co in sorted(companies, key=lambda co: co.company_slug):
+        alpha = company_alpha_filter(co.company_slug)
+        listing = listings.setdefault(alpha, [])
+        if co.member:
+            member_filters.add(alpha)
+        # Companies that start with anything other than a letter or a digit
+        # add a '0-9' filter, but aren't listed under it.
+        if alpha == '0-9' and not co.company_slug[0].isdigit():
+            continue
+        thumbnail = company_thumbnails([co], use_canonical=False)[0]
+        thumbnail['member'] = co.member
+        listing.append(thumbnail)
+
+    return {
+        'alpha_filters': {'all': sort_alpha_filters(listings),
+                          'member': sort_alpha_filters(member_filters)},
+        'companies': listings,
+        'signature': _custom_facets_signature(),
+    }
+
+
+def materialize_company_directory(site):
+    """
+    Builds a site's company directory (see build_company_directory) and
+    stores it for get_company_directory.
+
+    Inputs:
+        :site: The SeoSite to build the directory of
+
+    """
+    # Changes made from now on are picked up by another rebuild.
+    cache.delete(company_directory_pending_key(site.pk))
+    context = get_site_context(site.domain)
+    with site_settings_module.override(site_context_settings(context)):
+        cache.set(company_directory_key(context.site_id),
+                  _dump_company_directory(build_company_directory()),
+                  COMPANY_DIRECTORY_TIMEOUT)
+
+
+def get_company_directory():
+    """
+    Returns the company directory of the current site (see
+    build_company_directory). It's built here only if it hasn't been built
+    for the site's current settings.
+
+    """
+    key = company_directory_key(site_settings.SITE_ID)
+    data = cache.get(key)
+    directory = _load_company_directory(data) if data else None
+    if (directory is None or
+            directory['signature'] != _custom_facets_signature()):
+        directory = build_company_directory()
+        cache.set(key, _dump_company_directory(directory),
+                  COMPANY_DIRECTORY_TIMEOUT)
+    return directory
+
+
 def get_site_config(request):
     """
     Returns the currently active site configuration for the input request
@@ -139,3 +517,105 @@ def get_site_config(request):
                 site_config = Configuration.objects.get(id=2)
         cache.set(config_cache_key, site_config, timeout)
     return site_config
+
+
+def site_last_modified():
+    """
+    Returns when the jobs on the current site last changed, based on the
+    date_updated of its business units and posted jobs, or None if that
+    can't be told.
+
+    Updates are only counted once they've had time to be replicated (see
+    SOLR_REPLICATION_DELAY), and are counted as of then.
+
+    """
+    settled = timezone.now() - SOLR_REPLICATION_DELAY
+    business_units = BusinessUnit.objects.filter(date_updated__lte=settled)
+    if site_settings.SITE_BUIDS:
+        business_units = business_units.filter(
+            id__in=site_settings.SITE_BUIDS)
+    dates = [business_units.aggregate(Max('date_updated'))[
+        'date_updated__max']]
+    if site_settings.SITE_PACKAGES:
+        jobs = Job.objects.filter(site_packages__in=site_settings.SITE_PACKAGES,
+                                  date_updated__lte=settled)
+        dates.append(jobs.aggregate(Max('date_updated'))['date_updated__max'])
+    dates = [date for date in dates if date is not None]
+    if not dates:
+        return None
+    return max(dates) + SOLR_REPLICATION_DELAY
+
+
+def page_etag(request, *args):
+    """
+    Returns an ETag for a page of the current site. It changes with the
+    site's configuration (see cache_page_prefix), the page's path and query
+    string, the build and anything else the page depends on in `args`.
+
+    """
+    validator = [cache_page_prefix(request), request.get_full_path(),
+                 settings.BUILD]
+    validator.extend(args)
+    return hashlib.md5(repr(validator)).hexdigest()
+
+
+def site_page_validators(request, *args, **kwargs):
+    """
+    Returns the ETag and Last-Modified date of a page that lists the current
+    site's jobs (a feed or a sitemap), or (None, None) if the site's jobs
+    have never been updated.
+
+    Since feeds can be limited to recent jobs, the page is also treated as
+    modified at the start of each (UTC) day.
+
+    """
+    jobs_modified = site_last_modified()
+    if jobs_modified is None:
+        return None, None
+    today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return (page_etag(request, jobs_modified, today),
+            max(jobs_modified, today))
+
+
+def job_validators_key(job_id):
+    return 'job_validators::%s' % job_id
+
+
+def cache_job_validators(job_id, job):
+    """
+    Keeps the date a job was last updated, so that requests for its page can
+    be validated without looking the job up in Solr.
+
+    The date is kept no longer than pages are cached, so that a job that has
+    since been removed isn't reported as unmodified for any longer than a
+    cached copy of its page would be served.
+
+    """
+    if job.date_updated:
+        cache.set(job_validators_key(job_id), job.date_updated,
+                  60 * settings.MINUTES_TO_CACHE)
+
+
+def job_page_validators(request, job_id, *args, **kwargs):
+    """
+    Returns the ETag and Last-Modified date of a job's page, or (None, None)
+    if the job hasn't been looked up recently (see cache_job_validators).
+
+    """
+    date_updated = cache.get(job_validators_key(job_id))
+    if date_updated is None:
+        return None, None
+    return page_etag(request, date_updated), date_updated
+
+
+def record_conditional_get(name, hit):
+    """
+    Counts the conditional requests for a view that were answered with a
+    304 (hits) or with the whole page (misses).
+
+    """
+    key = 'conditional_get:%s:%s' % (name, 'hits' if hit else 'misses')
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
@@ -13,9 +13,12 @@ from django.http import HttpResponse
 from django.shortcuts import redirect, render_to_response
 from django.template import RequestContext
 from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
 
-from seo.cache import cache_page_prefix, get_site_config
+from seo.cache import (cache_page_prefix, get_site_config,
+                       record_conditional_get)
 from myjobs.models import Ticket, User
+from universal.site_settings import site_settings
 
 
 def home_page_check(view_func):
@@ -26,16 +29,16 @@ def home_page_check(view_func):
             data_dict = {
                 'item_type': 'home',
                 'facet_blurb': False,
-                'site_name': settings.SITE_NAME,
-                'site_title': settings.SITE_TITLE,
-                'site_heading': settings.SITE_HEADING,
-                'site_tags': settings.SITE_TAGS,
-                'site_description': settings.SITE_DESCRIPTION,
+                'site_name': site_settings.SITE_NAME,
+                'site_title': site_settings.SITE_TITLE,
+                'site_heading': site_settings.SITE_HEADING,
+                'site_tags': site_settings.SITE_TAGS,
+                'site_description': site_settings.SITE_DESCRIPTION,
                 'host': str(request.META.get("HTTP_HOST", "localhost")),
                 'site_config': config,
                 'build_num': settings.BUILD,
                 'filters': {},
-                'view_source': settings.VIEW_SOURCE
+                'view_source': site_settings.VIEW_SOURCE
             }
 
             return render_to_response(config.home_page_template, data_dict,
@@ -48,10 +51,10 @@ def home_page_check(view_func):
 def protected_site(view_func):
     @wraps(view_func)
     def decorator(request, *args, **kwargs):
-        if settings.SITE_ID in settings.PROTECTED_SITES:
+        if site_settings.SITE_ID in settings.PROTECTED_SITES:
             if request.REQUEST.get('key') == settings.SEARCH_API_KEY:
                     return view_func(request, *args, **kwargs)
-            groups = settings.PROTECTED_SITES[settings.SITE_ID]
+            groups = settings.PROTECTED_SITES[site_settings.SITE_ID]
             if request.user.is_authenticated():
                 if list(set(groups) &
                         set(request.user.groups.values_list('id', flat=True))):
@@ -131,6 +134,41 @@ def custom_cache_page(view):
     return decorator
 
 
+def conditional_page(validators):
+    """
+    Answers conditional GET requests (If-None-Match/If-Modified-Since) for a
+    view with a 304 when the page hasn't changed, without calling the view.
+
+    `validators` is called with the view's arguments and returns the page's
+    ETag and Last-Modified date; it should be cheap, since it's called for
+    every request. Either may be None. Pages for logged in users aren't
+    validated, since they aren't cached either.
+
+    Conditional requests are counted (see seo.cache.record_conditional_get).
+
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'user', None)
+            if (request.method not in ('GET', 'HEAD') or
+                    (user is not None and user.is_authenticated())):
+                return view(request, *args, **kwargs)
+
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = condition(
+                etag_func=lambda *a, **kw: etag,
+                last_modified_func=lambda *a, **kw: last_modified)(view)(
+                    request, *args, **kwargs)
+            if ('HTTP_IF_NONE_MATCH' in request.META or
+                    'HTTP_IF_MODIFIED_SINCE' in request.META):
+                record_conditional_get(view.__name__,
+                                       response.status_code == 304)
+            return response
+        return wrapper
+    return decorator
+
+
 def sns_json_message(f): 
     
     def wrap(request, *args, **kwargs):      
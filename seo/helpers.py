@@ -26,6 +26,7 @@ from seo.filters import FacetListWidget, CustomFacetListWidget
 from serializers import JSONExtraValuesSerializer
 from moc_coding.models import Moc
 from xmlparse import text_fields
+from universal.site_settings import site_settings
 
 
 # Because we don't want things like 'salted_date' in the url paramters,
@@ -50,9 +51,18 @@ search_fields = ['apply_info', 'city', 'company', 'company_canonical_microsite',
                  'location_exact', 'reqid', 'score', 'state',
                  'state_short', 'text', 'title', 'title_exact', 'uid']
 
+# Solr queries of sets of custom facets, built by custom_facets_query and
+# kept for the life of the process. Keyed by the id, saved querystring and
+# boolean operation of each facet in the set, so a changed facet never uses
+# an old query; forget_custom_facet_queries drops the entries of a facet
+# once it changes.
+_custom_facet_queries = {}
+# Number of queries kept before _custom_facet_queries is emptied.
+CUSTOM_FACET_QUERIES_SIZE = 2048
+
 
 def standard_facets_by_name_slug(name_slugs):
-    custom_facets = settings.STANDARD_FACET
+    custom_facets = site_settings.STANDARD_FACET
     return [facet for facet in custom_facets
             if facet.name_slug in name_slugs]
 
@@ -641,7 +651,7 @@ def filter_sqs(sqs, filters):
                 t = t.split('/')[1]
             except IndexError:
                 pass
-            if settings.SITE_BUIDS:
+            if site_settings.SITE_BUIDS:
                 sqs = sqs.narrow("mapped_moc_exact:(%s)" % _clean(t))
             else:
                 sqs = sqs.narrow("moc_exact:(%s)" % _clean(t))
@@ -668,8 +678,8 @@ def get_featured_jobs(*args, **kwargs):
     with site featured facets if they exist
 
     """
-    if settings.FEATURED_FACET:
-        kwargs.update(custom_facets=settings.FEATURED_FACET)
+    if site_settings.FEATURED_FACET:
+        kwargs.update(custom_facets=site_settings.FEATURED_FACET)
         featured_jobs = get_jobs(*args, **kwargs)
     else:
         featured_jobs = EmptySearchQuerySet()
@@ -783,7 +793,7 @@ def sort_custom_facets_by_group(custom_facets):
     grouped_facets = {1: [], 2: [], 3: []}
 
     for facet, count in custom_facets:
-        cached_facets = getattr(settings, 'STANDARD_FACET', [])
+        cached_facets = getattr(site_settings, 'STANDARD_FACET', [])
         try:
             # Attempt to match the facet to a cached version, which
             # will have the facet_group already included.
@@ -810,7 +820,7 @@ def get_widgets(request, site_config, facet_counts, custom_facets,
     """
     filters = filters or {}
 
-    moc_field = 'mapped_moc' if settings.SITE_BUIDS else 'moc'
+    moc_field = 'mapped_moc' if site_settings.SITE_BUIDS else 'moc'
     if featured:
         types = [('featured', 1),
                  ('city', site_config.browse_city_order+1),
@@ -905,16 +915,49 @@ def sqs_apply_custom_facets(custom_facets, sqs=None, exclude_facets=None):
     # Apply SearchQueries for exclude facets and custom facets to our
     # SearchQuerySet
     if exclude_facets:
-        combined_exclude_sq = create_sq(exclude_facets)
-        if combined_exclude_sq:
-            sqs = sqs.narrow_exclude(combined_exclude_sq.build_query())
+        sqs = sqs.narrow_exclude(custom_facets_query(exclude_facets))
     if custom_facets:
-        combined_sq = create_sq(custom_facets)
-        if combined_sq:
-            sqs = sqs.narrow(combined_sq.build_query())
+        sqs = sqs.narrow(custom_facets_query(custom_facets))
     return sqs
 
 
+def custom_facets_query(custom_facets):
+    """
+    Returns the Solr query of a set of custom facets, as built from
+    create_sq, or None if there are no custom facets.
+
+    Queries are built once per process for each combination of facets (see
+    _custom_facet_queries); after that, this is a dictionary lookup.
+
+    Inputs:
+        :custom_facets: An iterable of CustomFacet objects
+
+    """
+    key = tuple((cf.pk, cf.saved_querystring, cf.get_op())
+                for cf in custom_facets)
+    if not key:
+        return None
+
+    query = _custom_facet_queries.get(key)
+    if query is None:
+        query = create_sq(custom_facets).build_query()
+        if len(_custom_facet_queries) >= CUSTOM_FACET_QUERIES_SIZE:
+            _custom_facet_queries.clear()
+        _custom_facet_queries[key] = query
+    return query
+
+
+def forget_custom_facet_queries(custom_facet_id):
+    """
+    Drops the memoized queries of every set of custom facets that includes
+    a custom facet.
+
+    """
+    for key in _custom_facet_queries.keys():
+        if any(pk == custom_facet_id for pk, _, _ in key):
+            _custom_facet_queries.pop(key, None)
+
+
 def create_sq(custom_facets):
     """
     Returns a single SQ object from an iterable of custom_facets
@@ -1019,7 +1062,7 @@ def prepare_sqs_from_search_params(params, sqs=None):
         # Before we can search for MOC, we have to find out if the SeoSite
         # has specified any custom MOC-Onet mappings. If they do, we'll search
         # on the jobs mapped_moc* fields
-        prefix = 'mapped_' if settings.SITE_BUIDS else ''
+        prefix = 'mapped_' if site_settings.SITE_BUIDS else ''
 
         if moc_id_val:
             moc_filt = SQ(**{'%smocid' % prefix: moc_id_val})
@@ -1042,12 +1085,13 @@ def _sqs_narrow_by_buid_and_site_package(sqs, buids=None, site_packages=None):
         :sqs: SearchQuerySet narrowed to documents with buids in list 'buids'.
     """
     if site_packages is None:
-        site_packages = settings.SITE_PACKAGES
+        site_packages = site_settings.SITE_PACKAGES
 
     if buids is None:
-        buids = settings.SITE_BUIDS
+        buids = site_settings.SITE_BUIDS
     if not buids:
-        site_packages.append(0)
+        # Don't modify the site's list of packages.
+        site_packages = list(site_packages) + [0]
 
     if site_packages:
         site_packages = ' OR '.join([str(i) for i in site_packages])
@@ -1163,6 +1207,42 @@ def make_json(data, host):
     return output
 
 
+def iter_json(data, host):
+    """
+    Like make_json, but yields the output a piece at a time as `data` is
+    read.
+
+    """
+    s = JSONExtraValuesSerializer(publisher_url="http://%s" % host)
+    return s.iter_serialize(data)
+
+
+def iter_job_pages(jobs, fields, start, stop, page_size):
+    """
+    Yields the values of a range of jobs, reading them from Solr a page at a
+    time so that only one page is held in memory at once.
+
+    Inputs:
+    :jobs: A search queryset of jobs
+    :fields: The fields to return for each job
+    :start: The index of the first job
+    :stop: The index after the last job
+    :page_size: The number of jobs read per Solr request
+
+    Yields:
+    A dictionary of field values for each job
+
+    """
+    for page_start in xrange(start, stop, page_size):
+        page_stop = min(page_start + page_size, stop)
+        page = jobs.values(*fields)[page_start:page_stop]
+        for job in page:
+            yield job
+        if len(page) < page_stop - page_start:
+            # The index changed under us; there's nothing more to read.
+            break
+
+
 def make_specialcommit_string(special_commits):
     """
     Build the site commitment string here instead of multiple times in the
@@ -1171,7 +1251,7 @@ def make_specialcommit_string(special_commits):
     [10-8-12 JPSOLE]
 
     Inputs:
-    :special_commits:      settings.COMMITMENTS.all() object
+    :special_commits:      site_settings.COMMITMENTS.all() object
 
     Returns:
     A space separated string of values in special_commits
@@ -1349,7 +1429,7 @@ def _facet_query_result_counts(tagged_facets, sqs):
 
 
 def get_solr_facet(jsids, filters=None, params=None):
-    custom_facets = settings.STANDARD_FACET
+    custom_facets = site_settings.STANDARD_FACET
 
     # Short-circuit the function if a site has facets turned on, but either
     # does not have any facets with `show_production` == 1 or has not yet
@@ -1368,8 +1448,8 @@ def get_solr_facet(jsids, filters=None, params=None):
 
     # Intersect the CustomFacet object's query parameters with those of
     # the site's default facet, if it has one.
-    if settings.DEFAULT_FACET:
-        sqs = sqs_apply_custom_facets(settings.DEFAULT_FACET, sqs)
+    if site_settings.DEFAULT_FACET:
+        sqs = sqs_apply_custom_facets(site_settings.DEFAULT_FACET, sqs)
 
     sqs = _sqs_narrow_by_buid_and_site_package(sqs, buids=jsids)
 
@@ -1397,31 +1477,76 @@ def add_text_to_job(job):
 
 
 def jobs_and_counts(request, filters, num_jobs, fl=search_fields):
+    """
+    Searches for a site's default and featured jobs in a single Solr request.
+
+    The search is narrowed to jobs that are either default jobs (matching the
+    site's default facets but not its featured facets) or featured jobs, and
+    each of those is returned as its own group (see
+    DESearchQuerySet.group_queries). Since the two groups don't overlap, the
+    facet counts of the search are the sum of the facet counts of each. The
+    counts of the site's standard facets, intersected with its default
+    facets, are returned from the same request as facet queries.
+
+    Inputs:
+        :request: The request being searched for; its search parameters and
+                  sort order are used
+        :filters: Dictionary of filter terms (see build_filter_dict)
+        :num_jobs: Number of default and featured jobs to return
+        :fl: Fields to return for each job
+
+    Outputs:
+        A tuple of the default jobs, the total number of default jobs, the
+        featured jobs, the total number of featured jobs, the facet counts and
+        the standard facet counts (see get_solr_facet).
+
+    """
     sort_order = request.GET.get('sort', 'relevance')
 
+    default_query = custom_facets_query(site_settings.DEFAULT_FACET)
+    default_group = default_query or '*:*'
+    # Featured facets that don't restrict the search have no featured jobs.
+    featured_group = None
+    if site_settings.FEATURED_FACET:
+        featured_group = custom_facets_query(site_settings.FEATURED_FACET)
+        if featured_group:
+            default_group = '(%s) AND NOT (%s)' % (default_group,
+                                                   featured_group)
+    group_queries = filter(None, [default_group, featured_group])
+
     sqs = prepare_sqs_from_search_params(request.GET)
-    default_jobs = get_jobs(default_sqs=sqs,
-                            custom_facets=settings.DEFAULT_FACET,
-                            exclude_facets=settings.FEATURED_FACET,
-                            jsids=settings.SITE_BUIDS, filters=filters,
-                            facet_limit=num_jobs, sort_order=sort_order,
-                            fl=fl)
-    featured_jobs = get_featured_jobs(default_sqs=sqs, filters=filters,
-                                      jsids=settings.SITE_BUIDS,
-                                      facet_limit=num_jobs,
-                                      sort_order=sort_order, fl=fl)
-
-    # Force the query to evaluate and populate the result cache. After this
-    # unless changes are made to the sqs objects
-    # anything using query results will be working with the same
-    # exact version of the query results (and more importantly,
-    # the query won't be re-run).
-    default_jobs[:num_jobs]
-    featured_jobs[:num_jobs]
-
-    facet_counts = default_jobs.add_facet_count(featured_jobs).get('fields')
-
-    return default_jobs, featured_jobs, facet_counts
+    sqs = get_jobs(default_sqs=sqs, jsids=site_settings.SITE_BUIDS,
+                   filters=filters, facet_limit=num_jobs,
+                   sort_order=sort_order, fl=fl)
+    sqs = sqs.narrow(' OR '.join('(%s)' % query for query in group_queries))
+    sqs = sqs.group_queries(group_queries, limit=num_jobs)
+
+    # Custom facet counts are limited to the site's default jobs, which are
+    # all part of the search.
+    tagged_facets = {}
+    for custom_facet in site_settings.STANDARD_FACET:
+        query = custom_facet.saved_querystring
+        if default_query:
+            query = '(%s) AND (%s)' % (query, default_query)
+        tagged_facets[query] = {'custom_facet': custom_facet}
+        sqs = sqs.query_facet(query)
+
+    groups = sqs.groups()
+    facets = sqs.facet_counts()
+
+    default_jobs = groups.get(default_group, {})
+    featured_jobs = groups.get(featured_group, {})
+
+    custom_facet_counts = []
+    for query, count in facets.get('queries', {}).iteritems():
+        custom_facet = tagged_facets[query]['custom_facet']
+        if count > 0 or custom_facet.always_show:
+            custom_facet_counts.append((custom_facet, count))
+    custom_facet_counts.sort(key=lambda x: -x[1])
+
+    return (default_jobs.get('results', []), default_jobs.get('hits', 0),
+            featured_jobs.get('results', []), featured_jobs.get('hits', 0),
+            facets.get('fields'), custom_facet_counts)
 
 
 def get_company_data(filters):
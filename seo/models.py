@@ -32,6 +32,7 @@ from seo.search_backend import DESearchQuerySet
 from myjobs.models import User
 from mypartners.models import Tag
 from universal.helpers import get_domain, get_object_or_none
+from universal.site_settings import site_settings
 
 
 import decimal
@@ -40,8 +41,8 @@ import decimal
 class JobsByBuidManager(models.Manager):
     def get_query_set(self):
         queryset = super(JobsByBuidManager, self).get_query_set()
-        if settings.SITE_BUIDS:
-            return queryset.filter(buid__in=settings.SITE_BUIDS)
+        if site_settings.SITE_BUIDS:
+            return queryset.filter(buid__in=site_settings.SITE_BUIDS)
         else:
             return queryset
 
@@ -49,13 +50,13 @@ class JobsByBuidManager(models.Manager):
 class ConfigBySiteManager(models.Manager):
     def get_query_set(self):
         return super(ConfigBySiteManager, self).get_query_set().filter(
-            seosite__id=settings.SITE_ID)
+            seosite__id=site_settings.SITE_ID)
 
 
 class GoogleAnalyticsBySiteManager(models.Manager):
     def get_query_set(self):
         return super(GoogleAnalyticsBySiteManager, self).get_query_set().filter(
-            seosite__id=settings.SITE_ID)
+            seosite__id=site_settings.SITE_ID)
 
 
 def term_splitter(terms):
@@ -164,7 +165,7 @@ class Redirect(models.Model):
 class CustomFacetQuerySet(QuerySet):
     def prod_facets_for_current_site(self):
         kwargs = {
-            'seositefacet__seosite__id': settings.SITE_ID,
+            'seositefacet__seosite__id': site_settings.SITE_ID,
             'show_production': 1,
         }
         return self.filter(**kwargs)
@@ -223,7 +224,7 @@ class CustomFacet(BaseSavedSearch):
         return '%s' % self.name
 
     def active_site_facet(self):
-        facets = self.seositefacet_set.filter(seosite__id=settings.SITE_ID)
+        facets = self.seositefacet_set.filter(seosite__id=site_settings.SITE_ID)
         return facets.first()
 
     def get_op(self):
@@ -236,8 +237,10 @@ class CustomFacet(BaseSavedSearch):
         operations.
 
         """
-        return getattr(self, 'boolean_operation',
-                       self.active_site_facet().boolean_operation)
+        try:
+            return self.boolean_operation
+        except AttributeError:
+            return self.active_site_facet().boolean_operation
 
     def clean(self):
         if not self.pk:
@@ -372,6 +375,10 @@ def clear_page_cache(sender, **kwargs):
     # circular import condition.
     obj = kwargs['instance']
 
+    # seo.helpers imports this module.
+    from seo.helpers import forget_custom_facet_queries
+    forget_custom_facet_queries(obj.pk)
+
     if not obj.seosite_set.exists():
         return
 
@@ -573,7 +580,7 @@ class SeoSite(Site):
         return filter_function(self)
 
     @staticmethod
-    def clear_caches(sites):
+    def clear_caches(sites, update_autocomplete=True):
         # Increment Configuration revision attributes, which is used
         # when calculating a custom_cache_pages cache key prefix.
         # This will effectively expire the page cache for custom_cache_page
@@ -587,7 +594,22 @@ class SeoSite(Site):
         site_cache_keys = ['%s:SeoSite' % site.domain for site in sites]
         buid_cache_keys = ['%s:buids' % key for key in site_cache_keys]
         social_cache_keys = ['%s:social_links' % site.domain for site in sites]
-        cache.delete_many(site_cache_keys + buid_cache_keys + social_cache_keys)
+        # Expires the job search results cached by seo.cache.job_results_key
+        results_cache_keys = ['job_results_version::%s' % site.pk
+                              for site in sites]
+        cache.delete_many(site_cache_keys + buid_cache_keys +
+                          social_cache_keys + results_cache_keys)
+        if update_autocomplete:
+            # Imported here to avoid a circular import; tasks imports
+            # seo.models.
+            from tasks import task_update_autocomplete
+
+            # Autocomplete suggestions (seo.autocomplete) are searched in
+            # Solr until they're counted again
+            site_ids = [site.pk for site in sites]
+            cache.delete_many(['autocomplete_version::%s' % site_id
+                               for site_id in site_ids])
+            task_update_autocomplete.delay(site_ids=site_ids)
 
     def email_domain_choices(self,):
         from postajob.models import CompanyProfile
@@ -786,7 +808,7 @@ class Company(models.Model):
     @property
     def has_packages(self):
         return self.sitepackage_set.filter(
-            sites__in=settings.SITE.postajob_site_list()).exists()
+            sites__in=site_settings.SITE.postajob_site_list()).exists()
 
 
 @receiver(pre_save, sender=Company, dispatch_uid='pre_save_company_signal')
@@ -1317,10 +1339,15 @@ class BusinessUnit(models.Model):
 
     @staticmethod
     def clear_cache(buid):
-        """Clears the cache for related sites."""
+        """
+        Clears the cache for related sites. Their autocomplete suggestions
+        are left alone; they're counted again by
+        tasks.schedule_replicated_updates after each import.
+
+        """
         sites = SeoSite.objects.filter(business_units=buid).exclude(
             site_tags__site_tag='network')
-        SeoSite.clear_caches(sites)
+        SeoSite.clear_caches(sites, update_autocomplete=False)
 
 
 class Country(models.Model):
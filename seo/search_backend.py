@@ -1,4 +1,5 @@
 import operator
+import re
 
 from haystack.backends import log_query, EmptyResults, SQ
 from haystack.backends.solr_backend import SolrEngine, SolrSearchQuery
@@ -8,10 +9,137 @@ from haystack.query import SearchQuerySet
 from haystack.utils import IDENTIFIER_REGEX
 from django.conf import settings
 
-from pysolr import SolrError
+from pysolr import Results, SolrError
 from seo_pysolr import Solr
 
 
+# Fields whose filter queries list ids, e.g. buid:(3 OR 1 OR 2). The ids are
+# sorted and deduplicated so that the same set always makes the same query.
+ID_LIST_FIELDS = ('buid', 'on_sites')
+ID_LIST_RE = re.compile(r'\b(?P<field>%s):\((?P<ids>\d+(?:\s+OR\s+\d+)*)\)'
+                        % '|'.join(ID_LIST_FIELDS))
+BUID_LIST_RE = re.compile(r'^buid:\((?P<ids>\d+(?:\s+OR\s+\d+)*)\)$')
+
+# Filter queries that match a single job, e.g. when looking up a job by its
+# guid. They are almost never repeated, so they're kept out of Solr's
+# filterCache instead of evicting filters that are.
+UNCACHED_FILTER_RE = re.compile(r'^(id|uid|guid):\(?[^\s()]+\)?$')
+
+
+def _top_level(query):
+    """
+    Yields (index, character, depth) for each character of a query that isn't
+    escaped or inside quotes, where depth is the number of parentheses the
+    character is inside of.
+
+    """
+    depth = 0
+    quoted = False
+    i = 0
+    while i < len(query):
+        char = query[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted:
+            if char == ')':
+                depth -= 1
+            yield i, char, depth
+            if char == '(':
+                depth += 1
+        i += 1
+
+
+def _strip_parens(query):
+    """Removes parentheses that enclose an entire query."""
+    while query.startswith('(') and query.endswith(')'):
+        # In "(a) OR (b)", the first parenthesis closes before the end.
+        closed = [i for i, char, depth in _top_level(query)
+                  if char == ')' and depth == 0]
+        if closed != [len(query) - 1]:
+            break
+        query = query[1:-1].strip()
+    return query
+
+
+def _split_and(query):
+    """
+    Splits a query into the clauses it requires, if it's nothing but clauses
+    joined by AND (e.g. "(a) AND NOT (b) AND c:d"). Otherwise returns the
+    query as is.
+
+    """
+    query = _strip_parens(query.strip())
+    separators = [i for i, char, depth in _top_level(query)
+                  if depth == 0 and query.startswith(' AND ', i)]
+    if not separators:
+        return [query]
+
+    clauses = []
+    start = 0
+    for i in separators + [len(query)]:
+        clauses.append(query[start:i].strip())
+        start = i + len(' AND ')
+
+    for clause in clauses:
+        body = clause[len('NOT '):] if clause.startswith('NOT ') else clause
+        # Anything else separated by whitespace (OR, or implicit operators)
+        # makes splitting change the meaning of the query.
+        if not body or any(char.isspace() and depth == 0
+                           for i, char, depth in _top_level(body)):
+            return [query]
+    return [_strip_parens(clause) if not clause.startswith('NOT ') else clause
+            for clause in clauses]
+
+
+def _sort_ids(match):
+    ids = sorted(set(int(i) for i in match.group('ids').split(' OR ')))
+    return '%s:(%s)' % (match.group('field'), ' OR '.join(map(str, ids)))
+
+
+def canonical_filter_queries(narrow_queries):
+    """
+    Rewrites a search's filter queries so that equivalent filters are sent to
+    Solr as identical fq parameters, which Solr caches and reuses (its
+    filterCache is keyed by the exact query of each fq):
+
+    - Filters that are nothing but clauses joined by AND are split into one
+      fq per clause, so that each clause is cached on its own.
+    - Lists of business unit and site package ids are sorted and
+      deduplicated.
+    - Business unit lists of SOLR_TERMS_FILTER_MIN_VALUES ids or more use the
+      terms query parser.
+    - Filters that match a single job aren't cached.
+
+    Inputs:
+    :narrow_queries: An iterable of filter query strings
+
+    Returns:
+    A sorted list of filter query strings
+
+    """
+    min_terms = getattr(settings, 'SOLR_TERMS_FILTER_MIN_VALUES', None)
+    canonical = set()
+    for narrow_query in narrow_queries:
+        if narrow_query.startswith('{!'):
+            # Already uses local params; leave it to whoever wrote it.
+            canonical.add(narrow_query)
+            continue
+        for clause in _split_and(narrow_query):
+            clause = ID_LIST_RE.sub(_sort_ids, clause)
+            buids = BUID_LIST_RE.match(clause)
+            if buids and min_terms is not None:
+                ids = buids.group('ids').split(' OR ')
+                if len(ids) >= min_terms:
+                    clause = '{!terms f=buid}%s' % ','.join(ids)
+            if UNCACHED_FILTER_RE.match(clause):
+                clause = '{!cache=false}%s' % clause
+            canonical.add(clause)
+    return sorted(canonical)
+
+
 class DESearchQuerySet(SearchQuerySet):
     #Tracks which parameters have been added with add_param
     search_parameters = []
@@ -167,6 +295,31 @@ class DESearchQuerySet(SearchQuerySet):
         clone.query.add_query_facet(query)
         return clone
 
+    def group_queries(self, queries, limit=None, offset=None):
+        """
+        Also returns the results matching each of `queries` separately, as
+        part of the same Solr request (Solr's group.query). The facet counts
+        still cover every result of the search. Use groups() to get the
+        results.
+
+        Inputs:
+        :queries: An iterable of Solr query strings
+        :limit: Number of results to return for each query
+        :offset: Number of results to skip for each query
+
+        """
+        clone = self._clone()
+        clone.query.set_group_queries(queries, limit, offset)
+        return clone
+
+    def groups(self):
+        """
+        Returns the results of each query passed to group_queries, as a
+        dictionary of {query: {'results': [SearchResult, ...], 'hits': int}}.
+
+        """
+        return self.query.get_groups()
+
 
 class DESolrSearchQuery(SolrSearchQuery):
     search_parameters = []
@@ -180,6 +333,10 @@ class DESolrSearchQuery(SolrSearchQuery):
         self.facet_offset = None
         self.fields = None
         self.bf = None
+        self.group_queries = None
+        self.group_limit = None
+        self.group_offset = None
+        self._groups = None
 
     def build_params(self, *args, **kwargs):
         search_kwargs = super(DESolrSearchQuery, self).build_params(*args,
@@ -196,8 +353,13 @@ class DESolrSearchQuery(SolrSearchQuery):
             if kwarg in search_kwargs:
                 del search_kwargs[kwarg]
 
+        if search_kwargs.get('narrow_queries'):
+            search_kwargs['narrow_queries'] = set(
+                canonical_filter_queries(search_kwargs['narrow_queries']))
+
         attr_to_copy = ['facet_mincount', 'facet_limit', 'facet_prefix',
-                        'facet_sort', 'facet_offset', 'bf']
+                        'facet_sort', 'facet_offset', 'bf', 'group_queries',
+                        'group_limit', 'group_offset']
         attr_to_copy.extend(self.search_parameters)
 
         #Copy attributes from Search query to search_kwargs
@@ -208,6 +370,33 @@ class DESolrSearchQuery(SolrSearchQuery):
 
         return search_kwargs
 
+    def run(self, spelling_query=None, **kwargs):
+        """
+        Copy of SolrSearchQuery.run (haystack 2.1.0) that also keeps the
+        results of any group queries.
+
+        """
+        final_query = self.build_query()
+        search_kwargs = self.build_params(spelling_query, **kwargs)
+
+        results = self.backend.search(final_query, **search_kwargs)
+        self._results = results.get('results', [])
+        self._hit_count = results.get('hits', 0)
+        self._facet_counts = self.post_process_facets(results)
+        self._stats = results.get('stats', {})
+        self._spelling_suggestion = results.get('spelling_suggestion', None)
+        self._groups = results.get('groups', {})
+
+    def get_groups(self):
+        if self._groups is None:
+            self.run()
+        return self._groups
+
+    def set_group_queries(self, queries, limit=None, offset=None):
+        self.group_queries = list(queries)
+        self.group_limit = limit
+        self.group_offset = offset
+
     def set_bf(self, bf):
         """
         Sets Boost Functions for SearchQuery use when building Solr queries. 
@@ -252,6 +441,9 @@ class DESolrSearchQuery(SolrSearchQuery):
         clone.facet_offset = self.facet_offset
         clone.fields = self.fields
         clone.bf = self.bf
+        clone.group_queries = self.group_queries
+        clone.group_limit = self.group_limit
+        clone.group_offset = self.group_offset
         for param in self.search_parameters:
             setattr(clone, param, getattr(self, param, ""))
 
@@ -283,10 +475,17 @@ class DESolrSearchBackend(SolrSearchBackend):
                within=None, dwithin=None, distance_point=None,
                limit_to_registered_models=None, result_class=None,
                facet_mincount=None, facet_limit=None, facet_prefix=None,
-               facet_sort=None, facet_offset=None, bf=None, **kwargs):
+               facet_sort=None, facet_offset=None, bf=None,
+               group_queries=None, group_limit=None, group_offset=None,
+               **kwargs):
         """
         Overrides both search() and build_search_kwargs().
 
+        When `group_queries` is given, the results matching each of those
+        queries are returned separately under 'groups' (see
+        DESearchQuerySet.group_queries), so that several lists of results
+        and the facet counts of all of them take a single request.
+
         """
 
         if len(query_string) == 0:
@@ -419,7 +618,19 @@ class DESolrSearchBackend(SolrSearchBackend):
                 narrow_queries.add('%s:(%s)' % (DJANGO_CT, ' OR '.join(registered_models)))
 
         if narrow_queries is not None:
-            kwargs['fq'] = list(narrow_queries)
+            kwargs['fq'] = sorted(narrow_queries)
+
+        if group_queries:
+            kwargs['group'] = 'true'
+            kwargs['group.query'] = group_queries
+            # Solr sorts the documents of each group by group.sort, which
+            # defaults to relevance rather than the search's sort.
+            if 'sort' in kwargs:
+                kwargs['group.sort'] = kwargs['sort']
+            if group_limit is not None:
+                kwargs['group.limit'] = group_limit
+            if group_offset is not None:
+                kwargs['group.offset'] = group_offset
 
         # if within is not None:
         #     from haystack.utils.geo import generate_bounding_box
@@ -457,8 +668,41 @@ class DESolrSearchBackend(SolrSearchBackend):
             self.log.error("Failed to query Solr using '%s': %s", query_string, e)
             raw_results = EmptyResults()
 
-        return self._process_results(raw_results, highlight=highlight,
-                                     result_class=result_class)
+        results = self._process_results(raw_results, highlight=highlight,
+                                        result_class=result_class)
+        if group_queries:
+            results['groups'] = self._process_groups(raw_results,
+                                                     group_queries,
+                                                     highlight=highlight,
+                                                     result_class=result_class)
+            # Grouped responses don't have an ungrouped result list, only
+            # the number of documents that matched the search.
+            grouped = getattr(raw_results, 'grouped', {})
+            if grouped:
+                results['hits'] = grouped.values()[0].get('matches', 0)
+        return results
+
+    def _process_groups(self, raw_results, group_queries, highlight=False,
+                        result_class=None):
+        """
+        Processes the doclist of each group query in a grouped response
+        the same way as an ungrouped response's results.
+
+        """
+        grouped = getattr(raw_results, 'grouped', {})
+        groups = {}
+        for query in group_queries:
+            doclist = grouped.get(query, {}).get('doclist', {})
+            group_results = Results(doclist.get('docs', []),
+                                    doclist.get('numFound', 0),
+                                    highlighting=getattr(raw_results,
+                                                         'highlighting', {}))
+            processed = self._process_results(group_results,
+                                              highlight=highlight,
+                                              result_class=result_class)
+            groups[query] = {'results': processed['results'],
+                             'hits': processed['hits']}
+        return groups
 
     def build_schema(self, fields):
         content_field_name = ''
@@ -123,6 +123,8 @@ class JobIndex(indexes.SearchIndex, indexes.Indexable):
     uid = indexes.IntegerField(model_attr='uid')
     guid = ExactStringField(model_attr='guid')
     zipcode = indexes.CharField(model_attr='zipcode', null=True)
+    # Used by import_jobs to only re-index jobs that have changed.
+    content_hash = StringField(indexed=False, null=True)
 
     # Fields for post-a-job
     is_posted = indexes.BooleanField()
@@ -1,10 +1,16 @@
 import Queue
 
 from django.contrib import messages
-from django.db.models.signals import post_save, pre_delete, pre_save
+from django.db.models import Q
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete, pre_save)
 from django.dispatch import Signal, receiver
 
-from seo.models import Configuration, SeoSite, Company
+from mysearches.helpers import expire_feed_companies
+from postajob.models import SitePackage
+from seo.models import (Configuration, SeoSite, SeoSiteFacet, Company,
+                        CustomFacet)
+from seo.site_context import bump_site_context_version
 
 
 # We're a using queue to store messages until they can be read by their handler
@@ -133,3 +139,123 @@ def seosite_change_monitor(sender, instance, **kwargs):
         return None
     if old_instance.domain != instance.domain:
         microsite_moved.send(sender=instance, old_domain=old_instance.domain) 
+
+
+# Any change to the models a SiteContext is built from expires the cached
+# contexts of every site.
+for model in (SeoSite, SeoSiteFacet, CustomFacet, SitePackage):
+    uid = 'seo.site_context.%s' % model.__name__
+    post_save.connect(bump_site_context_version, sender=model,
+                      dispatch_uid=uid)
+    post_delete.connect(bump_site_context_version, sender=model,
+                        dispatch_uid=uid)
+for through in (SeoSite.business_units.through, SeoSite.site_tags.through,
+                SitePackage.sites.through):
+    m2m_changed.connect(bump_site_context_version, sender=through,
+                        dispatch_uid='seo.site_context.%s' % through.__name__)
+
+
+def update_custom_facet_counts(sender, instance, **kwargs):
+    """
+    Recomputes the precomputed custom facet counts (see
+    seo.cache.materialize_custom_facet_counts) of the sites a custom facet
+    is used on, or the site a facet was added to.
+
+    """
+    # Imported here to avoid a circular import; tasks imports seo.
+    from tasks import task_update_custom_facet_counts
+
+    if sender is SeoSiteFacet:
+        site_ids = [instance.seosite_id]
+    else:
+        site_ids = list(instance.seosite_set.values_list('pk', flat=True))
+    if site_ids:
+        task_update_custom_facet_counts.delay(site_ids=site_ids)
+
+
+# Connected after bump_site_context_version, so that the counts are computed
+# from the new site contexts.
+for model in (CustomFacet, SeoSiteFacet):
+    post_save.connect(update_custom_facet_counts, sender=model,
+                      dispatch_uid='seo.custom_facet_counts.%s' % model.__name__)
+
+
+# The Company fields shown in company directories.
+COMPANY_DIRECTORY_FIELDS = ('name', 'company_slug', 'logo_url',
+                            'canonical_microsite', 'member')
+
+
+def snapshot_company_directory_fields(sender, instance, **kwargs):
+    """
+    Remembers the directory fields a company was loaded or saved with, so
+    that update_company_directories can tell whether they changed. Deferred
+    fields haven't been loaded, so they aren't remembered.
+
+    """
+    instance._directory_snapshot = dict(
+        (field, instance.__dict__[field]) for field in COMPANY_DIRECTORY_FIELDS
+        if field in instance.__dict__)
+
+
+def update_company_directories(sender, instance, action='post_save',
+                               pk_set=None, **kwargs):
+    """
+    Rebuilds the company directories (see
+    seo.cache.materialize_company_directory) of the sites a company is
+    listed on when the company or its business units change. Saving a
+    company without changing what the directories show doesn't rebuild them.
+
+    """
+    # Imported here to avoid a circular import; seo.cache imports seo.models.
+    from seo.cache import schedule_company_directories
+
+    if kwargs.get('reverse'):
+        # Companies were added to or removed from a business unit.
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+        buids = set([instance.pk])
+    elif action == 'pre_clear':
+        # The business units a company is removed from are gone by
+        # post_clear.
+        instance._cleared_buids = list(
+            instance.job_source_ids.values_list('pk', flat=True))
+        return
+    elif action not in ('post_save', 'post_add', 'post_remove', 'post_clear'):
+        return
+    else:
+        if action == 'post_save':
+            saved = getattr(instance, '_directory_snapshot', {})
+            snapshot_company_directory_fields(sender, instance)
+            if (not kwargs.get('created') and
+                    all(field in saved and
+                        saved[field] == getattr(instance, field)
+                        for field in COMPANY_DIRECTORY_FIELDS)):
+                return
+        buids = set(instance.job_source_ids.values_list('pk', flat=True))
+        buids.update(pk_set or [])
+        if action == 'post_clear':
+            buids.update(getattr(instance, '_cleared_buids', []))
+
+    # Companies without business units aren't listed anywhere.
+    if not buids:
+        return
+    sites = SeoSite.objects.filter(Q(business_units__in=buids) |
+                                   Q(business_units__isnull=True))
+    schedule_company_directories(
+        sites.values_list('pk', flat=True).distinct())
+
+
+post_init.connect(snapshot_company_directory_fields, sender=Company,
+                  dispatch_uid='seo.company_directories.Company')
+post_save.connect(update_company_directories, sender=Company,
+                  dispatch_uid='seo.company_directories.Company')
+m2m_changed.connect(update_company_directories,
+                    sender=Company.job_source_ids.through,
+                    dispatch_uid='seo.company_directories.job_source_ids')
+
+
+# Feed items show the logos of member companies by name.
+post_save.connect(expire_feed_companies, sender=Company,
+                  dispatch_uid='seo.feed_companies.Company')
+post_delete.connect(expire_feed_companies, sender=Company,
+                    dispatch_uid='seo.feed_companies.Company')
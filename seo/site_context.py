@@ -0,0 +1,196 @@
+from collections import namedtuple, OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+
+from postajob.models import SitePackage
+from seo.models import SeoSite, SeoSiteFacet
+from universal import site_settings
+
+# Everything the middleware needs to know about a host, compiled once and then
+# shared by every request for that host. Building one takes several queries;
+# with a warm per-process cache, using one takes none.
+#
+# Contexts are cached per process and in memcached under a global version
+# number. Saving an SeoSite, SeoSiteFacet, CustomFacet or SitePackage bumps
+# the version (see seo.signals), which expires every cached context at once.
+# The process that made the change also bumps its own generation, so it sees
+# the change even when the cache doesn't keep the version (e.g. DummyCache).
+SITE_CONTEXT_VERSION_KEY = 'site_context:version'
+
+# Maximum number of hosts whose context each process keeps in memory.
+SITE_CONTEXT_CACHE_SIZE = getattr(settings, 'SITE_CONTEXT_CACHE_SIZE', 256)
+
+
+SiteContext = namedtuple('SiteContext', [
+    'site',
+    'site_id',
+    'site_name',
+    'domain',
+    'buids',
+    'tags',
+    'title',
+    'heading',
+    'description',
+    'default_facets',
+    'featured_facets',
+    'standard_facets',
+    'packages',
+])
+
+
+_local_contexts = OrderedDict()
+_local_contexts_lock = threading.Lock()
+_local_generation = 0
+
+
+def get_site_context(host):
+    """
+    Returns the SiteContext for a host, building it only if neither this
+    process nor memcached has a current one.
+
+    Inputs:
+        :host: The host name of the request, without a port.
+
+    """
+    version = (_local_generation, get_site_context_version())
+    with _local_contexts_lock:
+        cached = _local_contexts.pop(host, None)
+        if cached is not None and cached[0] == version:
+            # Re-insert to mark the host as the most recently used.
+            _local_contexts[host] = cached
+            return cached[1]
+
+    key = '%s:site_context:%s' % (host, version[1])
+    context = cache.get(key)
+    if context is None:
+        context = build_site_context(host)
+        minutes = getattr(settings, 'MINUTES_TO_CACHE', 120)
+        cache.set(key, context, minutes * 60)
+
+    with _local_contexts_lock:
+        _local_contexts[host] = (version, context)
+        while len(_local_contexts) > SITE_CONTEXT_CACHE_SIZE:
+            _local_contexts.popitem(last=False)
+    return context
+
+
+def get_site_context_version():
+    version = cache.get(SITE_CONTEXT_VERSION_KEY)
+    if version is None:
+        # If memcached loses the version, start over from a number that
+        # can't match any context cached under the old one.
+        cache.add(SITE_CONTEXT_VERSION_KEY, int(time.time()), None)
+        version = cache.get(SITE_CONTEXT_VERSION_KEY)
+    return version
+
+
+def bump_site_context_version(**kwargs):
+    """
+    Expires every cached SiteContext. Takes **kwargs so that it can be
+    connected directly to model signals.
+
+    """
+    global _local_generation
+    with _local_contexts_lock:
+        _local_generation += 1
+    try:
+        cache.incr(SITE_CONTEXT_VERSION_KEY)
+    except ValueError:
+        cache.set(SITE_CONTEXT_VERSION_KEY, int(time.time()), None)
+
+
+def clear_local_site_contexts():
+    """Empties this process's cache of site contexts."""
+    with _local_contexts_lock:
+        _local_contexts.clear()
+
+
+def activate_site_context(context):
+    """
+    Makes a SiteContext the current thread's site settings (see
+    universal.site_settings), replacing those of any previous request.
+
+    """
+    site_settings.activate(site_context_settings(context))
+
+
+def site_context_settings(context):
+    """Returns the site settings of a SiteContext, as a dictionary."""
+    site = context.site
+    return {
+        'SITE': site,
+        'SITE_ID': context.site_id,
+        'SITE_NAME': context.site_name,
+        'SITE_BUIDS': list(context.buids),
+        'SITE_TAGS': list(context.tags),
+        'SITE_TITLE': context.title,
+        'SITE_HEADING': context.heading,
+        'SITE_DESCRIPTION': context.description,
+        # Related managers and objects of the site; these default to an
+        # empty string
+        'ATS_SOURCE_CODES': site.ats_source_codes or '',
+        'GA_CAMPAIGN': site.google_analytics_campaigns or '',
+        'COMMITMENTS': site.special_commitments or '',
+        'VIEW_SOURCE': site.view_sources or '',
+        'DEFAULT_FACET': list(context.default_facets),
+        'FEATURED_FACET': list(context.featured_facets),
+        'STANDARD_FACET': list(context.standard_facets),
+        'SITE_PACKAGES': list(context.packages),
+    }
+
+
+def build_site_context(host):
+    """
+    Queries everything needed for a host's SiteContext. The default site
+    (id 1) is used for hosts that don't match any SeoSite.
+
+    """
+    #DO NOT add filters to prefetched objects. Use only with .all()
+    sites = SeoSite.objects.select_related('group',
+                                           'microsite_carousel',
+                                           'view_sources',
+                                           ).prefetch_related('billboard_images',
+                                                              'business_units',
+                                                              'featured_companies',
+                                                              'site_tags',
+                                                              'google_analytics')
+    try:
+        site = sites.get(domain=host)
+    except Site.MultipleObjectsReturned:
+        site = sites.filter(domain=host)[:1][0]
+    except Site.DoesNotExist:
+        site = sites.get(id=1)
+
+    facets = {SeoSiteFacet.DEFAULT: [],
+              SeoSiteFacet.FEATURED: [],
+              SeoSiteFacet.STANDARD: []}
+    site_facets = SeoSiteFacet.objects.filter(seosite=site)
+    for site_facet in site_facets.select_related('customfacet'):
+        custom_facet = site_facet.customfacet
+        custom_facet.boolean_operation = site_facet.boolean_operation
+        custom_facet.facet_group = site_facet.facet_group
+        facets.setdefault(site_facet.facet_type, []).append(custom_facet)
+
+    packages = SitePackage.objects.filter(sites=site).values_list('pk',
+                                                                  flat=True)
+
+    return SiteContext(
+        site=site,
+        site_id=site.id,
+        site_name=site.name,
+        domain=site.domain,
+        buids=tuple(bu.id for bu in site.business_units.all()),
+        tags=tuple(tag.site_tag for tag in site.site_tags.all()),
+        # title and heading default to the site name
+        title=site.site_title or site.name,
+        heading=site.site_heading or site.name,
+        description=site.site_description or None,
+        default_facets=tuple(facets[SeoSiteFacet.DEFAULT]),
+        featured_facets=tuple(facets[SeoSiteFacet.FEATURED]),
+        standard_facets=tuple(facets[SeoSiteFacet.STANDARD]),
+        packages=tuple(int(pk) for pk in packages),
+    )
@@ -1,15 +1,40 @@
+from contextlib import closing
 import datetime
+import gzip
+import hashlib
+import json
 import math
+from StringIO import StringIO
 from slugify import slugify
 from solrsitemap import SolrSitemap
 
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.urlresolvers import NoReverseMatch, reverse
+from django.template.loader import render_to_string
+from django.utils.encoding import smart_str
 
 from seo.search_backend import DESearchQuerySet
 from seo.helpers import sqs_apply_custom_facets
+from seo.site_context import get_site_context, site_context_settings
+from seo_pysolr import Solr
+from universal import site_settings as site_settings_module
+from universal.site_settings import site_settings
+
+# Sitemaps are built ahead of time (see build_site_sitemaps) and stored as
+# gzipped files, one per page of jobs for each day, along with a manifest
+# of the days and pages, under this directory of the default storage.
+SITEMAP_DIRECTORY = 'sitemaps'
+
+# Number of days of jobs listed in the sitemap index.
+SITEMAP_HISTORY = 30
+
+# Job fields used to build sitemap urls.
+SITEMAP_FIELDS = ['title', 'location', 'uid', 'guid']
 
 
 class DESolrSitemap(SolrSitemap):
@@ -27,16 +52,17 @@ class DESolrSitemap(SolrSitemap):
     """
     #Required solr document fields. date_new is used by lastmod()
     required_fields = ['date_new']
+    # Number of jobs on each page
+    limit = 2000
 
     def __init__(self, fields=None, queryclass=DESearchQuerySet, **kwargs):
         # 'fields' is an iterable of field names that correspond to fields in
         # the index. Whatever fields you would put into the 'fl' parameter for
         # Solr's API are the same fields that should be present in the 'fields'
         # kwarg.
-        self.limit = 2000
         self.fields = fields or []
         self.fields.extend(self.required_fields)
-        self.buids = settings.SITE_BUIDS
+        self.buids = site_settings.SITE_BUIDS
         self.buid_str = " OR ".join([str(i) for i in self.buids])
         super(DESolrSitemap, self).__init__(queryclass=queryclass, **kwargs)
         
@@ -46,7 +72,7 @@ class DESolrSitemap(SolrSitemap):
         if self.buids:
             sqs = sqs.narrow("buid:(%s)" % self.buid_str)
 
-        sqs = sqs_apply_custom_facets(settings.DEFAULT_FACET, sqs)
+        sqs = sqs_apply_custom_facets(site_settings.DEFAULT_FACET, sqs)
 
         if self.fields:
             sqs = sqs.fields(self.fields)
@@ -190,9 +216,8 @@ class DateSitemap(DESolrSitemap):
 
     def numpages(self, startdate, enddate, field='date_new'):
         """
-        This method gets the counts for each individual date in the
-        `[startdate, enddate]` date range. By default, the `numpages`
-        method makes an HTTP request to Solr for every date.
+        This method gets the number of pages for each individual date in the
+        `[startdate, enddate]` date range (see daycounts).
 
         This method will not work if the DateSitemap instance it is bound
         to is passed a value for `fields` during instantiation. This is
@@ -203,6 +228,32 @@ class DateSitemap(DESolrSitemap):
         :startdate: 
         :enddate:
         
+        """
+        facetcounts = self.daycounts(startdate, enddate, field)
+        for ymd, count in facetcounts.items():
+            # Divide the number of results by self.limit and round up to derive
+            # the number of pages required to display all the jobs for a given
+            # date. When we add it to the dictionary, however, coerce it to an
+            # int. Using a float with range is deprecated.
+            val = math.ceil(float(count)/self.limit)
+            facetcounts[ymd] = int(val)
+
+        return facetcounts
+
+    def daycounts(self, startdate, enddate, field='date_new', narrow=None):
+        """
+        Gets the number of jobs for each individual date in the
+        `[startdate, enddate]` date range, in a single request to Solr.
+
+        Inputs::
+        :startdate: 
+        :enddate:
+        :field: The date field to count jobs by
+        :narrow: An additional query that the counted jobs must match
+
+        Returns::
+        A dictionary of {<date in ISO format>: <number of jobs>}
+
         """
         # The date format Solr uses to represent dates.
         solr_date_fmt = "%Y-%m-%dT%H:%M:%SZ"
@@ -211,6 +262,8 @@ class DateSitemap(DESolrSitemap):
         # of fields that Haystack requires, but those are added behind the
         # scenes in seo.search_backend.DESolrQuery).
         sqs = super(DateSitemap, self)._sqs()._clone().fields(['uid'])
+        if narrow:
+            sqs = sqs.narrow(narrow)
         # In Haystack, the idiomatic way to get specify some number of rows
         # aside from the default number (10, usually) is to use slice notation,
         # so like sqs[0:20] to get 20 rows. However this won't work for us since
@@ -246,12 +299,7 @@ class DateSitemap(DESolrSitemap):
                 
             # Only get year, month and day values.
             ymd = datetime.date(*dt.timetuple()[0:3]).isoformat()
-            # Divide the number of results by self.limit and round up to derive
-            # the number of pages required to display all the jobs for a given
-            # date. When we add it to the dictionary, however, coerce it to an
-            # int. Using a float with range is deprecated.
-            val = math.ceil(float(facetcounts.pop(k))/self.limit)
-            facetcounts[ymd] = int(val)
+            facetcounts[ymd] = facetcounts.pop(k)
 
         return facetcounts
 
@@ -263,3 +311,206 @@ class DateSitemap(DESolrSitemap):
         lastnight = datetime.datetime(*date_val[0:3])
         tonight = lastnight + oneday
         return [lastnight, tonight]
+
+
+def sitemap_dates(today=None):
+    """
+    Returns the dates listed in the sitemap index, newest first. The index
+    lists the SITEMAP_HISTORY days up to and including yesterday.
+
+    """
+    if today is None:
+        today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    return [yesterday - datetime.timedelta(days=i)
+            for i in xrange(SITEMAP_HISTORY)]
+
+
+def sitemap_count_range(dates):
+    """
+    Returns the start and end of the range of dates to count jobs over
+    (see DateSitemap.daycounts) for a list of dates from sitemap_dates.
+
+    """
+    # The latest date/time in sitemaps is the end (time.max) of the newest
+    # date.
+    latest_datetime = datetime.datetime.combine(dates[0], datetime.time.max)
+    earliest_day = dates[-1] - datetime.timedelta(days=1)
+    return earliest_day, latest_datetime
+
+
+def sitemap_path(domain, name):
+    return '%s/%s/%s' % (SITEMAP_DIRECTORY, domain, name)
+
+
+def sitemap_page_name(jobdate, page):
+    return '%s-%s.xml.gz' % (jobdate, page)
+
+
+def sitemap_manifest_key(domain):
+    return 'sitemap_manifest::%s' % domain
+
+
+def get_sitemap_manifest(domain):
+    """
+    Returns the manifest of a site's built sitemaps, or None if they haven't
+    been built.
+
+    The manifest is a dictionary of the Solr _version_ the sitemaps are
+    up to date with ('version'), and of the days in the index ('days'). Each
+    day is a dictionary of its number of jobs ('count') and of the md5 hash
+    of each of its pages ('pages').
+
+    """
+    key = sitemap_manifest_key(domain)
+    manifest = cache.get(key)
+    if manifest is None:
+        path = sitemap_path(domain, 'manifest.json')
+        if default_storage.exists(path):
+            with closing(default_storage.open(path)) as manifest_file:
+                manifest = json.load(manifest_file)
+        else:
+            # Remember that there isn't one, too.
+            manifest = {}
+        cache.set(key, manifest, 60 * settings.MINUTES_TO_CACHE)
+    return manifest or None
+
+
+def get_sitemap_page(domain, jobdate, page):
+    """
+    Returns the gzipped contents of a built sitemap page, or None if there
+    isn't one.
+
+    """
+    path = sitemap_path(domain, sitemap_page_name(jobdate, page))
+    try:
+        with closing(default_storage.open(path)) as page_file:
+            return page_file.read()
+    except (IOError, OSError):
+        return None
+
+
+def _save(path, content):
+    # Storages add a suffix to the name of a new file rather than replace
+    # an existing one.
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(content))
+
+
+def _gzip(content):
+    data = StringIO()
+    # A fixed mtime keeps the output the same for the same content.
+    with closing(gzip.GzipFile(filename='', mode='wb', fileobj=data,
+                               mtime=0)) as gz:
+        gz.write(content)
+    return data.getvalue()
+
+
+def latest_solr_version():
+    """
+    Returns the newest _version_ in the Solr index. Solr gives every
+    document a larger _version_ than any before it whenever it's added or
+    updated.
+
+    """
+    conn = Solr(settings.HAYSTACK_CONNECTIONS['default']['URL'])
+    docs = conn.search('*:*', fl='_version_', sort='_version_ desc',
+                       rows=1).docs
+    return docs[0]['_version_'] if docs else None
+
+
+def build_site_sitemaps(site, today=None):
+    """
+    Brings a site's built sitemaps up to date.
+
+    Only the days whose jobs have changed since the last build are built
+    again: those with jobs added or updated since then (by their _version_)
+    and those with a different number of jobs (for deleted jobs). Only the
+    pages whose contents have changed are written.
+
+    Inputs:
+    :site: An SeoSite
+    :today: The date to build the sitemaps as of; defaults to today
+
+    Returns:
+    True if any page of the site's sitemaps or its index changed
+
+    """
+    context = get_site_context(site.domain)
+    with site_settings_module.override(site_context_settings(context)):
+        return _build_site_sitemaps(site, today)
+
+
+def _build_site_sitemaps(site, today):
+    # The version is read first, so that jobs updated during the build are
+    # built again next time.
+    version = latest_solr_version()
+    manifest = get_sitemap_manifest(site.domain) or {'version': None,
+                                                    'days': {}}
+    dates = sitemap_dates(today)
+    startdate, enddate = sitemap_count_range(dates)
+    counter = DateSitemap()
+    counts = counter.daycounts(startdate, enddate)
+    if manifest['version'] is not None:
+        updated = counter.daycounts(
+            startdate, enddate,
+            narrow='_version_:{%s TO *]' % manifest['version'])
+    else:
+        updated = counts
+
+    changed = False
+    days = {}
+    for date in dates:
+        jobdate = date.isoformat()
+        count = counts.get(jobdate, 0)
+        old = manifest['days'].get(jobdate)
+        if (old is not None and old['count'] == count and
+                not updated.get(jobdate)):
+            days[jobdate] = old
+            continue
+
+        old_pages = old['pages'] if old else []
+        pages = _build_day(site, jobdate, count, old_pages)
+        changed = changed or pages != old_pages
+        days[jobdate] = {'count': count, 'pages': pages}
+
+    # Delete the pages that are no longer in the index.
+    for jobdate, old in manifest['days'].iteritems():
+        num_pages = len(days[jobdate]['pages']) if jobdate in days else 0
+        for page in xrange(num_pages + 1, len(old['pages']) + 1):
+            default_storage.delete(
+                sitemap_path(site.domain, sitemap_page_name(jobdate, page)))
+        changed = changed or jobdate not in days
+
+    if (version, days) == (manifest['version'], manifest['days']):
+        return False
+    manifest = {'version': version, 'days': days}
+    _save(sitemap_path(site.domain, 'manifest.json'), json.dumps(manifest))
+    cache.set(sitemap_manifest_key(site.domain), manifest,
+              60 * settings.MINUTES_TO_CACHE)
+    return changed
+
+
+def _build_day(site, jobdate, count, old_pages):
+    """
+    Builds and writes the pages of a site's sitemap for a day, skipping the
+    pages that haven't changed, and returns the md5 hash of each page.
+
+    """
+    hashes = []
+    limit = DESolrSitemap.limit
+    # Days without jobs still have a (empty) first page, as they're listed
+    # in the index.
+    num_pages = max(1, int(math.ceil(float(count) / limit)))
+    for page in xrange(1, num_pages + 1):
+        sitemap = DateSitemap(page=page, fields=list(SITEMAP_FIELDS),
+                              jobdate=jobdate)
+        xml = smart_str(render_to_string('sitemap.xml',
+                                         {'urlset': sitemap.get_urls(site)}))
+        digest = hashlib.md5(xml).hexdigest()
+        if page > len(old_pages) or old_pages[page - 1] != digest:
+            _save(sitemap_path(site.domain, sitemap_page_name(jobdate, page)),
+                  _gzip(xml))
+        hashes.append(digest)
+    return hashes
@@ -13,6 +13,8 @@ from django.template import context
 
 from seo_pysolr import Solr
 from import_jobs import DATA_DIR
+from seo.site_context import clear_local_site_contexts
+from universal import site_settings
 from seo.tests.factories import BusinessUnitFactory
 import solr_settings
 
@@ -71,6 +73,8 @@ class DirectSEOBase(TestCase):
         self.conn = Solr('http://127.0.0.1:8983/solr/seo')
         self.conn.delete(q="*:*")
         cache.clear()
+        clear_local_site_contexts()
+        site_settings.deactivate()
         clear_url_caches()
 
         # Change the solr engine to one that has been extended
@@ -9,6 +9,7 @@ from seo.models import CustomFacet
 from seo.tests.factories import (BusinessUnitFactory, CustomFacetFactory,
                                  SeoSiteFacetFactory, SeoSiteFactory)
 from seo.tests.setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 class BreadboxTests(DirectSEOBase):
@@ -16,16 +17,16 @@ class BreadboxTests(DirectSEOBase):
         super(BreadboxTests, self).setUp()
 
         self.site = SeoSiteFactory()
-        settings.SITE = self.site
-        settings.SITE_ID = self.site.pk
-        settings.STANDARD_FACET = []
+        site_settings.SITE = self.site
+        site_settings.SITE_ID = self.site.pk
+        site_settings.STANDARD_FACET = []
         for x in range(1, 4):
             facet = CustomFacetFactory(name_slug='custom-facet-%s' % x,
                                        name="Custom Facet %s" % x,
                                        always_show=True,
                                        show_production=1)
             SeoSiteFacetFactory(customfacet=facet, seosite=self.site)
-            settings.STANDARD_FACET.append(facet)
+            site_settings.STANDARD_FACET.append(facet)
 
         kwargs = {'seositefacet__seosite': self.site}
         self.custom_facets = CustomFacet.objects.filter(**kwargs)
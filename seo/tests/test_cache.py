@@ -1,9 +1,9 @@
 # -*- coding: utf-8 -*-
-from django.conf import settings
 
-from seo.cache import get_facet_count_key
+from seo.cache import get_facet_count_key, job_results_key
 from seo.helpers import build_filter_dict
 from setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 class SeoCacheTestCase(DirectSEOBase):
@@ -20,7 +20,7 @@ class SeoCacheTestCase(DirectSEOBase):
         key1 = get_facet_count_key(filters1)
         key2 = get_facet_count_key(filters2)
         key3 = get_facet_count_key(filters3)
-        settings.SITE_ID = 10
+        site_settings.SITE_ID = 10
         key4 = get_facet_count_key(filters1)
 
         self.assertNotEqual(key2, key3)
@@ -28,4 +28,20 @@ class SeoCacheTestCase(DirectSEOBase):
         self.assertNotEqual(key4, key1)
         self.assertEqual(key1, key3)
 
+    def test_job_results_key(self):
+        """
+        Job results keys only depend on the parameters that change which
+        jobs are found.
+
+        """
+        filters = build_filter_dict('/dubuque/jobs/standard-facet/new-jobs/')
+        key = job_results_key('jobs', filters, {'q': 'nurse'}, 'relevance')
 
+        self.assertEqual(key, job_results_key(
+            'jobs', filters, {'q': 'nurse ', 'utm_source': 'x'}, 'relevance'))
+        self.assertNotEqual(key, job_results_key(
+            'jobs', filters, {'q': 'nurse'}, 'date'))
+        self.assertNotEqual(key, job_results_key(
+            'jobs', filters, {'q': 'driver'}, 'relevance'))
+        self.assertNotEqual(key, job_results_key(
+            'jobs', {}, {'q': 'nurse'}, 'relevance'))
@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 from re import finditer
 
-from django.conf import settings
 from django.core.urlresolvers import reverse_lazy
 
 from seo import helpers, models
 from seo.tests import factories
 from setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 filter_types = ['city', 'state', 'country', 'title', 'company', 'moc',
@@ -26,8 +26,8 @@ class FiltersTestCase(DirectSEOBase):
         super(FiltersTestCase, self).setUp()
         self.request = DummyRequest()
         self.site = models.SeoSite.objects.first()
-        settings.SITE = self.site
-        settings.SITE_ID = self.site.pk
+        site_settings.SITE = self.site
+        site_settings.SITE_ID = self.site.pk
         self.config = factories.ConfigurationFactory(num_filter_items_to_show=5)
         for filter_type in filter_types:
             setattr(self.config, 'browse_%s_show' % filter_type, True)
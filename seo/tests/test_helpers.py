@@ -3,12 +3,12 @@ from decimal import Decimal
 from collections import namedtuple
 from mock import patch
 
-from django.conf import settings
-
 from seo import helpers
 from seo.models import CustomFacet
+from seo.search_backend import canonical_filter_queries
 from seo.tests import factories
 from setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 class SeoHelpersTestCase(DirectSEOBase):
@@ -20,12 +20,12 @@ class SeoHelpersTestCase(DirectSEOBase):
     def test_get_solr_facet_always_show(self):
         site_facet = factories.SeoSiteFacetFactory()
         site = site_facet.seosite
-        settings.SITE_ID = site.pk
-        settings.SITE = site
+        site_settings.SITE_ID = site.pk
+        site_settings.SITE = site
         custom_facet = site_facet.customfacet
         custom_facet.show_production = 1
         custom_facet.save()
-        settings.STANDARD_FACET = [custom_facet]
+        site_settings.STANDARD_FACET = [custom_facet]
 
         # The custom facet should have no results, and therefore should
         # not be in the list.
@@ -43,6 +43,26 @@ class SeoHelpersTestCase(DirectSEOBase):
         # The count should be 0.
         self.assertEqual(result_counts[0][1], 0)
 
+    def test_canonical_filter_queries(self):
+        """
+        Equivalent filters should make identical, separately cacheable
+        filter queries.
+
+        """
+        self.assertEqual(
+            canonical_filter_queries(['(buid:(3 OR 1 OR 3))',
+                                      '(title:(a) AND NOT (b:c))']),
+            ['NOT (b:c)', 'buid:(1 OR 3)', 'title:(a)'])
+        # Anything that isn't only ANDed clauses is left together
+        self.assertEqual(canonical_filter_queries(['(a) OR (b) AND (c)']),
+                         ['(a) OR (b) AND (c)'])
+        self.assertEqual(canonical_filter_queries(['guid:(ABC)']),
+                         ['{!cache=false}guid:(ABC)'])
+
+        with self.settings(SOLR_TERMS_FILTER_MIN_VALUES=2):
+            self.assertEqual(canonical_filter_queries(['buid:(2 OR 1)']),
+                             ['{!terms f=buid}1,2'])
+
     def test_featured_default_jobs(self):
         """
         Requests the number and offsets for featured and default jobs
@@ -144,7 +164,7 @@ class SeoHelpersDjangoTestCase(DirectSEOBase):
         to our function's local environment (where we've named it mock_active).
         We then override that objects behavior (it's return value in this case)
         to avoid having to set up a chain of sites and configurations
-        just to get settings.SITE_ID set so that active_site_facet works
+        just to get site_settings.SITE_ID set so that active_site_facet works
         correctly.
 
         """
@@ -183,4 +203,27 @@ class SeoHelpersDjangoTestCase(DirectSEOBase):
                 for term in present_terms:
                     self.assertNotEqual(query.find(term), -1)
                 for term in missing_terms:
-                    self.assertEqual(query.find(term), -1)
\ No newline at end of file
+                    self.assertEqual(query.find(term), -1)
+
+    def test_custom_facets_query_memoized(self):
+        """
+        The query of a set of custom facets should be built once, and built
+        again once one of the facets changes.
+
+        """
+        custom_facet = factories.CustomFacetFactory(title='Nurse')
+        custom_facet.boolean_operation = 'or'
+
+        query = helpers.custom_facets_query([custom_facet])
+        self.assertIn('Nurse', query)
+        with patch.object(helpers, 'create_sq') as create_sq:
+            self.assertEqual(helpers.custom_facets_query([custom_facet]),
+                             query)
+        self.assertFalse(create_sq.called)
+
+        custom_facet.title = 'Driver'
+        custom_facet.save()
+        query = helpers.custom_facets_query([custom_facet])
+        self.assertIn('Driver', query)
+        self.assertNotIn('Nurse', query)
+        self.assertIsNone(helpers.custom_facets_query([]))
@@ -2,14 +2,18 @@
 import os
 
 from django.conf import settings
+from django.test import TransactionTestCase
+import pysolr
 
-from seo_pysolr import Solr
-from import_jobs import (DATA_DIR, add_company, remove_expired_jobs, update_solr, get_jobs_from_zipfile,
-    filter_current_jobs)
+from seo_pysolr import Solr, SolrWriter
+from import_jobs import (DATA_DIR, add_company, add_jobs, remove_expired_jobs, update_solr, get_jobs_from_zipfile,
+    filter_current_jobs, solr_uids, content_hash, get_job_files_from_zipfile,
+    transform_jobs)
 
 from seo.models import BusinessUnit, Company
 from seo.tests.factories import BusinessUnitFactory, CompanyFactory
 from setup import DirectSEOBase
+from xmlparse import MocResolver
 
 
 class ImportJobsTestCase(DirectSEOBase):
@@ -37,6 +41,20 @@ class ImportJobsTestCase(DirectSEOBase):
         update_solr(self.buid_id)
         self.assertFalse(os.access(self.filepath, os.F_OK))
 
+    def test_solr_unchanged_jobs_not_resent(self):
+        """
+        Test that importing the same feed file twice only sends the jobs to
+        Solr the first time.
+
+        """
+        added, deleted = update_solr(self.buid_id, delete_feed=False)
+        self.assertTrue(added > 0)
+        self.solr.commit()
+        docs = self.solr.search('*:*', fl='content_hash').docs
+        self.assertTrue(all(doc.get('content_hash') for doc in docs))
+
+        self.assertEqual(update_solr(self.buid_id, download=False), (0, 0))
+
     def test_subsidiary_rename(self):
         company1 = CompanyFactory()
         company1.save()
@@ -149,6 +167,56 @@ class ImportJobsTestCase(DirectSEOBase):
             self.assertTrue([5, 6, 7, 8, 9, 10] not in ids)
 
 
+    def test_solr_uids(self):
+        buid = 12345
+        jobs = [{'id': 'seo.%s' % i, 'uid': i, 'buid': buid}
+                for i in range(25)]
+        jobs.append({'id': 'seo.100', 'uid': 100, 'buid': buid + 1})
+        self.solr.add(jobs)
+        self.solr.commit()
+
+        with self.settings(HAYSTACK_CONNECTIONS=self.solr_settings):
+            self.assertEqual(solr_uids(self.solr, buid), set(range(25)))
+            self.assertEqual(solr_uids(self.solr, buid, key='id'),
+                             set('seo.%s' % i for i in range(25)))
+            # A small page size makes the results span several cursors.
+            docs = list(self.solr.iter_search('*:*', fq='buid:%s' % buid,
+                                              fl='uid', rows=10))
+            self.assertEqual(len(docs), 25)
+
+    def test_solr_writer_isolates_rejected_docs(self):
+        """
+        Test that a document Solr won't accept doesn't prevent the rest of
+        its batch from being indexed.
+
+        """
+        jobs = [{'id': 'seo.%s' % i, 'uid': i, 'buid': 12345}
+                for i in range(10)]
+        jobs[4]['uid'] = 'not a uid'
+        url = settings.HAYSTACK_CONNECTIONS['default']['URL']
+        # The writer commits once it's closed.
+        with SolrWriter(url, threads=2) as writer:
+            writer.add(jobs)
+
+        self.assertEqual([doc['id'] for doc in writer.failed_docs],
+                         ['seo.4'])
+        self.assertEqual(self.solr.search('buid:12345').hits, 9)
+
+    def test_add_jobs_rejected_doc(self):
+        """
+        Test that add_jobs raises an error when Solr rejects a job, rather
+        than reporting it as added.
+
+        """
+        jobs = [{'id': 'seo.%s' % i, 'uid': i, 'buid': 12345}
+                for i in range(3)]
+        jobs[1]['uid'] = 'not a uid'
+
+        with self.assertRaises(pysolr.SolrError):
+            add_jobs(jobs)
+        self.assertEqual(self.solr.search('buid:12345').hits, 2)
+
+
 class LoadETLTestCase(DirectSEOBase):
     def setUp(self):
         
@@ -164,6 +232,16 @@ class LoadETLTestCase(DirectSEOBase):
     def tearDown(self):
         pass
     
+    def test_zipfile_not_extracted(self):
+        """Test that reading the zipfile does not write the jobs to disk"""
+        guid = "ce2ca701-eeca-4c13-96ba-e6bde9cb7060"
+        self.assertFalse(os.path.exists("/tmp/0/%s" % guid))
+        with open(self.zipfile) as zf:
+            jobs = get_jobs_from_zipfile(zf, guid)
+            jobs.next()
+            self.assertFalse(os.path.exists("/tmp/0/%s" % guid))
+            self.assertEqual(len(list(jobs)), 38)
+
     def test_filtering_on_includeinindex_bit(self):
         """Test that filtering on the include_in_index bit works"""
         
@@ -193,3 +271,34 @@ class LoadETLTestCase(DirectSEOBase):
         self.assertEqual(len(filtered_jobs), 39,
                          "filter_current_jobs should ignore the includeinindex bit, returning 39 jobs.  "
                          "Instead returned %s." % len(filtered_jobs))
+
+
+class TransformJobsTestCase(TransactionTestCase):
+    """
+    transform_jobs closes this process' database connections before
+    starting its process pool, which would end a TestCase's transaction.
+
+    """
+    def setUp(self):
+        self.guid = "ce2ca701-eeca-4c13-96ba-e6bde9cb7060"
+        zipfile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'data', 'ActiveDirectory_%s.zip' % self.guid)
+        with open(zipfile) as zf:
+            self.job_files = list(get_job_files_from_zipfile(zf, self.guid))
+        self.businessunit = BusinessUnitFactory(id=0)
+
+    def test_transform_jobs_in_process_pool(self):
+        """
+        Test that jobs transformed by a pool of processes are the same, and
+        in the same order, as jobs transformed in this process.
+
+        """
+        moc_resolver = MocResolver(self.businessunit.id)
+        expected = [content_hash(job) for job in transform_jobs(
+            self.job_files, self.businessunit, moc_resolver, processes=1)]
+
+        jobs = transform_jobs(self.job_files, self.businessunit,
+                              MocResolver(self.businessunit.id),
+                              processes=2, chunk_size=1)
+        self.assertEqual([content_hash(job) for job in jobs], expected)
+        self.assertEqual(len(expected), 38)
@@ -1,15 +1,22 @@
+import datetime
+
 import django.core.cache
+from django.test.client import RequestFactory
 import django.utils.cache
+from django.utils import timezone
 
 from mock import patch, Mock
 
+import import_jobs
 import middleware
-from seo import cache, models
+from seo import autocomplete, cache, helpers, models
+from seo.site_context import activate_site_context, get_site_context
 from seo.tests.setup import DirectSEOTestCase, patch_settings
 from seo.tests import factories
 from seo.views import search_views as views
 from seo.templatetags import seo_extras
-from tasks import task_clear_bu_cache
+from tasks import task_clear_bu_cache, task_update_autocomplete
+from universal.site_settings import site_settings
 
 
 class LocalCacheTestCase(DirectSEOTestCase):
@@ -24,6 +31,7 @@ class LocalCacheTestCase(DirectSEOTestCase):
         # to use our local memcache. Modules imported with different
         # namespaces need multiple patches
         self.cache_modules = [django.core.cache,
+                              autocomplete,
                               models,
                               cache,
                               views,
@@ -84,6 +92,147 @@ class LocalCacheTestCase(DirectSEOTestCase):
             self.assertEqual(len(solr_jobs), len(new_jobs))
 
 
+    def test_materialized_custom_facet_counts(self):
+        """
+        Precomputed custom facet counts should be used instead of querying
+        Solr, until the site's facets change.
+
+        """
+        site = factories.SeoSiteFactory()
+        site.business_units.add(self.businessunit)
+        site_facet = factories.SeoSiteFacetFactory(seosite=site)
+        custom_facet = site_facet.customfacet
+        custom_facet.always_show = True
+        custom_facet.save()
+
+        activate_site_context(get_site_context(site.domain))
+        expected = helpers.get_solr_facet(site_settings.SITE_BUIDS)
+        cache.materialize_custom_facet_counts(site)
+
+        request = RequestFactory().get('/')
+        with patch.object(cache, 'get_solr_facet') as get_solr_facet:
+            self.assertEqual(cache.get_custom_facets(request), expected)
+        self.assertFalse(get_solr_facet.called)
+
+        site_settings.STANDARD_FACET = []
+        self.assertIsNone(cache.get_materialized_custom_facets())
+
+    def test_counted_autocomplete(self):
+        """
+        Once a site's suggestions have been counted, the search box's
+        autocomplete is answered without querying Solr. Changing the site
+        counts them again.
+
+        """
+        site = factories.SeoSiteFactory()
+        site.business_units.add(self.businessunit)
+        autocomplete.build_site_autocomplete(site)
+
+        with patch.object(views, 'DESearchQuerySet') as search:
+            resp = self.client.get('/ajax/ac/',
+                                   {'lookup': 'title', 'term': 'ret'},
+                                   HTTP_HOST=u'buckconsultants.jobs')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(search.called)
+        self.assertContains(resp, 'Retail Associate')
+
+        with patch.object(task_update_autocomplete, 'delay') as update:
+            site.save()
+        update.assert_called_once_with(site_ids=[site.pk])
+        self.assertIsNone(autocomplete.get_site_autocomplete(site.pk))
+
+        autocomplete.build_site_autocomplete(site)
+        task_clear_bu_cache(self.businessunit.id)
+        self.assertIsNotNone(autocomplete.get_site_autocomplete(site.pk))
+
+    def test_company_directory(self):
+        """
+        The company listing pages are served from the site's company
+        directory, which is rebuilt when one of its companies changes.
+
+        """
+        site = factories.SeoSiteFactory()
+        site.business_units.add(self.businessunit)
+        company = factories.CompanyFactory(name="Acme Widgets")
+        company.job_source_ids.add(self.businessunit)
+        cache.materialize_company_directory(site)
+
+        with patch.object(cache, 'build_company_directory') as build:
+            resp = self.client.get('/all-companies/',
+                                   HTTP_HOST=u'buckconsultants.jobs')
+        self.assertFalse(build.called)
+        self.assertContains(resp, '/acme-widgets/careers')
+
+        company.name = "Acme Gadgets"
+        company.save()
+        with patch.object(cache, 'build_company_directory') as build:
+            resp = self.client.get('/member-companies/a/',
+                                   HTTP_HOST=u'buckconsultants.jobs')
+        self.assertFalse(build.called)
+        self.assertContains(resp, '/acme-gadgets/careers')
+        self.assertNotContains(resp, '/acme-widgets/careers')
+
+        # Saving a company without changing what's listed doesn't rebuild
+        # the directory.
+        company.user_created = not company.user_created
+        with patch.object(cache, 'build_company_directory') as build:
+            company.save()
+        self.assertFalse(build.called)
+
+    def test_job_page_not_modified(self):
+        """
+        Once a job's page has been built, conditional requests for it are
+        answered with a 304 until the site's configuration changes.
+
+        """
+        site = factories.SeoSiteFactory()
+        site.business_units.add(self.businessunit)
+        guid = self.solr_docs[0]['guid']
+        resp = self.client.get('/%s/job/' % guid,
+                               HTTP_HOST=u'buckconsultants.jobs', follow=True)
+        self.assertEqual(resp.status_code, 200)
+        path = resp.redirect_chain[-1][0]
+
+        resp = self.client.get(path, HTTP_HOST=u'buckconsultants.jobs')
+        etag = resp['ETag']
+        with patch.object(views, 'DESearchQuerySet') as search:
+            resp = self.client.get(path, HTTP_HOST=u'buckconsultants.jobs',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertFalse(search.called)
+        hits = 'conditional_get:job_detail_by_title_slug_job_id:hits'
+        self.assertEqual(self.locmem_cache.get(hits), 1)
+
+        site.save()
+        resp = self.client.get(path, HTTP_HOST=u'buckconsultants.jobs',
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        misses = 'conditional_get:job_detail_by_title_slug_job_id:misses'
+        self.assertEqual(self.locmem_cache.get(misses), 1)
+
+    def test_site_last_modified(self):
+        """
+        A business unit updated by an import counts as last modified when
+        the import happened, once it's been replicated.
+
+        """
+        site = factories.SeoSiteFactory()
+        site.business_units.add(self.businessunit)
+        # MySQL doesn't store microseconds
+        before = timezone.now().replace(microsecond=0)
+        import_jobs._update_business_unit_modified_dates(self.businessunit,
+                                                         None)
+        self.businessunit.save()
+        after = timezone.now()
+
+        activate_site_context(get_site_context(site.domain))
+        self.assertIsNone(cache.site_last_modified())
+        with patch.object(cache, 'SOLR_REPLICATION_DELAY',
+                          datetime.timedelta(0)):
+            last_modified = cache.site_last_modified()
+        self.assertTrue(before <= last_modified <= after)
+
     def test_expire_site_on_config_save(self):
         """
         Cache pages and site-related objects should be cleared when its config is saved
@@ -1,10 +1,15 @@
 import datetime
+import pickle
+import threading
 
 from django.conf import settings
 
-from seo.tests.factories import (SeoSiteFactory, SeoSiteRedirectFactory)
-from seo.models import BusinessUnit, SeoSite
+from seo.tests.factories import (SeoSiteFactory, SeoSiteFacetFactory,
+                                 SeoSiteRedirectFactory)
+from seo.models import BusinessUnit, SeoSite, SeoSiteFacet
+from seo.site_context import activate_site_context, get_site_context
 from setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 class SiteRedirectMiddlewareTestCase(DirectSEOBase):
@@ -75,8 +80,8 @@ class MultiHostMiddlewareTestCase(DirectSEOBase):
     def test_existant_site(self):
         # test the site_id, site name, buids, etc
         self.client.get('/', HTTP_HOST=self.test_site.domain)
-        self.assertEqual(settings.SITE_ID, self.test_site.id)
-        self.assertEqual(settings.SITE_NAME, self.test_site.name)
+        self.assertEqual(site_settings.SITE_ID, self.test_site.id)
+        self.assertEqual(site_settings.SITE_NAME, self.test_site.name)
 
     def test_non_existant_site(self):
         # 1 is the deafult site that we end up getting in middleware,
@@ -85,6 +90,52 @@ class MultiHostMiddlewareTestCase(DirectSEOBase):
 
         # test that the site returned is the default site
         response = self.client.get('/', HTTP_HOST='jklsdasdfj.jobs')
-        self.assertEqual(settings.SITE_ID, 1)
-        self.assertEqual(settings.SITE_NAME, site.name)
-        self.assertEqual(len(settings.SITE_BUIDS), site.business_units.all().count())
+        self.assertEqual(site_settings.SITE_ID, 1)
+        self.assertEqual(site_settings.SITE_NAME, site.name)
+        self.assertEqual(len(site_settings.SITE_BUIDS), site.business_units.all().count())
+
+    def test_site_context_cached(self):
+        """
+        A warm host should not need any queries, and changing one of the
+        site's facets should expire its cached context.
+
+        """
+        context = get_site_context(self.test_site.domain)
+        self.assertEqual(context.site_id, self.test_site.id)
+        self.assertEqual(context.default_facets, ())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_context(self.test_site.domain), context)
+
+        site_facet = SeoSiteFacetFactory(seosite=self.test_site,
+                                         facet_type=SeoSiteFacet.DEFAULT)
+        context = get_site_context(self.test_site.domain)
+        self.assertEqual([facet.pk for facet in context.default_facets],
+                         [site_facet.customfacet.pk])
+
+    def test_site_context_pickles(self):
+        """
+        The context is stored in memcached, so everything it holds must
+        survive a pickle round trip.
+
+        """
+        context = get_site_context(self.test_site.domain)
+        self.assertEqual(pickle.loads(pickle.dumps(context)), context)
+
+    def test_site_settings_are_per_thread(self):
+        """
+        Activating a site in one thread should not change the site settings
+        seen by another.
+
+        """
+        activate_site_context(get_site_context(self.test_site.domain))
+        other_context = get_site_context('jklsdasdfj.jobs')
+
+        def other_request():
+            activate_site_context(other_context)
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(site_settings.SITE_ID, self.test_site.id)
+        self.assertEqual(site_settings.SITE_NAME, self.test_site.name)
+        self.assertEqual(int(settings.SITE_ID), self.test_site.id)
@@ -1,12 +1,18 @@
 # -*- coding: utf-8 -*-
 import datetime
+import shutil
+import tempfile
 
-from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+from mock import patch
 
 from seo_pysolr import Solr
+from seo import sitemap
 from seo.models import SeoSite
 from seo.tests.solr_settings import SOLR_FIXTURE
 from setup import DirectSEOBase
+from universal.site_settings import site_settings
 
 
 class SitemapTestCase(DirectSEOBase):
@@ -50,7 +56,7 @@ class SitemapTestCase(DirectSEOBase):
         # Sometimes the site settings are messed up from other tests. Ensure
         # that the settings are compatible with actually searching for the
         # jobs we're adding.
-        settings.SITE_BUIDS = []
+        site_settings.SITE_BUIDS = []
         site = SeoSite.objects.get(pk=1)
         site.business_units = []
         site.save()
@@ -71,6 +77,41 @@ class SitemapTestCase(DirectSEOBase):
         self.assertEqual(resp.status_code, 200)
         self.assertTrue("<url>" in resp.content)
         
+    def test_built_sitemaps(self):
+        """
+        Built sitemaps are served instead of building them from Solr, and
+        are only built again when their jobs change.
+
+        """
+        storage = FileSystemStorage(location=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, storage.location)
+        site = SeoSite.objects.get(id=1)
+        site.business_units = []
+        site.save()
+        today = datetime.date.today()
+        tomorrow = today + datetime.timedelta(days=1)
+        path = "/sitemap-%s.xml" % today.isoformat()
+        expected = self.client.get(path).content
+
+        with patch.object(sitemap, 'default_storage', storage):
+            self.assertTrue(sitemap.build_site_sitemaps(site, today=tomorrow))
+            self.assertFalse(sitemap.build_site_sitemaps(site,
+                                                         today=tomorrow))
+
+            with patch.object(sitemap.DateSitemap, 'get_urls') as get_urls:
+                resp = self.client.get(path)
+                self.assertEqual(resp.content, expected)
+                resp = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(resp['Content-Encoding'], 'gzip')
+            self.assertFalse(get_urls.called)
+
+            job = dict(SOLR_FIXTURE[0])
+            job.update({'id': 'seo.joblisting.99', 'django_id': 99,
+                        'uid': '99', 'guid': '9' * 32})
+            self.conn.add([job])
+            self.assertTrue(sitemap.build_site_sitemaps(site, today=tomorrow))
+            self.assertIn('9' * 32, self.client.get(path).content)
+
     def tearDown(self):
         super(SitemapTestCase, self).tearDown()
         self.conn.delete("*:*")
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime
+from datetime import datetime, timedelta
 from copy import deepcopy
 import default_settings
 import itertools
@@ -14,11 +14,14 @@ from django.contrib.redirects.models import Redirect
 from django.template import Template, Context
 from django.template import RequestContext as TemplateContext
 from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.http import urlquote
 from django.core.urlresolvers import reverse
 
 from BeautifulSoup import BeautifulSoup
 from lxml import etree
+from mock import patch
 
 from import_jobs import clear_solr, download_feed_file, update_solr
 from xmlparse import DEv2JobFeed
@@ -39,7 +42,9 @@ from seo.models import (BusinessUnit, Company, Configuration, CustomPage,
 from seo.templatetags.seo_extras import url_for_sort_field
 from seo.tests import factories
 import solr_settings
+from seo_pysolr import Solr
 from universal.helpers import build_url
+from universal.site_settings import site_settings
 
 
 class FallbackTestCase(DirectSEOTestCase):
@@ -877,6 +882,101 @@ class SeoSiteTestCase(DirectSEOTestCase):
         featured_jobs = resp.context['featured_jobs']
         self.assertEqual(len(featured_jobs), 1)
 
+    def test_jobs_and_counts_single_request(self):
+        """
+        jobs_and_counts should find the same jobs, facet counts and custom
+        facet counts as separate default, featured and custom facet searches,
+        with a single request to Solr.
+
+        """
+        default_cf = factories.CustomFacetFactory(
+            name="Default Facet",
+            querystring=u'id:({i1} OR {i2})'.format(
+                i1=self.solr_docs[0]['id'],
+                i2=self.solr_docs[1]['id']))
+        featured_cf = factories.CustomFacetFactory(
+            name="Featured Facet",
+            querystring='id:({i1} OR {i2}) AND uid:{u}'.format(
+                i1=self.solr_docs[0]['id'],
+                i2=self.solr_docs[1]['id'],
+                u=self.solr_docs[1]['uid']),
+            always_show=True)
+        site_settings.DEFAULT_FACET = [default_cf]
+        site_settings.FEATURED_FACET = [featured_cf]
+        site_settings.STANDARD_FACET = [featured_cf]
+
+        request = RequestFactory().get('/jobs/')
+        filters = helpers.build_filter_dict('/jobs/')
+        buids = site_settings.SITE_BUIDS
+
+        default_sqs = helpers.get_jobs(custom_facets=[default_cf],
+                                       exclude_facets=[featured_cf],
+                                       jsids=buids, filters=filters,
+                                       facet_limit=10)
+        featured_sqs = helpers.get_featured_jobs(jsids=buids, filters=filters,
+                                                 facet_limit=10)
+        facet_counts = default_sqs.add_facet_count(featured_sqs)['fields']
+        custom_facet_counts = helpers.get_solr_facet(buids, filters=filters)
+
+        with patch.object(Solr, '_select', autospec=True,
+                          side_effect=Solr._select) as select:
+            (default_jobs, total_default_jobs, featured_jobs,
+             total_featured_jobs, combined_facet_counts,
+             combined_custom_facet_counts) = helpers.jobs_and_counts(
+                request, filters, 10)
+        self.assertEqual(select.call_count, 1)
+
+        self.assertEqual([job.uid for job in default_jobs],
+                         [job.uid for job in default_sqs[:10]])
+        self.assertEqual(total_default_jobs, default_sqs.count())
+        self.assertEqual([job.uid for job in featured_jobs],
+                         [job.uid for job in featured_sqs[:10]])
+        self.assertEqual(total_featured_jobs, featured_sqs.count())
+        self.assertEqual(
+            dict((field, dict(counts))
+                 for field, counts in combined_facet_counts.items()),
+            dict((field, dict(counts))
+                 for field, counts in facet_counts.items()))
+        self.assertEqual(combined_custom_facet_counts, custom_facet_counts)
+
+    def test_jobs_and_counts_sort_by_date(self):
+        """
+        jobs_and_counts should sort the jobs of each group by the requested
+        sort order, not by relevance.
+
+        """
+        now = datetime.now()
+        docs = []
+        for i in range(3):
+            doc = dict(self.solr_docs[0])
+            doc.update({'id': 'seo.joblisting.%s' % (100 + i),
+                        'django_id': 100 + i,
+                        'guid': 'abc'[i] * 32,
+                        'uid': str(2000 + i),
+                        'salted_date': now - timedelta(days=2 - i)})
+            docs.append(doc)
+        # The newest job was indexed last, so it's last by relevance.
+        self.conn.add(docs)
+
+        default_cf = factories.CustomFacetFactory(
+            name="Default Facet",
+            querystring='uid:(2000 OR 2001 OR 2002)')
+        site_settings.DEFAULT_FACET = [default_cf]
+        site_settings.FEATURED_FACET = []
+        site_settings.STANDARD_FACET = []
+
+        request = RequestFactory().get('/jobs/', {'sort': 'date'})
+        filters = helpers.build_filter_dict('/jobs/')
+
+        with patch.object(Solr, '_select', autospec=True,
+                          side_effect=Solr._select) as select:
+            default_jobs = helpers.jobs_and_counts(request, filters, 10)[0]
+        params = select.call_args[0][1]
+        self.assertEqual(params['group.sort'], params['sort'])
+
+        self.assertEqual([str(job.uid) for job in default_jobs],
+                         ['2002', '2001', '2000'])
+
     def test_default_custom_facets_homepage(self):
         """
         Tests that custom facets are applied to ajax_get_jobs when viewing all
@@ -1120,7 +1220,7 @@ class TemplateTestCase(DirectSEOTestCase):
         super(TemplateTestCase, self).setUp()
         self.site = factories.SeoSiteFactory.build(id=1)
         self.site.save()
-        settings.SITE=self.site
+        site_settings.SITE=self.site
 
     def test_xss_job_list(self):
         template = Template(file("templates/includes/job_list.html", 'r').read())
@@ -1130,10 +1230,10 @@ class TemplateTestCase(DirectSEOTestCase):
 
 
     def test_xss_job_listing(self):
-        settings.SITE_TITLE = "Acme"
-        settings.SITE_DESCRIPTION = "test"
-        settings.SITE_HEADING = "test"
-        settings.SITE_TAGS = ["network"]
+        site_settings.SITE_TITLE = "Acme"
+        site_settings.SITE_DESCRIPTION = "test"
+        site_settings.SITE_HEADING = "test"
+        site_settings.SITE_TAGS = ["network"]
 
         config = factories.ConfigurationFactory.build()
         request =RequestFactory().get('/job/')
@@ -1153,7 +1253,7 @@ class TemplateTestCase(DirectSEOTestCase):
         self.site.business_units.add(bu)        
         request = RequestFactory().get('/')
         request.user = AnonymousUser()
-        settings.SITE_TITLE = "Acme Ohio Jobs"
+        site_settings.SITE_TITLE = "Acme Ohio Jobs"
         #test with view_all_jobs_detail = False (default)
         template = Template(
                 "{% load seo_extras %}"
@@ -1187,7 +1287,7 @@ class TemplateTestCase(DirectSEOTestCase):
         self.site.business_units.add(bu)        
         request = RequestFactory().get('/')
         request.user = AnonymousUser()
-        settings.SITE_TITLE = "Acme Ohio Jobs"
+        site_settings.SITE_TITLE = "Acme Ohio Jobs"
         #test with view_all_jobs_detail = False (default)
         template = Template(
                 "{% load seo_extras %}"
@@ -1231,7 +1331,7 @@ class TemplateTestCase(DirectSEOTestCase):
         """Renders seo_base.html"""
         request = RequestFactory().get('/')
         request.user = AnonymousUser()
-        settings.SITE_TITLE = "Acme"        
+        site_settings.SITE_TITLE = "Acme"        
         template = Template(file("templates/seo_base.html", 'r').read())
         resp = template.render(TemplateContext(request, {}))
         #Check string from view_all_jobs_label
@@ -1242,10 +1342,10 @@ class TemplateTestCase(DirectSEOTestCase):
         network sites with no sponsor set"""
         request = RequestFactory().get('/')
         request.user = AnonymousUser()
-        settings.SITE_TITLE = "Acme"
-        settings.SITE_DESCRIPTION = "test"
-        settings.SITE_HEADING = "test"
-        settings.SITE_TAGS = ["network"]
+        site_settings.SITE_TITLE = "Acme"
+        site_settings.SITE_DESCRIPTION = "test"
+        site_settings.SITE_HEADING = "test"
+        site_settings.SITE_TAGS = ["network"]
         template = Template(
             file("templates/seo_billboard_homepage_base.html", 'r').read())
         resp = template.render(TemplateContext(request, {'widgets':'',
@@ -1257,17 +1357,17 @@ class TemplateTestCase(DirectSEOTestCase):
         network sites with a sponsor set"""
         request = RequestFactory().get('/')
         request.user = AnonymousUser()
-        settings.SITE_TITLE = "Acme"
+        site_settings.SITE_TITLE = "Acme"
         bb = factories.BillboardImageFactory.build()
         bb.save()        
-        settings.SITE.billboard_images.add(bb)        
+        site_settings.SITE.billboard_images.add(bb)        
         template = Template(
             file("templates/seo_billboard_homepage_base.html", 'r').read())
         resp = template.render(
             TemplateContext(
                 request, {
                     'widgets':'',
-                    'billboard_images':settings.SITE.billboard_images.all(),
+                    'billboard_images':site_settings.SITE.billboard_images.all(),
                     'site_tags':['network'],                    
                     }
                 )
@@ -1284,12 +1384,12 @@ class TemplateTestCase(DirectSEOTestCase):
         site = factories.SeoSiteFactory()
         site.configurations.add(config_obj)
         site.save()
-        settings.SITE = site
-        settings.SITE_TITLE = "Acme"
-        settings.SITE_DESCRIPTION = "test"
-        settings.SITE_HEADING = "test"
-        settings.SITE_TAGS = ["network"]
-        settings.VIEW_SOURCE = None
+        site_settings.SITE = site
+        site_settings.SITE_TITLE = "Acme"
+        site_settings.SITE_DESCRIPTION = "test"
+        site_settings.SITE_HEADING = "test"
+        site_settings.SITE_TAGS = ["network"]
+        site_settings.VIEW_SOURCE = None
         bb = factories.BillboardImageFactory(logo_url="", sponsor_url="")
         site.billboard_images.add(bb)
         site.save()
@@ -1299,7 +1399,7 @@ class TemplateTestCase(DirectSEOTestCase):
             TemplateContext(
                 request, {
                     'widgets': '',
-                    'billboard_images': settings.SITE.billboard_images.all(),
+                    'billboard_images': site_settings.SITE.billboard_images.all(),
                     'site_tags': ['company'],
                 }
             )
@@ -1316,18 +1416,18 @@ class TemplateTestCase(DirectSEOTestCase):
         site = factories.SeoSiteFactory()
         site.configurations.add(config_obj)
         site.save()
-        settings.SITE = site
-        settings.SITE_TITLE = "Acme"        
+        site_settings.SITE = site
+        site_settings.SITE_TITLE = "Acme"        
         bb = factories.BillboardImageFactory.build()
         bb.save()        
-        settings.SITE.billboard_images.add(bb)        
+        site_settings.SITE.billboard_images.add(bb)        
         template = Template(
             file("templates/seo_billboard_homepage_base.html", 'r').read())
         resp = template.render(
             TemplateContext(
                 request, {
                     'widgets': '',
-                    'billboard_images': settings.SITE.billboard_images.all(),
+                    'billboard_images': site_settings.SITE.billboard_images.all(),
                     'site_tags': ['company'],
                 }
             )
@@ -1898,6 +1998,71 @@ class SeoViewsTestCase(DirectSEOTestCase):
                     next_link = next_link.get('href')
             self.assertEqual(num_pages, 2)
 
+    def test_syndicate_feed_streaming(self):
+        """
+        Feeds of more than one page of jobs are streamed, and match the
+        feeds built from a single page.
+
+        """
+        site = SeoSite.objects.get(id=1)
+        site.business_units = [self.buid_id]
+        site.save()
+
+        with connection(connections_info=solr_settings.HAYSTACK_CONNECTIONS):
+            for feed_type in ['json', 'jsonp', 'xml', 'indeed']:
+                whole = self.client.get('/feed/%s' % feed_type)
+                self.assertFalse(whole.streaming)
+                with override_settings(FEED_PAGE_SIZE=1):
+                    streamed = self.client.get('/feed/%s' % feed_type)
+                self.assertEqual(streamed.status_code, 200)
+                self.assertTrue(streamed.streaming)
+                content = ''.join(streamed.streaming_content)
+                if feed_type == 'json':
+                    self.assertEqual(len(json.loads(content)), 2)
+                    self.assertItemsEqual(json.loads(content),
+                                          json.loads(whole.content))
+                elif feed_type == 'jsonp':
+                    self.assertTrue(content.startswith(
+                        'direct_jsonp_callback(['))
+                    self.assertEqual(len(content), len(whole.content))
+                else:
+                    tree = etree.parse(StringIO(content))
+                    self.assertEqual(len(tree.findall('job')), 2)
+                    self.assertEqual(len(content), len(whole.content))
+
+    def test_syndicate_feed_not_modified(self):
+        """
+        Conditional requests for a feed are answered with a 304, without
+        searching for jobs, until the site's jobs are updated.
+
+        """
+        site = SeoSite.objects.get(id=1)
+        site.business_units = [self.buid_id]
+        site.save()
+        updated = datetime(2014, 1, 1, tzinfo=timezone.utc)
+        BusinessUnit.objects.filter(id=self.buid_id).update(
+            date_updated=updated)
+
+        with connection(connections_info=solr_settings.HAYSTACK_CONNECTIONS):
+            resp = self.client.get('/feed/xml')
+            self.assertEqual(resp.status_code, 200)
+            etag = resp['ETag']
+
+            with patch.object(helpers, 'get_jobs') as get_jobs:
+                resp = self.client.get('/feed/xml', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304)
+            self.assertFalse(get_jobs.called)
+
+            # Other feeds have their own ETags.
+            resp = self.client.get('/feed/xml?num_items=1',
+                                   HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
+            BusinessUnit.objects.filter(id=self.buid_id).update(
+                date_updated=updated + timedelta(days=1))
+            resp = self.client.get('/feed/xml', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+
     def test_syndicate_feed_offset_larger_than_num_records(self):
         """Validate that when the offset is greater than the number of records,
         we return an empty document.
@@ -2498,8 +2663,8 @@ class SeoViewsTestCase(DirectSEOTestCase):
         #Check that CSS for network sites is loaded properly
         self.assertContains(resp, '/style/def.ui.dotjobs.css')
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(settings.SITE_ID, 1)
-        self.assertEqual(settings.SITE_TITLE, "Test Site")
+        self.assertEqual(site_settings.SITE_ID, 1)
+        self.assertEqual(site_settings.SITE_TITLE, "Test Site")
 
     def footer_no_network_tag_test(self):
         """ 
@@ -2514,7 +2679,7 @@ class SeoViewsTestCase(DirectSEOTestCase):
         fp.save()
         resp = self.client.get('/test-page/')
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(settings.SITE_ID, 1)
+        self.assertEqual(site_settings.SITE_ID, 1)
         #Header text
         self.assertNotIn("direct_dotjobsWideHeader", resp)
         #Footer text
@@ -372,3 +372,34 @@ class JobFeedTestCase(DirectSEOBase):
         site_package.delete()
         business_unit.delete()
 
+    def test_stream_matches_full_parse(self):
+        """
+        Tests that a feed parsed in streaming mode produces the same
+        document-level fields and Solr documents as a fully parsed feed.
+
+        """
+        full = DEv2JobFeed('seo/tests/data/dseo_feed_0.markdown.xml', jsid=0)
+        streamed = DEv2JobFeed('seo/tests/data/dseo_feed_0.markdown.xml',
+                               jsid=0, stream=True)
+        self.assertFalse(streamed.errors)
+        self.assertEqual(streamed.job_source_name, full.job_source_name)
+        self.assertEqual(streamed.crawled_date, full.crawled_date)
+        self.assertEqual(streamed.jobparse(), full.jobparse())
+
+        full_jobs = full.solr_jobs()
+        streamed_jobs = list(streamed.iter_solr_jobs())
+        self.assertEqual(len(streamed_jobs), len(full_jobs))
+        for full_job, streamed_job in zip(full_jobs, streamed_jobs):
+            # salted_date is randomized on every parse.
+            full_job.pop('salted_date')
+            streamed_job.pop('salted_date')
+            self.assertEqual(streamed_job, full_job)
+
+    def test_stream_invalid_and_empty_feeds(self):
+        result = DEv2JobFeed(self.invalid_feed, jsid=0, stream=True)
+        self.assertTrue(result.errors)
+
+        result = DEv2JobFeed(self.emptyfeed, stream=True)
+        self.assertFalse(result.errors)
+        self.assertEqual(len(result.jobparse()), 0)
+        self.assertEqual(list(result.iter_solr_jobs()), [])
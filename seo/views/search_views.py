@@ -1,4 +1,5 @@
 import datetime
+import gzip
 import itertools
 import json
 import logging
@@ -7,6 +8,7 @@ import operator
 from fsm.views import FSMView
 import urllib
 import json as simplejson
+from StringIO import StringIO
 from types import IntType
 from urlparse import urlparse, urlunparse
 
@@ -21,12 +23,13 @@ from django.core.urlresolvers import reverse
 from django.db.models import Q
 from django.http import (HttpResponse, Http404, HttpResponseNotFound,
                          HttpResponseRedirect, HttpResponseServerError,
-                         QueryDict)
+                         QueryDict, StreamingHttpResponse)
 from django.contrib.auth.decorators import login_required
 from django.core.cache import cache
 from django.shortcuts import get_object_or_404, redirect, render_to_response
 from django.template import RequestContext, loader
 from django.template.defaultfilters import safe
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
 from django.utils.encoding import smart_str, iri_to_uri
 from django.utils.feedgenerator import Atom1Feed
@@ -38,7 +41,6 @@ from moc_coding import models as moc_models
 from serializers import ExtraValue, XMLExtraValuesSerializer
 from settings import DEFAULT_PAGE_SIZE
 from tasks import task_etl_to_solr, task_update_solr, task_priority_etl_to_solr
-from xmlparse import text_fields
 from import_jobs import add_jobs, delete_by_guid
 from transform import transform_for_postajob
 
@@ -46,19 +48,26 @@ from myblocks.views import BlockView
 from myblocks.models import SearchResultBlock, Page
 from myblocks import context_tools
 from seo.templatetags.seo_extras import facet_text, smart_truncate
+from seo.autocomplete import get_site_autocomplete
 from seo.breadbox import Breadbox
-from seo.cache import get_custom_facets, get_site_config, get_total_jobs_count
+from seo.cache import (cache_job_validators, company_alpha_filter,
+                       get_company_directory, get_custom_facets,
+                       get_jobs_and_counts, get_more_jobs, get_site_config,
+                       get_total_jobs_count, job_page_validators,
+                       site_page_validators, sort_alpha_filters)
 from seo.search_backend import DESearchQuerySet
 from seo import helpers
 from seo.filters import FacetListWidget
 from seo.forms.admin_forms import UploadJobFileForm
 from seo.models import (BusinessUnit, Company, Configuration, Country,
                         GoogleAnalytics, JobFeed, SeoSite, SiteTag)
-from seo.decorators import (sns_json_message, custom_cache_page, protected_site,
-                            home_page_check)
-from seo.sitemap import DateSitemap
+from seo.decorators import (sns_json_message, conditional_page,
+                            custom_cache_page, protected_site, home_page_check)
+from seo.sitemap import (DateSitemap, SITEMAP_FIELDS, get_sitemap_manifest,
+                         get_sitemap_page, sitemap_count_range, sitemap_dates)
 from seo.templatetags.seo_extras import filter_carousel
 from transform import hr_xml_to_json
+from universal.site_settings import site_settings
 
 
 """
@@ -79,12 +88,12 @@ LOG = logging.getLogger('views')
 def find_page(request, page_type):
     page = None
     if request.user.is_authenticated() and request.user.is_staff:
-        page = Page.objects.filter(sites=settings.SITE,
+        page = Page.objects.filter(sites=site_settings.SITE,
                                    status=Page.STAGING,
                                    page_type=page_type).first()
 
     if not page:
-        page = Page.objects.filter(sites=settings.SITE,
+        page = Page.objects.filter(sites=site_settings.SITE,
                                    status=Page.PRODUCTION,
                                    page_type=page_type).first()
 
@@ -145,14 +154,14 @@ def ajax_geolocation_facet(request):
     sqs = helpers.prepare_sqs_from_search_params(request.GET)
     sqs = sqs.facet("lat_long_%s_slab" % facet_field_type, limit=-1)
     default_jobs = helpers.get_jobs(default_sqs=sqs,
-                                    custom_facets=settings.DEFAULT_FACET,
-                                    exclude_facets=settings.FEATURED_FACET,
-                                    jsids=settings.SITE_BUIDS,
+                                    custom_facets=site_settings.DEFAULT_FACET,
+                                    exclude_facets=site_settings.FEATURED_FACET,
+                                    jsids=site_settings.SITE_BUIDS,
                                     filters=filters,
                                     facet_limit=num_items,
                                     sort_order=sort_order)
     featured_jobs = helpers.get_featured_jobs(default_sqs=sqs,
-                                              jsids=settings.SITE_BUIDS,
+                                              jsids=site_settings.SITE_BUIDS,
                                               filters=filters,
                                               facet_limit=num_items,
                                               sort_order=sort_order)
@@ -216,16 +225,16 @@ def ajax_get_facets(request, filter_path, facet_type):
         items = []
     else:
         default_jobs = helpers.get_jobs(default_sqs=sqs,
-                                        custom_facets=settings.DEFAULT_FACET,
-                                        exclude_facets=settings.FEATURED_FACET,
-                                        jsids=settings.SITE_BUIDS,
+                                        custom_facets=site_settings.DEFAULT_FACET,
+                                        exclude_facets=site_settings.FEATURED_FACET,
+                                        jsids=site_settings.SITE_BUIDS,
                                         filters=filters,
                                         facet_limit=num_items,
                                         facet_offset=offset,
                                         sort_order=sort_order)
 
         featured_jobs = helpers.get_featured_jobs(default_sqs=sqs,
-                                                  jsids=settings.SITE_BUIDS,
+                                                  jsids=site_settings.SITE_BUIDS,
                                                   filters=filters,
                                                   facet_limit=num_items,
                                                   facet_offset=offset,
@@ -293,46 +302,21 @@ def ajax_get_jobs(request, filter_path):
         num_items = int(GET.get(u'num_items', DEFAULT_PAGE_SIZE))
     except ValueError:
         num_items = DEFAULT_PAGE_SIZE
-    custom_facets = settings.DEFAULT_FACET
-    sqs = helpers.prepare_sqs_from_search_params(GET)
-    sort_order = request.REQUEST.get('sort', 'relevance')
-    default_jobs = helpers.get_jobs(default_sqs=sqs,
-                                    custom_facets=custom_facets,
-                                    exclude_facets=settings.FEATURED_FACET,
-                                    jsids=settings.SITE_BUIDS,
-                                    filters=filters,
-                                    sort_order=sort_order)
-    featured_jobs = helpers.get_featured_jobs(default_sqs=sqs,
-                                              jsids=settings.SITE_BUIDS,
-                                              filters=filters,
-                                              sort_order=sort_order)
-    (num_featured_jobs, num_default_jobs, featured_offset, default_offset) = \
-        helpers.featured_default_jobs(featured_jobs.count(),
-                                      default_jobs.count(),
-                                      num_items,
-                                      site_config.percent_featured,
-                                      offset)
-
-    for job in default_jobs[default_offset:default_offset+num_default_jobs]:
-        text = filter(None, [getattr(job, x, "None") for x in text_fields])
-        setattr(job, 'text', " ".join(text))
-    for job in featured_jobs[featured_offset:featured_offset+num_featured_jobs]:
-        text = filter(None, [getattr(job, x, "None") for x in text_fields])
-        setattr(job, 'text', " ".join(text))
+    default_jobs, featured_jobs = get_more_jobs(request, filters, offset,
+                                                num_items,
+                                                site_config.percent_featured)
 
     # Build the site commitment string
     sitecommit_str = helpers.\
-        make_specialcommit_string(settings.COMMITMENTS.all())
+        make_specialcommit_string(site_settings.COMMITMENTS.all())
     data_dict = {
-        'default_jobs':
-            default_jobs[default_offset:default_offset+num_default_jobs],
-        'featured_jobs':
-            featured_jobs[featured_offset:featured_offset+num_featured_jobs],
+        'default_jobs': default_jobs,
+        'featured_jobs': featured_jobs,
         'site_config': site_config,
         'filters': filters,
         'title_term': request.GET.get('q', '\*'),
         'site_commitments_string': sitecommit_str,
-        'site_tags': settings.SITE_TAGS
+        'site_tags': site_settings.SITE_TAGS
     }
 
     return render_to_response('listing_items.html',
@@ -348,6 +332,7 @@ def robots_txt(request):
 
 
 @protected_site
+@conditional_page(job_page_validators)
 @custom_cache_page
 @home_page_check
 def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
@@ -379,8 +364,9 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
     except IndexError:
         return dseo_404(request)
     else:
-        if settings.SITE_BUIDS and the_job.buid not in settings.SITE_BUIDS:
-            if the_job.on_sites and not (set(settings.SITE_PACKAGES) & set(the_job.on_sites)):
+        cache_job_validators(job_id, the_job)
+        if site_settings.SITE_BUIDS and the_job.buid not in site_settings.SITE_BUIDS:
+            if the_job.on_sites and not (set(site_settings.SITE_PACKAGES) & set(the_job.on_sites)):
                 return redirect('home')
 
     breadbox_path = helpers.job_breadcrumbs(the_job,
@@ -445,7 +431,7 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
     if (title_slug == the_job.title_slug and
             location_slug == slugify(the_job.location)) \
             and not search_type == 'uid':
-        ga = settings.SITE.google_analytics.all()
+        ga = site_settings.SITE.google_analytics.all()
         host = 'foo'
         link_query = ""
         jobs_count = get_total_jobs_count()
@@ -458,16 +444,16 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
             url = urlparse(the_job.link)
             path = url.path.replace("/", "")
             # use the override view source
-            if settings.VIEW_SOURCE:
-                path = "%s%s" % (path[:32], settings.VIEW_SOURCE.view_source)
+            if site_settings.VIEW_SOURCE:
+                path = "%s%s" % (path[:32], site_settings.VIEW_SOURCE.view_source)
 
         # add any ats source code name value pairs
-        ats = settings.ATS_SOURCE_CODES.all()
+        ats = site_settings.ATS_SOURCE_CODES.all()
         if ats:
             link_query += "&".join(["%s" % code for code in ats])
 
         # build the google analytics query string
-        gac = settings.GA_CAMPAIGN
+        gac = site_settings.GA_CAMPAIGN
         gac_data = {
             "campaign_source": "utm_source",
             "campaign_medium": "utm_medium",
@@ -490,7 +476,7 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
 
         # Build the site commitment string
         sitecommit_str = helpers.make_specialcommit_string(
-            settings.COMMITMENTS.all())
+            site_settings.COMMITMENTS.all())
 
         data_dict = {
             'the_job': the_job,
@@ -498,11 +484,11 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
             'company': company_data,
             'og_img': co.og_img if co else co,
             'google_analytics': ga,
-            'site_name': settings.SITE_NAME,
-            'site_title': settings.SITE_TITLE,
-            'site_heading': settings.SITE_HEADING,
-            'site_tags': settings.SITE_TAGS,
-            'site_description': settings.SITE_DESCRIPTION,
+            'site_name': site_settings.SITE_NAME,
+            'site_title': site_settings.SITE_TITLE,
+            'site_heading': site_settings.SITE_HEADING,
+            'site_tags': site_settings.SITE_TAGS,
+            'site_description': site_settings.SITE_DESCRIPTION,
             'site_commitments_string': sitecommit_str,
             'host': host,
             'site_config': site_config,
@@ -511,7 +497,7 @@ def job_detail_by_title_slug_job_id(request, job_id, title_slug=None,
             'crumbs': breadbox_path,
             'pg_title': pg_title,
             'build_num': settings.BUILD,
-            'view_source': settings.VIEW_SOURCE,
+            'view_source': site_settings.VIEW_SOURCE,
             'search_url': '/jobs/',
             'title_term': request.GET.get('q', '\*'),
             'moc_term': request.GET.get('moc', '\*'),
@@ -631,8 +617,8 @@ def job_listing_nav_redirect(request, home=None, cc3=None):
     filters = helpers.build_filter_dict(path_part)
     url = 'location'
     sort_order = request.REQUEST.get('sort', 'relevance')
-    jobs = helpers.get_jobs(custom_facets=settings.DEFAULT_FACET,
-                            jsids=settings.SITE_BUIDS,
+    jobs = helpers.get_jobs(custom_facets=site_settings.DEFAULT_FACET,
+                            jsids=site_settings.SITE_BUIDS,
                             filters=filters, sort_order=sort_order)
     facet_counts = jobs.facet_counts()['fields']
 
@@ -658,8 +644,8 @@ def job_listing_nav_redirect(request, home=None, cc3=None):
         redirect_kwargs['title_slug'] = '/'.join(slug.split('/')[0:-1])
     elif home == 'facet':
         url = 'location_facet'
-        custom_facets = helpers.get_solr_facet(settings.SITE_ID,
-                                               settings.SITE_BUIDS,
+        custom_facets = helpers.get_solr_facet(site_settings.SITE_ID,
+                                               site_settings.SITE_BUIDS,
                                                filters)
         # This needs to be changed to get_object_or_404
         country = Country.objects.get(abbrev=cc3)
@@ -673,6 +659,13 @@ def job_listing_nav_redirect(request, home=None, cc3=None):
     return redirect(url, permanent=True, **redirect_kwargs)
 
 
+# The job fields included in syndication feeds.
+FEED_FIELDS = ('city', 'company', 'country', 'country_short', 'date_new',
+               'description', 'location', 'reqid', 'state', 'state_short',
+               'title', 'uid', 'guid', 'is_posted')
+
+
+@conditional_page(site_page_validators)
 @custom_cache_page
 def syndication_feed(request, filter_path, feed_type):
     """
@@ -721,36 +714,44 @@ def syndication_feed(request, filter_path, feed_type):
 
     else:
         sqs = helpers._sqs_narrow_by_buid_and_site_package(
-            helpers.sqs_apply_custom_facets(settings.DEFAULT_FACET))
+            helpers.sqs_apply_custom_facets(site_settings.DEFAULT_FACET))
     sort_order = 'new' if date_sort == 'True' else 'relevance'
     jobs = helpers.get_jobs(default_sqs=sqs,
-                            custom_facets=settings.DEFAULT_FACET,
-                            jsids=settings.SITE_BUIDS,
+                            custom_facets=site_settings.DEFAULT_FACET,
+                            jsids=site_settings.SITE_BUIDS,
                             filters=filters, sort_order=sort_order)
 
-    job_count = jobs.count()
-    num_items = min(num_items, max_items, job_count)
-    jobs[:num_items]
-
     if days_ago:
         now = datetime.datetime.utcnow()
         start_date = now - datetime.timedelta(days=days_ago)
         jobs = jobs.filter(date_new__gte=start_date)
 
-    try:
-        j = jobs[0]
-    except IndexError:
-        j = None
-
-    if jobs and j.date_updated:
-        buid_last_written = j.date_updated
+    # The first page of jobs is read right away; the number of jobs and the
+    # last build date of the feed come from the same Solr response. Feeds of
+    # more than one page are streamed, reading the rest of the pages as the
+    # response is written.
+    page_size = settings.FEED_PAGE_SIZE
+    num_items = min(num_items, max_items)
+    fields = FEED_FIELDS + ('date_updated', )
+    first_page = jobs.values(*fields)
+    first_jobs = first_page[offset:offset+min(num_items, page_size)]
+    job_count = first_page.count()
+    num_items = min(num_items, job_count)
+
+    if first_jobs and first_jobs[0]['date_updated']:
+        buid_last_written = first_jobs[0]['date_updated']
     else:
         buid_last_written = datetime.datetime.now()
 
-    qs = jobs.values('city', 'company', 'country', 'country_short',
-                     'date_new', 'description', 'location', 'reqid', 'state',
-                     'state_short', 'title', 'uid', 'guid',
-                     'is_posted')[offset:offset+num_items]
+    stop = min(offset + num_items, job_count)
+    streaming = stop - offset > page_size
+    qs = itertools.chain(first_jobs,
+                         helpers.iter_job_pages(jobs, fields,
+                                                offset + page_size, stop,
+                                                page_size))
+    # date_updated is only needed for the last build date.
+    qs = (dict((key, value) for key, value in job.iteritems()
+               if key != 'date_updated') for job in qs)
 
     self_link = ExtraValue(name="link", content="",
                            attributes={'href': request.build_absolute_uri(),
@@ -776,23 +777,24 @@ def syndication_feed(request, filter_path, feed_type):
         links.append(next_link)
 
     if feed_type == 'json':
-        response = HttpResponse(helpers.make_json(qs, request.get_host()),
-                                content_type='application/json')
+        data = helpers.iter_json(qs, request.get_host())
+        response = feed_response(data, 'application/json', streaming)
     elif feed_type == 'jsonp':
         callback_name = request.GET.get('callback', 'direct_jsonp_callback')
-        data = helpers.make_json(qs, request.get_host())
-        output = callback_name + "(" + data + ")"
-        response = HttpResponse(output, content_type='application/javascript')
+        data = itertools.chain([callback_name + "("],
+                               helpers.iter_json(qs, request.get_host()),
+                               [")"])
+        response = feed_response(data, 'application/javascript', streaming)
     elif feed_type == 'xml':
         # return xml data for page's jobs
         # consider trimming non-essential feilds from job document
         s = XMLExtraValuesSerializer(
-            publisher=settings.SITE_NAME,
+            publisher=site_settings.SITE_NAME,
             extra_values=links,
             publisher_url="http://%s" % request.get_host(),
             last_build_date=buid_last_written)
-        data = s.serialize(qs)
-        response = HttpResponse(data, content_type='application/xml')
+        data = s.iter_serialize(qs)
+        response = feed_response(data, 'application/xml', streaming)
     elif feed_type == 'indeed':
         # format xml feed per Indeed's xml feed specifications
         # here: http://www.indeed.com/intl/en/xmlinfo.html
@@ -800,20 +802,20 @@ def syndication_feed(request, filter_path, feed_type):
             feed_type=feed_type,
             use_cdata=True,
             extra_values=links,
-            publisher=settings.SITE_NAME,
+            publisher=site_settings.SITE_NAME,
             publisher_url="http://%s" % request.get_host(),
             last_build_date=buid_last_written,
             field_mapping={'date_new': 'date',
                            'uid': 'referencenumber'})
-        data = s.serialize(qs)
-        response = HttpResponse(data, content_type='application/xml')
+        data = s.iter_serialize(qs)
+        response = feed_response(data, 'application/xml', streaming)
 
     else:
         # return rss or atom for this page's jobs
         if feed_type != 'atom':
             feed_type = 'rss'
         rss = JobFeed(feed_type)
-        rss.items = qs
+        rss.items = list(qs)
 
         selected = helpers.get_bread_box_headings(filters, jobs)
         rss.description = ''
@@ -837,6 +839,26 @@ def syndication_feed(request, filter_path, feed_type):
     return response
 
 
+def feed_response(data, content_type, streaming):
+    """
+    Returns the response for a syndication feed.
+
+    Inputs:
+    :data: An iterator over the pieces of the feed
+    :content_type: The content type of the feed
+    :streaming: Whether the feed is written as it's read from Solr. Streamed
+        responses aren't stored in the page cache, so feeds of a single
+        page are returned whole.
+
+    Returns:
+    A StreamingHttpResponse if :streaming:, otherwise an HttpResponse
+
+    """
+    if streaming:
+        return StreamingHttpResponse(data, content_type=content_type)
+    return HttpResponse(''.join(data), content_type=content_type)
+
+
 def member_carousel_data(request):
     """
     Returns the carousel data as JSONP for all member companies; this is called
@@ -893,14 +915,14 @@ def ajax_filter_carousel(request):
                                    if facet not in active_facets]
 
     default_jobs = helpers.get_jobs(default_sqs=sqs,
-                                    custom_facets=settings.DEFAULT_FACET,
-                                    exclude_facets=settings.FEATURED_FACET,
-                                    jsids=settings.SITE_BUIDS, filters=filters,
+                                    custom_facets=site_settings.DEFAULT_FACET,
+                                    exclude_facets=site_settings.FEATURED_FACET,
+                                    jsids=site_settings.SITE_BUIDS, filters=filters,
                                     facet_limit=num_jobs, sort_order=sort_order)
 
     featured_jobs = helpers.get_featured_jobs(default_sqs=sqs,
                                               filters=filters,
-                                              jsids=settings.SITE_BUIDS,
+                                              jsids=site_settings.SITE_BUIDS,
                                               facet_limit=num_jobs,
                                               sort_order=sort_order)
     facet_counts = default_jobs.add_facet_count(featured_jobs).get('fields')
@@ -1056,9 +1078,9 @@ def home_page(request):
     custom_facet_counts = []
 
     num_jobs = site_config.num_job_items_to_show * 2
-    default_jobs = helpers.get_jobs(custom_facets=settings.DEFAULT_FACET,
-                                    exclude_facets=settings.FEATURED_FACET,
-                                    jsids=settings.SITE_BUIDS)
+    default_jobs = helpers.get_jobs(custom_facets=site_settings.DEFAULT_FACET,
+                                    exclude_facets=site_settings.FEATURED_FACET,
+                                    jsids=site_settings.SITE_BUIDS)
     jobs_count = get_total_jobs_count()
 
     featured_jobs = helpers.get_featured_jobs()
@@ -1067,7 +1089,7 @@ def home_page(request):
         featured_jobs.count(), default_jobs.count(),
         num_jobs, site_config.percent_featured)
 
-    featured = settings.SITE.featured_companies.all()
+    featured = site_settings.SITE.featured_companies.all()
     # Because we're getting the featured company information from the SQL
     # database instead of Solr, we need to append the generated feature
     # slabs to the rest of the counts.
@@ -1087,7 +1109,7 @@ def home_page(request):
         cust_facets = get_custom_facets(request)
         custom_facet_counts = helpers.combine_groups(cust_facets)
 
-    ga = settings.SITE.google_analytics.all()
+    ga = site_settings.SITE.google_analytics.all()
 
     home_page_template = site_config.home_page_template
 
@@ -1096,7 +1118,7 @@ def home_page(request):
     billboard_templates = ['home_page/home_page_billboard.html',
                            'home_page/home_page_billboard_icons_top.html']
     if home_page_template in billboard_templates:
-        billboard_images = (settings.SITE.billboard_images.all())
+        billboard_images = (site_settings.SITE.billboard_images.all())
         company_images = helpers.company_thumbnails(featured) if featured else \
             helpers.company_thumbnails(members)
         company_images_json = json.dumps(company_images, ensure_ascii=False)
@@ -1117,11 +1139,11 @@ def home_page(request):
         'base_path': request.path,
         'facet_blurb': False,
         'google_analytics': ga,
-        'site_name': settings.SITE_NAME,
-        'site_title': settings.SITE_TITLE,
-        'site_heading': settings.SITE_HEADING,
-        'site_tags': settings.SITE_TAGS,
-        'site_description': settings.SITE_DESCRIPTION,
+        'site_name': site_settings.SITE_NAME,
+        'site_title': site_settings.SITE_TITLE,
+        'site_heading': site_settings.SITE_HEADING,
+        'site_tags': site_settings.SITE_TAGS,
+        'site_description': site_settings.SITE_DESCRIPTION,
         'host': str(request.META.get("HTTP_HOST", "localhost")),
         'site_config': site_config,
         'build_num': settings.BUILD,
@@ -1130,7 +1152,7 @@ def home_page(request):
         'billboard_images': billboard_images,
         'featured': str(bool(featured)).lower(),
         'filters': {},
-        'view_source': settings.VIEW_SOURCE}
+        'view_source': site_settings.VIEW_SOURCE}
 
     return render_to_response(home_page_template, data_dict,
                               context_instance=RequestContext(request))
@@ -1162,64 +1184,30 @@ def company_listing(request, alpha=None, group=None):
     """
     site_config = get_site_config(request)
     jobs_count = get_total_jobs_count()
-    custom_facets = settings.DEFAULT_FACET
-    featured = SeoSite.objects.get(id=settings.SITE_ID).\
+    featured = SeoSite.objects.get(id=site_settings.SITE_ID).\
                featured_companies.all()
 
     if group == 'featured':
-        companies = featured
+        companies = sorted(featured, key=lambda co: co.company_slug)
+        alpha_filters = sort_alpha_filters(
+            set(company_alpha_filter(co.company_slug) for co in companies))
+        company_data = helpers.company_thumbnails(companies,
+                                                  use_canonical=False)
     else:
-        sqs = helpers.sqs_apply_custom_facets(custom_facets)
-        sqs = helpers._sqs_narrow_by_buid_and_site_package(sqs)
-        counts = sqs.facet("buid").facet_limit(-1).fields(['buid']).\
-                 facet_mincount(1).facet_counts()
-        buids = [item[0] for item in counts['fields']['buid']]
-
-        # Some companies are associated with multiple BUIDs, so we use distinct()
-        companies = Company.objects.filter(job_source_ids__in=buids).\
-            exclude(company_slug='').distinct()
-
+        directory = get_company_directory()
+        alpha_filters = directory['alpha_filters'][group]
+
+        # handle "root" page
+        if alpha is None:
+            try:
+                alpha = alpha_filters[0]
+            except IndexError:
+                alpha = "a" # fail gracefully if the page has ZERO companies
+
+        # filter by alpha, i.e. .../all|member-companies/<<alpha>>/
+        company_data = directory['companies'].get(alpha, [])
         if group == 'member':
-            companies = companies.filter(member=True)
-
-    # Get ordered list of first character of company names (used to determine
-    # what buttons to display).
-    alpha_filters = set()
-    for co in companies:
-        if len(alpha_filters) == 27:
-            break
-        alpha_filters.add(co.company_slug[0] if co.company_slug[0].isalpha()
-                             else '0-9')
-
-    # Move the '0-9' filter to the back of the list if it is present. This does
-    # two things--a letter will always be selected on the root page, and the 0-9
-    # button appears after the letters on the web page.
-    alpha_filters = sorted(alpha_filters)
-    if alpha_filters and alpha_filters[0] == '0-9':
-        alpha_filters = alpha_filters[1:] + alpha_filters[:1]
-
-    # handle "root" page
-    if alpha is None and group != 'featured':
-        try:
-            alpha = alpha_filters[0]
-        except IndexError:
-            alpha = "a" # fail gracefully if the page has ZERO companies
-
-    # filter by alpha, i.e. .../all|member|featured-companies/<<alpha>>/
-    # unless it's featured companies, then display all of them
-    if group == 'featured':
-        filtered_companies = list(companies)
-    elif alpha == "0-9":
-        filtered_companies = [co for co in companies
-                              if co.company_slug[0].isdigit()]
-    else:
-        filtered_companies = [co for co in companies
-                              if co.company_slug.startswith(alpha)]
-
-    filtered_companies.sort(key=lambda co: co.company_slug)
-
-    company_data = helpers.company_thumbnails(filtered_companies,
-                                              use_canonical=False)
+            company_data = [co for co in company_data if co['member']]
 
     if company_data:
         co_count = len(company_data)
@@ -1229,11 +1217,11 @@ def company_listing(request, alpha=None, group=None):
 
     data_dict = {
         'site_config': site_config,
-        'site_name': settings.SITE_NAME,
-        'site_title': settings.SITE_TITLE,
-        'site_heading': settings.SITE_HEADING,
-        'site_tags': settings.SITE_TAGS,
-        'site_description': settings.SITE_DESCRIPTION,
+        'site_name': site_settings.SITE_NAME,
+        'site_title': site_settings.SITE_TITLE,
+        'site_heading': site_settings.SITE_HEADING,
+        'site_tags': site_settings.SITE_TAGS,
+        'site_description': site_settings.SITE_DESCRIPTION,
         'company_data': company_data,
         'column_count': column_count,
         'total_jobs_count': jobs_count,
@@ -1242,7 +1230,7 @@ def company_listing(request, alpha=None, group=None):
         'featured': str(bool(featured)).lower(),
         'group': group,
         'build_num' : settings.BUILD,
-        'view_source' : settings.VIEW_SOURCE
+        'view_source' : site_settings.VIEW_SOURCE
     }
 
     return render_to_response('all_companies_page.html', data_dict,
@@ -1250,16 +1238,40 @@ def company_listing(request, alpha=None, group=None):
 
 
 def solr_ac(request):
-    """Populate the searchbox autocomplete."""
+    """
+    Populate the searchbox autocomplete.
 
+    Suggestions come from the site's counted titles and locations (see
+    seo.autocomplete) if they've been counted, and from Solr if not.
+
+    """
     lookup_type = request.GET.get('lookup')
     term = request.GET.get('term')
+    callback = request.GET.get('callback')
+    autocomplete = get_site_autocomplete(site_settings.SITE_ID)
+    if autocomplete is not None:
+        res = autocomplete.suggest(lookup_type, term or '', 15)
+    else:
+        res = solr_ac_results(lookup_type, term)
+
+    res = json.dumps([{lookup_type: i[0], 'jobcount': str(i[1])} for i in res])
+    jsonpres = "{jsonp}({res})".format(jsonp=callback, res=res)
+    return HttpResponse(jsonpres, content_type="application/json")
+
+
+def solr_ac_results(lookup_type, term):
+    """
+    Searches Solr for the autocomplete suggestions of a term.
+
+    Returns:
+    A list of (value, job count) pairs
+
+    """
     sqs = DESearchQuerySet().facet_mincount(1).facet_sort("count").facet_limit(15)
     sqs = helpers._sqs_narrow_by_buid_and_site_package(sqs)
     # filter `sqs` by default facet, if one exists.
-    sqs = helpers.sqs_apply_custom_facets(settings.DEFAULT_FACET, sqs=sqs)
+    sqs = helpers.sqs_apply_custom_facets(site_settings.DEFAULT_FACET, sqs=sqs)
 
-    callback = request.GET.get('callback')
     if lookup_type == 'location':
         loc_fields = {'country': 'country',
                       'state': 'state',
@@ -1285,10 +1297,7 @@ def solr_ac(request):
             res = []
     else:
         res = []
-
-    res = json.dumps([{lookup_type: i[0], 'jobcount': str(i[1])} for i in res])
-    jsonpres = "{jsonp}({res})".format(jsonp=callback, res=res)
-    return HttpResponse(jsonpres, content_type="application/json")
+    return res
 
 
 def v2_redirect(request, v2_redirect=None, country=None, state=None, city=None,
@@ -1366,37 +1375,32 @@ def send_sns_confirm(response):
                 LOG.info("Skipping update_solr for %s because it is not in the allowed buids list." % buid)
 
 
+@conditional_page(site_page_validators)
 def new_sitemap_index(request):
     """
     Generates the sitemap index page, which instructs the crawler how to
     get to every other page.
 
-    """
-    today = datetime.date.today()
-    yesterday = today - datetime.timedelta(days=1)
-    midnight = datetime.time.max
-    #The latest date/time in sitemaps is yesterday, midnight (time.max)
-    latest_datetime = datetime.datetime.combine(yesterday, midnight)
-    # Number of days to go back from today.
-    history = 30
-    # Populate a list of datetime.datetime objects representing today's date
-    # as well as one for each day going back 'history' days.
-    dates = [latest_datetime - datetime.timedelta(days=i) for i in xrange(history)]
-    earliest_day = (latest_datetime - datetime.timedelta(days=history)).date()
-    datecounts = DateSitemap().numpages(startdate=earliest_day,
-                                        enddate=latest_datetime)
-    sitemaps = {}
+    Uses the site's built sitemaps (see seo.sitemap.build_site_sitemaps) if
+    they're up to date with today's index, and counts jobs in Solr if not.
 
-    for date in dates:
-        dt = datetime.date(*date.timetuple()[0:3]).isoformat()
-        sitemaps[dt] = {'sitemap': DateSitemap(), 'count': datecounts[dt]}
+    """
     current_site = Site.objects.get_current()
+    dates = [date.isoformat() for date in sitemap_dates()]
+    manifest = get_sitemap_manifest(current_site.domain)
+    if manifest and set(manifest['days']) == set(dates):
+        datecounts = dict((date, len(day['pages']))
+                          for date, day in manifest['days'].iteritems())
+    else:
+        startdate, enddate = sitemap_count_range(sitemap_dates())
+        datecounts = DateSitemap().numpages(startdate=startdate,
+                                            enddate=enddate)
     protocol = request.is_secure() and 'https' or 'http'
 
     #List of tuples: (sitemap url, lastmod date)
     sites_dates = []
-    for date in sorted(sitemaps.keys(), reverse=True):
-        pages = sitemaps[date]['count']
+    for date in dates:
+        pages = datecounts[date]
         sitemap_url = urlresolvers.reverse('sitemap_date',
                                            kwargs={'jobdate': date})
         sites_dates.append(('%s://%s%s' % (protocol, current_site.domain,
@@ -1414,9 +1418,23 @@ def new_sitemap_index(request):
     return HttpResponse(xml, content_type='application/xml')
 
 
+@conditional_page(site_page_validators)
 def new_sitemap(request, jobdate=None):
     page = request.GET.get("p", 1)
-    fields = ['title', 'location', 'uid', 'guid']
+    domain = Site.objects.get_current().domain
+    manifest = get_sitemap_manifest(domain)
+    if manifest and jobdate in manifest['days']:
+        try:
+            page_number = int(page)
+        except ValueError:
+            raise Http404("No page '%s'" % page)
+        if not 0 < page_number <= len(manifest['days'][jobdate]['pages']):
+            raise Http404("Page %s empty" % page)
+        content = get_sitemap_page(domain, jobdate, page_number)
+        if content is not None:
+            return sitemap_page_response(request, content)
+
+    fields = list(SITEMAP_FIELDS)
     sitemaps = {
         jobdate: DateSitemap(page=page, fields=fields, jobdate=jobdate)
     }
@@ -1439,6 +1457,26 @@ def new_sitemap(request, jobdate=None):
     return HttpResponse(xml, content_type='application/xml')
 
 
+def sitemap_page_response(request, content):
+    """
+    Returns a built sitemap page, as is to clients that accept gzipped
+    responses and decompressed to any others.
+
+    Inputs:
+    :request: django request object
+    :content: The gzipped page
+
+    """
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(content, content_type='application/xml')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        xml = gzip.GzipFile(fileobj=StringIO(content)).read()
+        response = HttpResponse(xml, content_type='application/xml')
+    patch_vary_headers(response, ('Accept-Encoding', ))
+    return response
+
+
 def get_group_sites(request):
     if request.method == u'GET':
         GET = request.GET
@@ -1608,13 +1646,13 @@ def dseo_404(request, the_job=None, job_detail=False):
         'domain': 'http://' + request.get_host(),
         'jobdata': {},
         'referer': request.META.get('HTTP_REFERER'),
-        'site_name': settings.SITE_NAME,
-        'site_title': settings.SITE_TITLE,
-        'site_heading': settings.SITE_HEADING,
-        'site_tags': settings.SITE_TAGS,
-        'site_description': settings.SITE_DESCRIPTION,
+        'site_name': site_settings.SITE_NAME,
+        'site_title': site_settings.SITE_TITLE,
+        'site_heading': site_settings.SITE_HEADING,
+        'site_tags': site_settings.SITE_TAGS,
+        'site_description': site_settings.SITE_DESCRIPTION,
         'build_num': settings.BUILD,
-        'view_source': settings.VIEW_SOURCE
+        'view_source': site_settings.VIEW_SOURCE
     }
 
     if job_detail and the_job:
@@ -1652,13 +1690,13 @@ def dseo_500(request):
         'path': request.path,
         'domain': 'http://%s' % request.get_host(),
         'referer': request.META.get('HTTP_REFERER'),
-        'site_name': settings.SITE_NAME,
-        'site_title': settings.SITE_TITLE,
-        'site_heading': settings.SITE_HEADING,
-        'site_tags': settings.SITE_TAGS,
-        'site_description': settings.SITE_DESCRIPTION,
+        'site_name': site_settings.SITE_NAME,
+        'site_title': site_settings.SITE_TITLE,
+        'site_heading': site_settings.SITE_HEADING,
+        'site_tags': site_settings.SITE_TAGS,
+        'site_description': site_settings.SITE_DESCRIPTION,
         'build_num': settings.BUILD,
-        'view_source': settings.VIEW_SOURCE
+        'view_source': site_settings.VIEW_SOURCE
     }
     return HttpResponseServerError(loader.render_to_string(
                                    'dseo_500.html', data_dict,
@@ -1682,11 +1720,25 @@ def search_by_results_and_slugs(request, *args, **kwargs):
         sort_order = 'relevance'
 
     facet_blurb_facet = None
-    ga = settings.SITE.google_analytics.all()
-    sitecommit_str = helpers.make_specialcommit_string(settings.COMMITMENTS.all())
+    ga = site_settings.SITE.google_analytics.all()
+    sitecommit_str = helpers.make_specialcommit_string(site_settings.COMMITMENTS.all())
     site_config = get_site_config(request)
     num_jobs = int(site_config.num_job_items_to_show) * 2
 
+    # Text uses html_description instead of just description.
+    fl = list(helpers.search_fields)
+    index = fl.index('description')
+    fl.pop(index)
+    # We use the html_description to show highlighted snippets of the
+    # description that match the search term. If there is no search
+    # term there's no reason to even get the html_description.
+    if q_term:
+        fl.append('html_description')
+
+    (default_jobs, total_default_jobs, featured_jobs, total_featured_jobs,
+     facet_counts) = get_jobs_and_counts(request, filters, num_jobs, fl=fl)
+
+    # The custom facet counts are fetched and cached along with the jobs.
     custom_facet_counts = []
     if site_config.browse_facet_show:
         cf_count_tup = get_custom_facets(request, filters=filters,
@@ -1706,22 +1758,6 @@ def search_by_results_and_slugs(request, *args, **kwargs):
             if len(active_facets) == 1 and active_facets[0].blurb:
                 facet_blurb_facet = active_facets[0]
 
-    # Text uses html_description instead of just description.
-    fl = list(helpers.search_fields)
-    index = fl.index('description')
-    fl.pop(index)
-    # We use the html_description to show highlighted snippets of the
-    # description that match the search term. If there is no search
-    # term there's no reason to even get the html_description.
-    if q_term:
-        fl.append('html_description')
-
-    default_jobs, featured_jobs, facet_counts = helpers.jobs_and_counts(
-        request, filters, num_jobs, fl=fl)
-
-    total_featured_jobs = featured_jobs.count()
-    total_default_jobs = default_jobs.count()
-
     (num_featured_jobs, num_default_jobs, _, _) = helpers.featured_default_jobs(
         total_featured_jobs, total_default_jobs,
         num_jobs, site_config.percent_featured)
@@ -1777,18 +1813,18 @@ def search_by_results_and_slugs(request, *args, **kwargs):
         'total_jobs_count': get_total_jobs_count(),
         'results_heading': results_heading,
         'search_url': request.path,
-        'site_commitments': settings.COMMITMENTS,
+        'site_commitments': site_settings.COMMITMENTS,
         'site_commitments_string': sitecommit_str,
         'site_config': site_config,
-        'site_description': settings.SITE_DESCRIPTION,
-        'site_heading': settings.SITE_HEADING,
-        'site_name': settings.SITE_NAME,
-        'site_tags': settings.SITE_TAGS,
-        'site_title': settings.SITE_TITLE,
+        'site_description': site_settings.SITE_DESCRIPTION,
+        'site_heading': site_settings.SITE_HEADING,
+        'site_name': site_settings.SITE_NAME,
+        'site_tags': site_settings.SITE_TAGS,
+        'site_title': site_settings.SITE_TITLE,
         'sort_fields': helpers.sort_fields,
         'sort_order': sort_order,
         'title_term': q_term if q_term else '\*',
-        'view_source': settings.VIEW_SOURCE,
+        'view_source': site_settings.VIEW_SOURCE,
         'widgets': widgets,
     }
 
@@ -1806,10 +1842,10 @@ class SearchResults(FallbackBlockView):
     def set_page(self, request):
         if request.user.is_authenticated() and request.user.is_staff:
             no_results_pages = Page.objects.filter(page_type=Page.NO_RESULTS,
-                                                   sites=settings.SITE)
+                                                   sites=site_settings.SITE)
         else:
             no_results_pages = Page.objects.filter(page_type=Page.NO_RESULTS,
-                                                   sites=settings.SITE,
+                                                   sites=site_settings.SITE,
                                                    status=Page.PRODUCTION)
 
         if no_results_pages.exists():
@@ -1830,7 +1866,7 @@ def urls_redirect(request, guid, vsid=None, debug=None):
     if debug is None:
         debug = ''
 
-    site = getattr(settings, 'SITE', None)
+    site = getattr(site_settings, 'SITE', None)
     if site is None:
         site = Site.objects.get(domain='www.my.jobs')
     qs = QueryDict(request.META['QUERY_STRING'], mutable=True)
@@ -1,8 +1,30 @@
+import json
+import logging
+import Queue
+import threading
+
 import pysolr
 import requests
 import time
 
 
+logger = logging.getLogger(__name__)
+
+
+class TransientSolrError(pysolr.SolrError):
+    """
+    A Solr request failed in a way that is worth retrying: a timeout, a
+    connection error or a gateway/unavailable response.
+
+    """
+    pass
+
+
+# HTTP statuses that indicate Solr is temporarily unable to handle a
+# request, rather than that the request itself is bad.
+TRANSIENT_STATUS_CODES = (502, 503, 504)
+
+
 class Solr(pysolr.Solr):
     def __init__(self, url, decoder=None, timeout=60, auth=None):
         super(Solr, self).__init__(url, decoder, timeout)
@@ -50,14 +72,14 @@ class Solr(pysolr.Solr):
         except requests.exceptions.Timeout as err:
             error_message = "Connection to server '%s' timed out: %s"
             self.log.error(error_message, url, err, exc_info=True)
-            raise pysolr.SolrError(error_message % (url, err))
+            raise TransientSolrError(error_message % (url, err))
         except requests.exceptions.ConnectionError as err:
             error_message = "Failed to connect to server at '%s', are you " \
                             "sure that URL is correct? Checking it in a " \
                             "browser might help: %s"
             params = (url, err)
             self.log.error(error_message, *params, exc_info=True)
-            raise pysolr.SolrError(error_message % params)
+            raise TransientSolrError(error_message % params)
 
         end_time = time.time()
         self.log.info("Finished '%s' (%s) with body '%s' in %0.3f seconds.",
@@ -67,6 +89,202 @@ class Solr(pysolr.Solr):
             error_message = self._extract_error(resp)
             data = {'data': {'headers': resp.headers, 'response': resp.content}}
             self.log.error(error_message, extra=data)
+            if int(resp.status_code) in TRANSIENT_STATUS_CODES:
+                raise TransientSolrError(error_message)
             raise pysolr.SolrError(error_message)
 
-        return pysolr.force_unicode(resp.content)
\ No newline at end of file
+        return pysolr.force_unicode(resp.content)
+
+    def iter_search(self, q, rows=1000, **kwargs):
+        """
+        Yields every document matching a query, paging through the results
+        with Solr's cursorMark. Unlike start/rows paging, every page costs
+        the same no matter how deep into the results it is.
+
+        cursorMark requires the results to be sorted on the uniqueKey, so
+        they are returned sorted by id.
+
+        """
+        params = {'q': q, 'rows': rows, 'sort': 'id asc'}
+        params.update(kwargs)
+        cursor = '*'
+        while True:
+            params['cursorMark'] = cursor
+            response = self.decoder.decode(self._select(params))
+            for doc in response['response']['docs']:
+                yield doc
+            next_cursor = response.get('nextCursorMark', cursor)
+            if next_cursor == cursor:
+                break
+            cursor = next_cursor
+
+
+class SolrWriter(object):
+    """
+    Sends adds and deletes to Solr from a small pool of threads, so that
+    several update requests are in flight at once instead of waiting on
+    each one in turn.
+
+    Each thread keeps its own connection (and so its own persistent HTTP
+    session). At most `threads` requests are queued beyond the ones being
+    sent; once that many are waiting, `add` and `delete` block until a
+    thread is free.
+
+    Documents passed to `add` are batched by their approximate serialized
+    size rather than by count, so that a few very large documents don't
+    make an update request too big for Solr to handle.
+
+    Transient errors (see TransientSolrError) are retried with exponential
+    backoff. If Solr rejects a batch of documents, the batch is split in
+    half and each half is sent again, until the documents Solr won't accept
+    are isolated. Those are logged and collected in `failed_docs` instead of
+    failing the whole update. Any other error is raised by the next call to
+    `add`, `delete` or `close`.
+
+    The update requests never commit themselves, since a hard commit per
+    batch, with several batches in flight, would open overlapping searchers.
+    Instead `close` sends a single commit once everything has been sent,
+    unless `commitWithin` is passed (and nothing was deleted, since deletes
+    don't take it), in which case Solr commits on its own.
+
+    Use as a context manager, or call `close` once everything has been
+    sent to wait for the queued requests to finish:
+
+        with SolrWriter(url, commitWithin="30000") as writer:
+            writer.add(docs)
+            writer.delete(q="uid:(1 OR 2)")
+
+    args:
+    url -- The url of the Solr core to update.
+    threads -- The number of concurrent update requests.
+    max_batch_bytes -- The approximate maximum size of a batch of documents.
+    max_batch_docs -- The maximum number of documents in a batch.
+    retries -- The number of times a request is retried after a transient
+    error.
+    backoff -- Seconds to wait before the first retry. Doubles with every
+    retry.
+    add_kwargs -- Passed on to every call to Solr.add (e.g. commitWithin).
+
+    """
+    def __init__(self, url, threads=4, max_batch_bytes=4 * 1024 * 1024,
+                 max_batch_docs=4096, retries=4, backoff=1, timeout=60,
+                 auth=None, **add_kwargs):
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_docs = max_batch_docs
+        self.retries = retries
+        self.backoff = backoff
+        self.add_kwargs = add_kwargs
+        self.failed_docs = []
+        self._conn = Solr(url, timeout=timeout, auth=auth)
+        self._deleted = False
+        self.error = None
+        self._batch = []
+        self._batch_bytes = 0
+        self._queue = Queue.Queue(maxsize=threads)
+        self._threads = []
+        for i in range(threads):
+            conn = Solr(url, timeout=timeout, auth=auth)
+            thread = threading.Thread(target=self._work, args=(conn, ))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't queue the documents batched so far or commit. Requests
+            # that are already queued are still sent before the threads shut
+            # down.
+            self._batch = []
+            self._stop()
+
+    def add(self, docs):
+        """Queues an iterable of documents to be added to the index."""
+        for doc in docs:
+            size = len(json.dumps(doc, default=unicode))
+            if self._batch and (
+                    self._batch_bytes + size > self.max_batch_bytes or
+                    len(self._batch) >= self.max_batch_docs):
+                self.flush()
+            self._batch.append(doc)
+            self._batch_bytes += size
+
+    def delete(self, q):
+        """Queues a delete by query."""
+        self._deleted = True
+        self._put(lambda conn: self._retry(conn.delete, q=q, commit=False))
+
+    def flush(self):
+        """Queues the documents batched so far, without waiting for them."""
+        if self._batch:
+            batch = self._batch
+            self._batch = []
+            self._batch_bytes = 0
+            self._put(lambda conn: self._send_add(conn, batch))
+
+    def close(self):
+        """
+        Sends any remaining documents, waits for every queued request to
+        finish, then commits them (see above).
+
+        """
+        self.flush()
+        self._stop()
+        if self.error is not None:
+            raise self.error
+        if self._deleted or not self.add_kwargs.get('commitWithin'):
+            self._retry(self._conn.commit)
+
+    def _stop(self):
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _put(self, task):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(task)
+
+    def _work(self, conn):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            # Once something has failed, drain the queue without sending.
+            if self.error is not None:
+                continue
+            try:
+                task(conn)
+            except Exception as e:
+                logger.error("Solr update failed: %s", e, exc_info=True)
+                self.error = e
+
+    def _retry(self, func, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except TransientSolrError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _send_add(self, conn, docs):
+        try:
+            self._retry(conn.add, docs, commit=False, **self.add_kwargs)
+        except TransientSolrError:
+            raise
+        except pysolr.SolrError as e:
+            if len(docs) == 1:
+                logger.error("Solr rejected document %s: %s",
+                             docs[0].get('id'), e)
+                self.failed_docs.append(docs[0])
+                return
+            half = len(docs) / 2
+            self._send_add(conn, docs[:half])
+            self._send_add(conn, docs[half:])
@@ -101,9 +101,19 @@ class ExtraValuesSerializer(Serializer):
         """
         Serialize a queryset.
         
+        """
+        return ''.join(self.iter_serialize(queryset, **options))
+
+    def iter_serialize(self, queryset, **options):
+        """
+        Serialize a queryset a piece at a time, yielding the output written
+        so far after the header and after each object. The output is the
+        same as that of serialize, but only one object's worth of it is held
+        in memory at once, so that a large feed can be streamed.
+
         """
         self.options = options
-        self.stream = options.get("stream", StringIO())
+        self.stream = StringIO()
         #self.selected_fields = fields
         self.use_natural_keys = options.get("use_natural_keys", False)
         self.start_serialization()
@@ -112,6 +122,7 @@ class ExtraValuesSerializer(Serializer):
         self.handle_item('lastBuildDate', self.last_build_date)
         for value in self.extra_values:
             self.handle_item(value.name, value.content, value.attributes)
+        yield self.drain()
 
         for obj in queryset:
             self.start_object(obj)
@@ -123,8 +134,16 @@ class ExtraValuesSerializer(Serializer):
                     self.handle_item(key, value)
             self.handle_item_url(obj)
             self.end_object(obj)
+            yield self.drain()
         self.end_serialization()
-        return self.getvalue()
+        yield self.drain()
+
+    def drain(self):
+        """Returns and discards the output written to the stream so far."""
+        value = self.stream.getvalue()
+        self.stream.seek(0)
+        self.stream.truncate()
+        return value
 
 
 class XMLExtraValuesSerializer(ExtraValuesSerializer):
@@ -211,13 +230,19 @@ class JSONExtraValuesSerializer(ExtraValuesSerializer):
 
     def start_serialization(self):
         self._current = {} 
-        self.objects = []
+        self.objects = 0
+        self.stream.write('[')
 
     def start_object(self, obj):
         self._current = {}
 
     def end_object(self, obj):
-        self.objects.append(self._current)
+        # Objects are written as they're finished, separated the same way
+        # json.dump separates the items of a list.
+        if self.objects:
+            self.stream.write(', ')
+        json.dump(self._current, self.stream, **self.options)
+        self.objects += 1
         self._current = None
 
     def finish_handle_item(self, field_name, value, attributes=None):
@@ -232,7 +257,7 @@ class JSONExtraValuesSerializer(ExtraValuesSerializer):
             self._current[field_name] = unicode(value)
 
     def end_serialization(self):
-        json.dump(self.objects, self.stream, **self.options)
+        self.stream.write(']')
 
     def getvalue(self):
         if callable(getattr(self.stream, 'getvalue', None)):
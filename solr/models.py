@@ -4,4 +4,8 @@ from django.db import models
 class Update(models.Model):
     uid = models.CharField(max_length=20, blank=False, db_index=True,
                            unique=True)
-    delete = models.BooleanField(default=False)
\ No newline at end of file
+    delete = models.BooleanField(default=False)
+    # Incremented whenever the object is queued again, so that an Update
+    # that changed while it was being sent isn't removed (see
+    # solr.sync.sync_updates).
+    version = models.PositiveIntegerField(default=0)
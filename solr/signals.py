@@ -1,7 +1,10 @@
 import logging
 
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
 
 from myjobs.models import User
 from myprofile.models import ProfileUnits
@@ -12,16 +15,57 @@ logging.basicConfig()
 logger = logging.getLogger(__name__)
 
 
+# Fields whose changes don't need to be sent to solr.
+IGNORE_FIELDS = ['last_response', 'last_sent', 'date_updated', 'last_login',
+                 'date_joined']
+
+
+def snapshot_solr_fields(sender, instance, **kwargs):
+    """
+    Remembers the field values an instance was loaded or saved with, so that
+    presave_solr can tell what has changed without querying for them again.
+    Deferred fields haven't been loaded, so they aren't remembered.
+
+    """
+    update_fields = kwargs.get('update_fields')
+    snapshot = getattr(instance, '_solr_snapshot', {})
+    for field in instance._meta.fields:
+        if update_fields is not None and field.name not in update_fields:
+            # Only these fields were saved.
+            continue
+        if field.attname in instance.__dict__:
+            snapshot[field.attname] = instance.__dict__[field.attname]
+    instance._solr_snapshot = snapshot
+
+
 def presave_solr(sender, instance, *args, **kwargs):
     """
     Flag an instance for being uploaded to solr in the post-save if anything
     we actually care about has been changed.
 
+    Changes are found by comparing the instance with the values it was
+    loaded with (see snapshot_solr_fields). The database is only queried for
+    instances that weren't loaded from it, or weren't loaded with every
+    field.
+
     """
-    ignore_fields = ['last_response', 'last_sent', 'date_updated',
-                     'last_login', 'date_joined']
     setattr(instance, 'solr_update', False)
-    if instance.pk:
+    if not instance.pk:
+        setattr(instance, 'solr_update', True)
+        return
+
+    fields = [field for field in instance._meta.fields
+              if field.attname not in IGNORE_FIELDS]
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        fields = [field for field in fields if field.name in update_fields]
+        if not fields:
+            # e.g. saving last_login only
+            return
+
+    saved = getattr(instance, '_solr_snapshot', {})
+    if (instance._state.adding or
+            any(field.attname not in saved for field in fields)):
         # The instance might have a pk but still not actually
         # exist (eg: loading fixtures).
         try:
@@ -29,18 +73,38 @@ def presave_solr(sender, instance, *args, **kwargs):
         except sender.DoesNotExist:
             setattr(instance, 'solr_update', True)
             return
+        saved = dict((field.attname, getattr(obj, field.attname))
+                     for field in fields)
 
-        for field in obj._meta.fields:
-            current_val = getattr(obj, field.attname)
-            new_val = getattr(instance, field.attname)
-            try:
-                if field.attname not in ignore_fields and current_val != new_val:
-                    setattr(instance, 'solr_update', True)
-            except TypeError, e:
-                logger.error("%s for field %s" % (e, field.attname))
+    for field in fields:
+        current_val = saved[field.attname]
+        new_val = getattr(instance, field.attname)
+        try:
+            if current_val != new_val:
                 setattr(instance, 'solr_update', True)
-    else:
-        setattr(instance, 'solr_update', True)
+                return
+        except TypeError, e:
+            logger.error("%s for field %s" % (e, field.attname))
+            setattr(instance, 'solr_update', True)
+            return
+
+
+def queue_solr_update(uid, delete=False):
+    """
+    Schedules a document to be added to, or deleted from, solr by
+    update_solr_task. The document's existing Update, if there is one, is
+    updated with a single query, and its version is incremented so that it
+    is sent again even if it's being sent right now.
+
+    """
+    updates = Update.objects.filter(uid=uid)
+    if not updates.update(delete=delete, version=F('version') + 1):
+        try:
+            with transaction.atomic():
+                Update.objects.create(uid=uid, delete=delete)
+        except IntegrityError:
+            # Scheduled by another process in the meantime
+            updates.update(delete=delete, version=F('version') + 1)
 
 
 def prepare_add_to_solr(sender, instance, **kwargs):
@@ -56,10 +120,7 @@ def prepare_add_to_solr(sender, instance, **kwargs):
             content_type_id = ContentType.objects.get_for_model(sender).pk
             object_id = instance.pk
         uid = "%s##%s" % (content_type_id, object_id)
-
-        obj, _ = Update.objects.get_or_create(uid=uid)
-        obj.delete = False
-        obj.save()
+        queue_solr_update(uid, delete=False)
 
 
 def prepare_delete_from_solr(sender, instance, **kwargs):
@@ -82,9 +143,13 @@ def prepare_delete_from_solr(sender, instance, **kwargs):
         content_type_id = ContentType.objects.get_for_model(sender).pk
         object_id = instance.pk
     uid = "%s##%s" % (content_type_id, object_id)
-    obj, _ = Update.objects.get_or_create(uid=uid)
-    obj.delete = True
-    obj.save()
+    queue_solr_update(uid, delete=True)
+
+
+PROFILE_UNIT_RELATIONS = ('name', 'education', 'website', 'telephone',
+                          'address', 'secondaryemail', 'militaryservice',
+                          'license', 'summary', 'employmenthistory',
+                          'volunteerhistory', 'content_type')
 
 
 def profileunits_to_dict(user_id):
@@ -95,6 +160,31 @@ def profileunits_to_dict(user_id):
     :user_id: the id of the user the dictionary is being created for
 
     """
+    return profileunits_to_dicts([user_id])[0]
+
+
+def profileunits_to_dicts(user_ids):
+    """
+    Creates the dictionaries of profile units for many users at once, with
+    a single query.
+
+    inputs:
+    :user_ids: the ids of the users the dictionaries are being created for
+
+    outputs:
+    A list of dictionaries, in the same order as user_ids
+
+    """
+    units_by_user = dict((user_id, []) for user_id in user_ids)
+    units = ProfileUnits.objects.filter(
+        user_id__in=user_ids).select_related(*PROFILE_UNIT_RELATIONS)
+    for unit in units:
+        units_by_user[unit.user_id].append(unit)
+    return [_profileunits_dict(user_id, units_by_user[user_id])
+            for user_id in user_ids]
+
+
+def _profileunits_dict(user_id, units):
     content_type_id = ContentType.objects.get_for_model(ProfileUnits).pk
     solr_dict = {
         'uid': "%s##%s" % (content_type_id, user_id),
@@ -102,18 +192,6 @@ def profileunits_to_dict(user_id):
     }
     models = {}
 
-    units = ProfileUnits.objects.filter(user_id=user_id).select_related('name',
-                                                                        'education',
-                                                                        'website',
-                                                                        'telephone',
-                                                                        'address',
-                                                                        'secondaryemail',
-                                                                        'militaryservice',
-                                                                        'license',
-                                                                        'summary',
-                                                                        'employmenthistory',
-                                                                        'volunteerhistory',
-                                                                        'content_type')
     for unit in units:
         unit = getattr(unit, unit.get_model_name())
         models.setdefault(unit.__class__.__name__, []).append(unit)
@@ -145,13 +223,15 @@ def profileunits_to_dict(user_id):
     return solr_dict
 
 
-def object_to_dict(model, obj):
+def object_to_dict(model, obj, company_id=None):
     """
     Turns an object into a solr compatible dictionary.
 
     inputs:
     :model: the model for the object
     :object: object being converted into a solr dictionary
+    :company_id: the company of a saved search, if it's already known (see
+        SavedSearch.get_company)
 
     """
     content_type_id = ContentType.objects.get_for_model(model).pk
@@ -162,7 +242,9 @@ def object_to_dict(model, obj):
 
     if model == SavedSearch:
         if obj.user:
-            solr_dict['SavedSearch_company_id'] = obj.get_company()
+            if company_id is None:
+                company_id = obj.get_company()
+            solr_dict['SavedSearch_company_id'] = company_id
 
             for field in User._meta.fields:
                 field_type = field.get_internal_type()
@@ -186,6 +268,12 @@ def object_to_dict(model, obj):
     return solr_dict
 
 
+for model_class in [User, SavedSearch] + ProfileUnits.__subclasses__():
+    post_init.connect(snapshot_solr_fields, sender=model_class,
+                      dispatch_uid='solr_snapshot_' + model_class.__name__)
+    post_save.connect(snapshot_solr_fields, sender=model_class,
+                      dispatch_uid='solr_snapshot_' + model_class.__name__)
+
 post_save.connect(prepare_add_to_solr, sender=User,
                   dispatch_uid="user")
 post_delete.connect(prepare_delete_from_solr, sender=User,
@@ -0,0 +1,269 @@
+"""
+Sends Users, their ProfileUnits and their SavedSearches to the MyJobs Solr
+cores (settings.SOLR).
+
+Changes are queued as solr.models.Update rows by solr.signals and sent by
+sync_updates, which loads and serializes the changed objects a batch at a
+time instead of one query per row. reindex sends everything, a batch of
+users at a time, and reports its progress so that it can be resumed.
+
+Documents are added to every core at once, and the next batch is prepared
+while the previous one is being sent.
+
+"""
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from urlparse import urlparse
+
+from django.contrib.contenttypes.models import ContentType
+import pysolr
+
+from myjobs.models import User
+from mysearches.models import SavedSearch
+from solr.models import Update
+from solr.signals import object_to_dict, profileunits_to_dicts
+
+# Number of objects loaded from the database per query, and of documents
+# sent to Solr per request.
+BATCH_SIZE = 1000
+
+
+def batches(iterable, size=BATCH_SIZE):
+    """Splits an iterable into lists of up to `size` items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _add(args):
+    solr, documents = args
+    solr.add(documents)
+
+
+def _delete(args):
+    solr, query = args
+    solr.delete(q=query)
+
+
+class DocumentSender(object):
+    """
+    Sends documents to several Solr cores at once. Each request is sent in
+    the background; it's only waited for when the next one is made, or when
+    the sender is closed.
+
+    """
+    def __init__(self, locations):
+        """
+        Inputs:
+        :locations: The urls of the cores to send documents to
+
+        """
+        self.solrs = [pysolr.Solr(location) for location in locations]
+        self.pool = ThreadPool(max(len(self.solrs), 1))
+        self.pending = None
+
+    def _send(self, function, argument):
+        self.wait()
+        self.pending = self.pool.map_async(
+            function, [(solr, argument) for solr in self.solrs])
+
+    def add(self, documents):
+        """Adds a list of documents to every core."""
+        self._send(_add, documents)
+
+    def delete(self, query):
+        """Deletes the documents matching a query from every core."""
+        self._send(_delete, query)
+
+    def wait(self):
+        """
+        Waits for the last request to be sent, raising its error if it
+        failed.
+
+        """
+        pending, self.pending = self.pending, None
+        if pending is not None:
+            pending.get()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.pool.terminate()
+
+
+def saved_search_dicts(searches, companies):
+    """
+    Serializes saved searches with a recipient, looking up the company of
+    each feed's domain (see SavedSearch.get_company) only once.
+
+    Inputs:
+    :searches: SavedSearches, with their users selected
+    :companies: A dictionary of the company ids of domains already looked up;
+        updated with the ones looked up here
+
+    """
+    for search in searches:
+        if not search.user_id:
+            continue
+        netloc = urlparse(search.feed).netloc
+        if netloc not in companies:
+            companies[netloc] = search.get_company()
+        yield object_to_dict(SavedSearch, search, companies[netloc])
+
+
+def pending_documents(ids):
+    """
+    Serializes the objects queued for Solr.
+
+    Inputs:
+    :ids: A dictionary of {content type id: set of object ids} of the objects
+        to serialize. The ids of ProfileUnits are user ids, as every unit of a
+        user is stored in the same document.
+
+    Outputs:
+    An iterator of Solr documents
+    """
+    user_type = ContentType.objects.get_for_model(User).pk
+    search_type = ContentType.objects.get_for_model(SavedSearch).pk
+    user_ids = ids.pop(user_type, set())
+    search_ids = ids.pop(search_type, set())
+    unit_user_ids = set()
+    for object_ids in ids.values():
+        unit_user_ids.update(object_ids)
+
+    companies = {}
+    for batch in batches(sorted(search_ids)):
+        searches = SavedSearch.objects.filter(
+            pk__in=batch).select_related('user')
+        # The searches of updated users are sent along with them, below.
+        searches = [search for search in searches
+                    if search.user_id not in user_ids]
+        for document in saved_search_dicts(searches, companies):
+            yield document
+
+    # Users are stored on their saved searches' documents too, so each of
+    # their searches has to be updated with them.
+    for batch in batches(sorted(user_ids)):
+        searches = SavedSearch.objects.filter(
+            user_id__in=batch).select_related('user')
+        for document in saved_search_dicts(searches, companies):
+            yield document
+        for user in User.objects.filter(pk__in=batch):
+            yield object_to_dict(User, user)
+
+    for batch in batches(sorted(unit_user_ids)):
+        for document in profileunits_to_dicts(batch):
+            yield document
+
+
+def remove_sent(updates):
+    """
+    Removes Update rows once they've been sent, unless they were queued
+    again (and so their version changed) after they were read.
+
+    Inputs:
+    :updates: A list of the (pk, uid, version) of the rows sent
+
+    """
+    for batch in batches(updates):
+        versions = {}
+        for pk, uid, version in batch:
+            versions.setdefault(version, []).append(pk)
+        for version, pks in versions.items():
+            Update.objects.filter(pk__in=pks, version=version).delete()
+
+
+def sync_updates(locations):
+    """
+    Deletes every object queued for deletion from Solr, then sends every
+    object queued to be added. Only the Update rows that were sent, and that
+    haven't been queued again since they were read, are removed, so changes
+    queued meanwhile are sent next time.
+
+    Inputs:
+    :locations: The urls of the cores to update
+
+    """
+    sender = DocumentSender(locations)
+    try:
+        deletes = list(Update.objects.filter(delete=True).values_list(
+            'pk', 'uid', 'version'))
+        for batch in batches(deletes):
+            uids = " OR ".join(uid for pk, uid, version in batch if uid)
+            if uids:
+                sender.delete("uid:(%s)" % uids)
+        sender.wait()
+        remove_sent(deletes)
+
+        adds = list(Update.objects.filter(delete=False).values_list(
+            'pk', 'uid', 'version'))
+        ids = {}
+        for pk, uid, version in adds:
+            content_type, key = uid.split("##")
+            ids.setdefault(int(content_type), set()).add(int(key))
+        for batch in batches(document for document in pending_documents(ids)
+                             if document):
+            sender.add(batch)
+        sender.wait()
+        remove_sent(adds)
+    finally:
+        sender.close()
+
+
+def reindex_documents(start_after=0):
+    """
+    Serializes every user, their ProfileUnits and their SavedSearches, a
+    batch of users at a time, in order of user id.
+
+    Inputs:
+    :start_after: Only serialize users with a greater id
+
+    Outputs:
+    An iterator of (id of the batch's last user, list of documents)
+    """
+    companies = {}
+    while True:
+        users = list(User.objects.filter(
+            pk__gt=start_after).order_by('pk')[:BATCH_SIZE])
+        if not users:
+            return
+        user_ids = [user.pk for user in users]
+
+        documents = profileunits_to_dicts(user_ids)
+        searches = SavedSearch.objects.filter(
+            user_id__in=user_ids).select_related('user')
+        for document in saved_search_dicts(searches, companies):
+            document['doc_type'] = 'savedsearch'
+            documents.append(document)
+        documents.extend(object_to_dict(User, user) for user in users)
+
+        start_after = user_ids[-1]
+        yield start_after, documents
+
+
+def reindex(locations, start_after=0):
+    """
+    Sends every user, their ProfileUnits and their SavedSearches to Solr.
+
+    Inputs:
+    :locations: The urls of the cores to update
+    :start_after: Only send users with a greater id, e.g. the last one sent
+        by an earlier reindex that failed
+
+    Outputs:
+    An iterator of the id of the last user sent so far, after each batch of
+    users has been sent
+    """
+    sender = DocumentSender(locations)
+    try:
+        for last_user_id, documents in reindex_documents(start_after):
+            for batch in batches(documents):
+                sender.add(batch)
+            sender.wait()
+            yield last_user_id
+    finally:
+        sender.close()
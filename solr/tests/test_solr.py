@@ -1,7 +1,7 @@
 import datetime
 import uuid
 
-from mock import Mock
+from mock import Mock, patch
 import pytz
 
 from django.conf import settings
@@ -16,11 +16,13 @@ from myprofile.tests.factories import (PrimaryNameFactory, AddressFactory,
                                        SummaryFactory)
 from mysearches.models import SavedSearch
 from mysearches.tests.factories import SavedSearchFactory
+from solr import sync
 from solr.models import Update
 from solr.helpers import Solr
 from solr.signals import profileunits_to_dict, object_to_dict
 from solr.tests.helpers import MockLog
-from tasks import update_solr_task, parse_log, delete_old_analytics_docs
+from tasks import (update_solr_task, parse_log, delete_old_analytics_docs,
+                   task_reindex_solr, _save_log_batch)
 
 
 class SolrTests(MyJobsBase):
@@ -63,6 +65,66 @@ class SolrTests(MyJobsBase):
         update_solr_task(self.test_solr)
         self.assertEqual(Solr().search().hits, 0)
 
+    def test_reindex_resumes_after_user(self):
+        """
+        A reindex sends each user along with their ProfileUnits and
+        SavedSearches, and can resume after the last user it sent.
+
+        """
+        Solr().delete()
+        users = [UserFactory(email='example%s@example.com' % i)
+                 for i in range(3)]
+        for user in users:
+            SavedSearchFactory(user=user)
+        Update.objects.all().delete()
+
+        task_reindex_solr(self.test_solr, start_after=users[0].pk)
+        # A user, profile units and saved search document for each of the
+        # last two users
+        self.assertEqual(Solr().search().hits, 6)
+
+    def test_user_update_sends_searches(self):
+        """
+        Updating a user updates the user documents of their saved searches.
+
+        """
+        Solr().delete()
+        user = UserFactory(email='example@example.com')
+        SavedSearchFactory(user=user)
+        update_solr_task(self.test_solr)
+
+        user.email = 'changed@example.com'
+        user.save()
+        update_solr_task(self.test_solr)
+        self.assertEqual(Update.objects.count(), 0)
+        results = Solr().add_query('User_email:"changed@example.com"').search()
+        self.assertEqual(results.hits, 2)
+
+    def test_update_queued_while_sending(self):
+        """
+        An object saved after it has been serialized, but before its update
+        has been removed, is sent again the next time.
+
+        """
+        Solr().delete()
+        user = UserFactory(email='example@example.com')
+        pending_documents = sync.pending_documents
+
+        def save_while_sending(ids):
+            for document in pending_documents(ids):
+                yield document
+            user.email = 'changed@example.com'
+            user.save()
+
+        with patch.object(sync, 'pending_documents', save_while_sending):
+            update_solr_task(self.test_solr)
+        self.assertEqual(Update.objects.count(), 1)
+
+        update_solr_task(self.test_solr)
+        self.assertEqual(Update.objects.count(), 0)
+        results = Solr().add_query('User_email:"changed@example.com"').search()
+        self.assertEqual(results.hits, 1)
+
     def test_xml_chars(self):
         Solr().delete()
 
@@ -236,6 +298,30 @@ class SolrTests(MyJobsBase):
 
         self.assertEqual(Update.objects.all().count(), 1)
 
+    def test_presave_without_query(self):
+        """
+        Changes to instances loaded from the database are found without
+        loading them again.
+
+        """
+        user = UserFactory(email="test@test.test")
+        update_solr_task(self.test_solr)
+        user = User.objects.get(pk=user.pk)
+
+        with patch.object(User.objects, 'get') as get:
+            user.last_login = datetime.datetime(2011, 8, 15, 8, 15, 12, 0,
+                                                pytz.UTC)
+            user.save(update_fields=['last_login'])
+            self.assertEqual(Update.objects.all().count(), 0)
+
+            user.save()
+            self.assertEqual(Update.objects.all().count(), 0)
+
+            user.email = "test1@test1.test1"
+            user.save()
+            self.assertEqual(Update.objects.all().count(), 1)
+        self.assertFalse(get.called)
+
     def test_analytics_log_parsing(self):
         """
         Ensure that analytics logs are parsed and stored in solr correctly
@@ -344,3 +430,44 @@ class SolrTests(MyJobsBase):
                          'Sets are not equal; difference: %s' %
                          str(old_uids.union(new_uids).symmetric_difference(
                              all_uids)))
+
+    def test_analytics_user_guid_case(self):
+        """
+        Hits are matched to users whatever the case of their myguid.
+        """
+        user = UserFactory()
+        user.user_guid = '1e5f7e122156483f98727366afe06e0b'
+        user.save()
+        update_dict = {'job_view_buid': '1000', 'view_date': 'now',
+                       'aguid': 'aguid'}
+        solr = Mock()
+        memo = {'users': {}, 'companies': {}}
+
+        _save_log_batch([(update_dict, user.user_guid.upper())], memo,
+                        [solr])
+        doc = solr.add.call_args[0][0][0]
+        self.assertEqual(doc['User_user_guid'], user.user_guid)
+
+    def test_analytics_log_report(self):
+        """
+        parse_log should report how each log's lines were handled and look
+        up users and companies once per batch rather than once per hit
+        """
+        user = UserFactory()
+        user.user_guid = '1e5f7e122156483f98727366afe06e0b'
+        user.save()
+        logs = [MockLog(log_type=log_type)
+                for log_type in ['analytics', 'redirect']]
+
+        # Users are converted with object_to_dict, which needs the (cached)
+        # content type.
+        ContentType.objects.get_for_model(User)
+        # The analytics log needs a user and a company lookup; the redirect
+        # log has no myguid, so only needs a company lookup.
+        with self.assertNumQueries(3):
+            reports = parse_log(logs, self.test_solr)
+
+        for log in logs:
+            self.assertEqual(reports[log.key],
+                             {'parsed': 1, 'bots': 1, 'failed': 0,
+                              'unsaved': 0})
@@ -7,35 +7,39 @@ import newrelic.agent
 import os
 import pysolr
 import sys
+import tempfile
 import traceback
 from urllib2 import HTTPError, URLError
 import urlparse
-import uuid
 
 from celery import group
 from celery.task import task
 
 from django.conf import settings
 from django.contrib.sitemaps import ping_google
-from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.core.urlresolvers import reverse_lazy
 from django.template.loader import render_to_string
 from django.db.models import Q
 
-from seo.models import Company, SeoSite, BusinessUnit
+from seo.autocomplete import build_site_autocomplete
+from seo.cache import (materialize_company_directory,
+                       materialize_custom_facet_counts)
+from seo.sitemap import build_site_sitemaps
+from seo.models import Company, SeoSite, SeoSiteFacet, BusinessUnit
 from myjobs.models import EmailLog, User, STOP_SENDING, BAD_EMAIL
 from myjobs.helpers import log_to_jira
 from mymessages.models import Message
-from mysearches.models import SavedSearch, SavedSearchDigest, SavedSearchLog
+from mysearches.helpers import SharedFeeds
+from mysearches.models import SavedSearchDigest, SavedSearchLog
 from mypartners.models import PartnerLibrary
 from mypartners.helpers import get_library_partners
 import import_jobs
 from postajob.models import Job
 from registration.models import ActivationProfile
 from solr import helpers
-from solr.models import Update
-from solr.signals import object_to_dict, profileunits_to_dict
+from solr import sync as solr_sync
+from solr.signals import object_to_dict
 
 
 logger = logging.getLogger(__name__)
@@ -46,6 +50,8 @@ sys.path.insert(0, os.path.join(BASE_DIR))
 sys.path.insert(0, os.path.join(BASE_DIR, '../'))
 os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
 FEED_FILE_PREFIX = "dseo_feed_"
+# Analytics logs up to this size are parsed without being written to disk
+LOG_SPOOL_SIZE = 1024 * 1024 * 64
 PARTNER_LIBRARY_SOURCES = {
     # http://www.dol-esa.gov/errd/index.html
     'Employment Referral Resource Directory': {
@@ -70,16 +76,19 @@ PARTNER_LIBRARY_SOURCES = {
 
 @task(name='tasks.send_search_digest', ignore_result=True,
       default_retry_delay=180, max_retries=2, bind=True)
-def send_search_digest(self, search):
+def send_search_digest(self, search, feed_run=None):
     """
     Task used by send_send_search_digests to send individual digest or search
     emails.
 
     Inputs:
     :search: SavedSearch or SavedSearchDigest instance to be mailed
+    :feed_run: The run id of the SharedFeeds holding the feeds of the
+        searches being mailed
     """
+    feeds = SharedFeeds(feed_run) if feed_run else None
     try:
-        search.send_email()
+        search.send_email(feeds=feeds)
     except (ValueError, URLError, HTTPError) as e:
         if self.request.retries < 2:  # retry sending email twice
             raise send_search_digest.retry(arg=[search], exc=e)
@@ -150,6 +159,11 @@ def send_search_digests():
     Daily task to send saved searches. If user opted in for a digest, they
     receive it daily and do not get individual saved search emails. Otherwise,
     each active saved search is sent individually.
+
+    Searches that request the same feed share a single download of it (see
+    mysearches.helpers.SharedFeeds). Feeds are downloaded
+    SAVED_SEARCH_FEED_WORKERS at a time, and each email is queued as soon as
+    its feeds have been downloaded.
     """
 
     def filter_by_time(qs):
@@ -170,12 +184,27 @@ def send_search_digests():
         monthly = qs.filter(frequency='M', day_of_month=today.day)
         return chain(daily, weekly, monthly)
 
+    feeds = SharedFeeds()
+    # (digest or search, keys of the feeds its email needs)
+    emails = []
+
+    def add_email(obj, searches):
+        keys = set()
+        for search in searches:
+            try:
+                keys.add(feeds.request(**search.get_feed_args()))
+            except Exception:
+                # The email's own task runs into, and handles, the same error
+                logger.exception("Error requesting feed of saved search %s",
+                                 search.pk)
+        emails.append((obj, keys))
+
     digests = SavedSearchDigest.objects.filter(is_active=True,
                                                user__opt_in_myjobs=True,
                                                user__is_disabled=False)
     digests = filter_by_time(digests)
     for obj in digests:
-        send_search_digest.s(obj).apply_async()
+        add_email(obj, obj.user.savedsearch_set.filter(is_active=True))
 
     not_digest = SavedSearchDigest.objects.filter(is_active=False,
                                                   user__opt_in_myjobs=True,
@@ -184,7 +213,27 @@ def send_search_digests():
         saved_searches = item.user.savedsearch_set.filter(is_active=True)
         saved_searches = filter_by_time(saved_searches)
         for search_obj in saved_searches:
-            send_search_digest.s(search_obj).apply_async()
+            add_email(search_obj, [search_obj])
+
+    # Each email is queued as soon as all of its feeds have been fetched. Its
+    # task reads them from the cache, so only the run id is sent along.
+    waiting = {}
+    for email in emails:
+        for key in email[1]:
+            waiting.setdefault(key, []).append(email)
+    remaining = dict((id(email), len(email[1])) for email in emails)
+
+    def queue(email):
+        send_search_digest.s(email[0], feed_run=feeds.run).apply_async()
+
+    for email in emails:
+        if not email[1]:
+            queue(email)
+    for key in feeds.fetch(settings.SAVED_SEARCH_FEED_WORKERS):
+        for email in waiting.pop(key, []):
+            remaining[id(email)] -= 1
+            if not remaining[id(email)]:
+                queue(email)
 
 
 @task(name='task.delete_inactive_activations', ignore_result=True)
@@ -306,7 +355,7 @@ def process_batch_events():
 def update_solr_task(solr_location=None):
     """
     Deletes all items scheduled for deletion, and then adds all items
-    scheduled to be added to solr.
+    scheduled to be added to solr (see solr.sync.sync_updates).
 
     Inputs:
     :solr_location: Dict of separate cores to be updated
@@ -315,48 +364,7 @@ def update_solr_task(solr_location=None):
         solr_location = settings.TEST_SOLR_INSTANCE
     elif solr_location is None:
         solr_location = settings.SOLR
-    objs = Update.objects.filter(delete=True).values_list('uid', flat=True)
-
-    if objs:
-        objs = split_list(objs, 1000)
-        for obj_list in objs:
-            obj_list = filter(None, list(obj_list))
-            uid_list = " OR ".join(obj_list)
-            for location in solr_location.values():
-                solr = pysolr.Solr(location)
-                solr.delete(q="uid:(%s)" % uid_list)
-        Update.objects.filter(delete=True).delete()
-
-    objs = Update.objects.filter(delete=False)
-    updates = []
-
-    for obj in objs:
-        content_type, key = obj.uid.split("##")
-        model = ContentType.objects.get_for_id(content_type).model_class()
-        if model == SavedSearch:
-            search = model.objects.get(pk=key)
-            # Saved search recipients can currently be null; Displaying these
-            # searches may be implemented in the future but will likely require
-            # some template work.
-            if search.user:
-                updates.append(object_to_dict(model, search))
-        # If the user is being updated, because the user is stored on the
-        # SavedSearch document, every SavedSearch belonging to that user
-        # also has to be updated.
-        elif model == User:
-            searches = SavedSearch.objects.filter(user_id=key)
-            [updates.append(object_to_dict(SavedSearch, s)) for s in searches]
-            updates.append(object_to_dict(model, model.objects.get(pk=key)))
-        else:
-            updates.append(profileunits_to_dict(key))
-
-    updates = split_list(updates, 1000)
-    for location in solr_location.values():
-        solr = pysolr.Solr(location)
-        for update_subset in updates:
-            update_subset = filter(None, list(update_subset))
-            solr.add(list(update_subset))
-    objs.delete()
+    solr_sync.sync_updates(solr_location.values())
 
 
 def split_list(l, list_len, fill_val=None):
@@ -377,46 +385,38 @@ def split_list(l, list_len, fill_val=None):
     return izip_longest(fillvalue=fill_val, *args)
 
 
-@task(name="tasks.reindex_solr", ignore_result=True)
-def task_reindex_solr(solr_location=None):
+@task(name="tasks.reindex_solr", ignore_result=True,
+      default_retry_delay=60, max_retries=5)
+def task_reindex_solr(solr_location=None, start_after=0):
     """
-    Adds all ProfileUnits, Users, and SavedSearches to solr.
+    Adds all ProfileUnits, Users, and SavedSearches to solr, a batch of users
+    at a time (see solr.sync.reindex). If the reindex fails, it's retried
+    from the last batch that was sent.
 
     Inputs:
     :solr_location: Dict of separate cores to be updated (Optional);
         defaults to the default instance from settings
+    :start_after: Only add users with a greater id, and their
+        ProfileUnits and SavedSearches (Optional)
     """
     if solr_location is None:
         solr_location = settings.SOLR
-    l = []
-
-    u = User.objects.all().values_list('id', flat=True)
-    for x in u:
-        l.append(profileunits_to_dict(x))
-
-    s = SavedSearch.objects.filter(user__isnull=False)
-    for x in s:
-        saved_search_dict = object_to_dict(SavedSearch, x)
-        saved_search_dict['doc_type'] = 'savedsearch'
-        l.append(saved_search_dict)
-
-    u = User.objects.all()
-    for x in u:
-        l.append(object_to_dict(User, x))
-
-    l = split_list(l, 1000)
 
-    for location in solr_location.values():
-        solr = pysolr.Solr(location)
-        for x in l:
-            x = filter(None, list(x))
-            solr.add(x)
+    try:
+        for start_after in solr_sync.reindex(solr_location.values(),
+                                             start_after):
+            pass
+    except Exception as e:
+        logging.error("Error reindexing solr after user %s", start_after)
+        logging.exception(e)
+        raise task_reindex_solr.retry(
+            kwargs={'solr_location': solr_location,
+                    'start_after': start_after}, exc=e)
 
 
-def parse_log(logs, solr_location):
+def parse_log(logs, solr_location, batch_size=5000):
     """
-    Turns a list of boto keys into a list of dicts, with each dict representing
-    a line from the keys
+    Reads analytics and redirect logs and stores each human hit in solr
 
     Inputs:
     :logs: List of logs generated by boto that reference files on s3
@@ -429,22 +429,30 @@ def parse_log(logs, solr_location):
 
     :solr_location: Dict of separate cores to be updated (Optional);
         defaults to the default instance from settings
+    :batch_size: Number of hits whose users and companies are looked up, and
+        which are sent to solr, at once
+
+    Outputs:
+    :reports: Dict mapping each log's key to a dict containing the number of
+        lines that were 'parsed', skipped as 'bots' or 'failed', and the
+        number of resulting documents that solr refused ('unsaved')
     """
-    # Logs are potentially very large. If we are going to look up the company
-    # associated with each hit, we should memoize the ids.
-    log_memo = {}
+    # Logs are potentially very large and the same users, business units
+    # and domains show up over and over; memoize their lookups across all of
+    # the logs being processed.
+    memo = {'users': {}, 'companies': {}, 'bots': {}}
+    solrs = [pysolr.Solr(location) for location in solr_location.values()]
+    reports = {}
 
     for log in logs:
-        to_solr = []
-        path = '/tmp/parse_log'
-        # Ensure local temp storage for log files exists
-        try:
-            os.mkdir(path)
-        except OSError:
-            if not os.path.isdir(path):
-                raise
-        f = open('%s/%s' % (path, uuid.uuid4().hex), 'w+')
-        try:
+        report = {'parsed': 0, 'bots': 0, 'failed': 0, 'unsaved': 0}
+        reports[log.key] = report
+        redirect = 'redirect' in log.key
+        batch = []
+
+        # Small logs never touch the disk; larger ones are spooled to a
+        # temporary file that is removed as soon as it is closed.
+        with tempfile.SpooledTemporaryFile(max_size=LOG_SPOOL_SIZE) as f:
             log.get_contents_to_file(f)
             f.seek(0)
 
@@ -454,155 +462,224 @@ def parse_log(logs, solr_location):
                     # the log format; if we see this, ignore it
                     continue
 
-                # line in f does not strip newlines if they exist
-                line = line.rstrip('\n')
-                line = line.split(' ')
-
-                # reconstruct date and time
-                line[0] = '%s %s' % (line[0], line[1])
-                # turn date and time into a datetime object
-                line[0] = datetime.strptime(line[0], '%Y-%m-%d %H:%M:%S')
-                # remove the time portion, which is now merged with the date
-                del line[1]
-
-                # reconstruct user agent
-                # and remove it from the line
-                if 'redirect' in log.key:
-                    ua = ' '.join(line[9:-7])
-                    del line[9:-7]
-                else:
-                    ua = line[8]
-                    del line[8]
-
-                if not helpers.is_bot(ua):
-                    # Only track hits that come from actual users
-                    update_dict = {
-                        'view_date': line[0],
-                        'doc_type': 'analytics',
-                    }
-
-                    # Make sure the value for a given key is only a list if
-                    # there are multiple elements
-                    qs = dict((k, v if len(v) > 1 else v[0])
-                              for k, v in urlparse.parse_qs(
-                                  line[4]).iteritems())
-
-                    if 'redirect' in log.key:
-                        aguid = qs.get('jcnlx.aguid', '')
-                        myguid = qs.get('jcnlx.myguid', '')
-                        update_dict['view_source'] = qs.get('jcnlx.vsid', 0)
-                        update_dict['job_view_buid'] = qs.get('jcnlx.buid', '0')
-
-                        # GUID is the path portion of this line, which starts
-                        # with a '/'; Remove it
-                        update_dict['job_view_guid'] = line[3][1:]
-                        update_dict['page_category'] = 'redirect'
-                        domain = qs.get('jcnlx.ref', '')
-                        domain = urlparse.urlparse(domain).netloc
-                        update_dict['domain'] = domain
-                    else:
-                        aguid = qs.get('aguid', '')
-                        myguid = qs.get('myguid', '')
-                        update_dict['view_source'] = qs.get('jvs', 0)
-                        update_dict['job_view_buid'] = qs.get('jvb', '0')
-                        update_dict['job_view_guid'] = qs.get('jvg', '')
-                        update_dict['page_category'] = qs.get('pc', '')
-
-                        # These fields are only set in analytics logs
-                        update_dict['domain'] = qs.get('d', '')
-                        update_dict['facets'] = qs.get('f', '')
-                        update_dict['job_view_title_exact'] = qs.get('jvt', '')
-                        update_dict['job_view_company_exact'] = qs.get('jvc', '')
-                        update_dict['job_view_location_exact'] = qs.get('jvl', '')
-                        update_dict['job_view_canonical_domain'] = qs.get('jvcd', '')
-                        update_dict['search_location'] = qs.get('sl', '')
-                        update_dict['search_query'] = qs.get('sq', '')
-                        update_dict['site_tag'] = qs.get('st', '')
-                        update_dict['special_commitment'] = qs.get('sc', '')
-
-                    # Handle logs containing the old aguid/myguid formats
-                    aguid = aguid.replace('{', '').replace('}', '').replace('-', '')
-                    update_dict['aguid'] = aguid
-
-                    myguid = myguid.replace('-', '')
-
-                    if myguid:
-                        try:
-                            user = User.objects.get(user_guid=myguid)
-                        except User.DoesNotExist:
-                            update_dict['User_user_guid'] = ''
-                        else:
-                            update_dict.update(object_to_dict(User, user))
-
-                    buid = update_dict['job_view_buid']
-                    domain = update_dict.get('domain', None)
-                    if not (buid in log_memo or domain in log_memo):
-                        # We haven't seen this buid or domain before
-                        if buid == '0' and domain is not None:
-                            # Retrieve company id via domain
-                            try:
-                                site = SeoSite.objects.get(domain=domain)
-                                company_id = site.business_units.values_list(
-                                    'company__pk', flat=True)[0]
-                            except (SeoSite.DoesNotExist,
-                                    IndexError):
-                                # SeoSite.DoesNotExist: Site does not exist
-                                #   with the given domain
-                                # IndexError: SeoSite exists, but is not
-                                #   associated with business units or companies
-                                company_id = 999999
-                            key = domain
-                        else:
-                            # Retrieve company id via buid
-                            try:
-                                # See if there is a company associated with it
-                                company_id = Company.objects.filter(
-                                    job_source_ids=buid)[0].pk
-                            except IndexError:
-                                # There is not; default to DirectEmployers
-                                # Association
-                                company_id = 999999
-                            key = buid
-
-                        # The defining feature of a given document will either
-                        # be the domain or the buid.
-                        # Our memoization dict will have the following structure
-                        # {str(buid): int(company_id),
-                        #  str(domain): int(company_id)}
-                        log_memo[key] = company_id
-
-                    # By this point, we are guaranteed that the correct key is
-                    # in log_memo; pull the company id from the memo dict.
-                    if domain is not None and domain in log_memo:
-                        update_dict['company_id'] = log_memo[domain]
-                    else:
-                        update_dict['company_id'] = log_memo[buid]
-
-                    update_dict['uid'] = 'analytics##%s#%s' % \
-                                         (update_dict['view_date'], aguid)
-                    to_solr.append(update_dict)
-        except Exception:
-            # There may be more logs to process, don't propagate the exception
-            pass
-        finally:
-            # remove the file from the filesystem to ensure we don't fill the
-            # drive (again)
-            f.close()
-            os.remove(f.name)
-
-        # Ensure all hits get recorded by breaking a potentially massive list
-        # down into something that solr can manage
-        subsets = split_list(to_solr, 500)
-        for location in solr_location.values():
-            solr = pysolr.Solr(location)
-            for subset in subsets:
                 try:
-                    subset = filter(None, subset)
-                    solr.add(subset)
-                except pysolr.SolrError:
-                    # There is something wrong with this chunk of data. It's
-                    # better to lose 500 documents than the entire file
-                    pass
+                    hit = _parse_log_line(line, redirect, memo['bots'])
+                except (ValueError, IndexError):
+                    report['failed'] += 1
+                    logger.debug("Could not parse line in %s: %r",
+                                 log.key, line)
+                    continue
+
+                if hit is None:
+                    report['bots'] += 1
+                    continue
+
+                report['parsed'] += 1
+                batch.append(hit)
+                if len(batch) >= batch_size:
+                    report['unsaved'] += _save_log_batch(batch, memo, solrs)
+                    batch = []
+
+        if batch:
+            report['unsaved'] += _save_log_batch(batch, memo, solrs)
+
+        logger.info("Parsed %s: %s parsed, %s bots, %s failed, %s unsaved",
+                    log.key, report['parsed'], report['bots'],
+                    report['failed'], report['unsaved'])
+    return reports
+
+
+def _parse_log_line(line, redirect, bot_memo):
+    """
+    Turns one line of an analytics or redirect log into a partial solr
+    document.
+
+    Inputs:
+    :line: Line from the log
+    :redirect: Whether the line comes from a redirect log
+    :bot_memo: Dict memoizing helpers.is_bot for each user agent
+
+    Outputs:
+    :hit: None if the hit came from a bot, otherwise a tuple of the solr
+        document (lacking user and company information) and the myguid of
+        the user, if any
+
+    Raises ValueError or IndexError if the line is malformed.
+    """
+    # line in f does not strip newlines if they exist
+    line = line.rstrip('\n').split(' ')
+
+    # reconstruct user agent
+    if redirect:
+        ua = ' '.join(line[10:-7])
+    else:
+        ua = line[9]
+    if ua not in bot_memo:
+        bot_memo[ua] = helpers.is_bot(ua)
+    if bot_memo[ua]:
+        # Only track hits that come from actual users
+        return None
+
+    # Date and time are the first two fields; slicing them is far cheaper
+    # than datetime.strptime
+    day, time_ = line[0], line[1]
+    view_date = datetime(int(day[0:4]), int(day[5:7]), int(day[8:10]),
+                         int(time_[0:2]), int(time_[3:5]), int(time_[6:8]))
+    update_dict = {
+        'view_date': view_date,
+        'doc_type': 'analytics',
+    }
+
+    # Make sure the value for a given key is only a list if
+    # there are multiple elements
+    qs = dict((k, v if len(v) > 1 else v[0])
+              for k, v in urlparse.parse_qs(line[5]).iteritems())
+
+    if redirect:
+        aguid = qs.get('jcnlx.aguid', '')
+        myguid = qs.get('jcnlx.myguid', '')
+        update_dict['view_source'] = qs.get('jcnlx.vsid', 0)
+        update_dict['job_view_buid'] = qs.get('jcnlx.buid', '0')
+
+        # GUID is the path portion of this line, which starts
+        # with a '/'; Remove it
+        update_dict['job_view_guid'] = line[4][1:]
+        update_dict['page_category'] = 'redirect'
+        domain = qs.get('jcnlx.ref', '')
+        domain = urlparse.urlparse(domain).netloc
+        update_dict['domain'] = domain
+    else:
+        aguid = qs.get('aguid', '')
+        myguid = qs.get('myguid', '')
+        update_dict['view_source'] = qs.get('jvs', 0)
+        update_dict['job_view_buid'] = qs.get('jvb', '0')
+        update_dict['job_view_guid'] = qs.get('jvg', '')
+        update_dict['page_category'] = qs.get('pc', '')
+
+        # These fields are only set in analytics logs
+        update_dict['domain'] = qs.get('d', '')
+        update_dict['facets'] = qs.get('f', '')
+        update_dict['job_view_title_exact'] = qs.get('jvt', '')
+        update_dict['job_view_company_exact'] = qs.get('jvc', '')
+        update_dict['job_view_location_exact'] = qs.get('jvl', '')
+        update_dict['job_view_canonical_domain'] = qs.get('jvcd', '')
+        update_dict['search_location'] = qs.get('sl', '')
+        update_dict['search_query'] = qs.get('sq', '')
+        update_dict['site_tag'] = qs.get('st', '')
+        update_dict['special_commitment'] = qs.get('sc', '')
+
+    # Handle logs containing the old aguid/myguid formats
+    aguid = aguid.replace('{', '').replace('}', '').replace('-', '')
+    update_dict['aguid'] = aguid
+
+    myguid = myguid.replace('-', '')
+    return update_dict, myguid
+
+
+def _save_log_batch(batch, memo, solrs):
+    """
+    Adds user and company information to a batch of parsed hits, looking up
+    anything not already memoized with one query per type, and sends the
+    resulting documents to solr.
+
+    Inputs:
+    :batch: List of (update_dict, myguid) tuples from _parse_log_line
+    :memo: Dict of 'users' (lowercase myguid: solr dict of the user or
+        None) and 'companies' (buid or domain: company id) memos, updated
+        in place
+    :solrs: List of pysolr.Solr instances to add the documents to
+
+    Outputs:
+    :unsaved: Number of documents that solr refused
+    """
+    users = memo['users']
+    companies = memo['companies']
+
+    # Guids are matched case-insensitively by the database, so they're
+    # memoized in lowercase.
+    myguids = set(myguid.lower() for _, myguid in batch
+                  if myguid and myguid.lower() not in users)
+    if myguids:
+        for user in User.objects.filter(user_guid__in=myguids):
+            users[user.user_guid.lower()] = object_to_dict(User, user)
+        for myguid in myguids:
+            users.setdefault(myguid, None)
+
+    # The defining feature of a given hit is either its buid or, if it
+    # has none, its domain.
+    # Our memoization dict will have the following structure
+    # {str(buid): int(company_id),
+    #  str(domain): int(company_id)}
+    buids = set()
+    domains = set()
+    for update_dict, _ in batch:
+        key = _company_memo_key(update_dict)
+        if key not in companies:
+            if update_dict['job_view_buid'] == '0':
+                domains.add(key)
+            else:
+                buids.add(key)
+
+    if buids:
+        # Only numeric buids can match a business unit; anything else
+        # falls back to DirectEmployers Association below
+        ids = [int(buid) for buid in buids if buid.isdigit()]
+        if ids:
+            found = Company.objects.filter(
+                job_source_ids__in=ids).values_list('job_source_ids', 'pk')
+            for buid, company_id in found:
+                companies.setdefault(str(buid), company_id)
+    if domains:
+        found = SeoSite.objects.filter(domain__in=domains).values_list(
+            'domain', 'business_units__company__pk')
+        for domain, company_id in found:
+            if company_id is not None:
+                companies.setdefault(domain, company_id)
+    for key in buids | domains:
+        # Site or business unit does not exist, or is not associated with
+        # a company; default to DirectEmployers Association
+        companies.setdefault(key, 999999)
+
+    docs = []
+    for update_dict, myguid in batch:
+        if myguid:
+            user_dict = users[myguid.lower()]
+            if user_dict is None:
+                update_dict['User_user_guid'] = ''
+            else:
+                update_dict.update(user_dict)
+        update_dict['company_id'] = companies[
+            _company_memo_key(update_dict)]
+        update_dict['uid'] = 'analytics##%s#%s' % (update_dict['view_date'],
+                                                   update_dict['aguid'])
+        docs.append(update_dict)
+
+    # Ensure all hits get recorded by breaking a potentially massive list
+    # down into something that solr can manage
+    unsaved = 0
+    for solr in solrs:
+        for subset in split_list(docs, 500):
+            subset = filter(None, subset)
+            try:
+                solr.add(subset)
+            except pysolr.SolrError:
+                # There is something wrong with this chunk of data. It's
+                # better to lose 500 documents than the entire file
+                logger.error("Solr rejected %s analytics documents",
+                             len(subset), exc_info=True)
+                unsaved += len(subset)
+    return unsaved
+
+
+def _company_memo_key(update_dict):
+    """
+    Returns the key under which the company for a parsed hit is memoized:
+    its buid, or its domain if it doesn't have one.
+    """
+    buid = update_dict['job_view_buid']
+    if buid == '0':
+        return update_dict.get('domain', '')
+    return buid
 
 
 @task(name="tasks.delete_old_analytics_docs", ignore_result=True)
@@ -702,6 +779,7 @@ def task_update_solr(jsid, **kwargs):
     except:
         logging.error(traceback.format_exc(sys.exc_info()))
         raise task_update_solr.retry()
+    schedule_replicated_updates(buid=jsid)
 
 
 @task(name='tasks.etl_to_solr', ignore_result=True, send_error_emails=True)
@@ -712,6 +790,7 @@ def task_etl_to_solr(guid, buid, name):
         logging.error("Error loading jobs for jobsource: %s", guid)
         logging.exception(e)
         raise task_etl_to_solr.retry()
+    schedule_replicated_updates(buid=buid)
 
 
 @task(name='tasks.priority_etl_to_solr', ignore_result=True)
@@ -722,6 +801,148 @@ def task_priority_etl_to_solr(guid, buid, name):
         logging.error("Error loading jobs for jobsource: %s", guid)
         logging.exception(e)
         raise task_priority_etl_to_solr.retry()
+    schedule_replicated_updates(buid=buid)
+
+
+@task(name='tasks.update_custom_facet_counts', ignore_result=True)
+def task_update_custom_facet_counts(buid=None, site_ids=None):
+    """
+    Precomputes the custom facet counts of sites with standard facets (see
+    seo.cache.materialize_custom_facet_counts).
+
+    Inputs:
+        :buid: Only update sites that include this business unit, or that
+               include every business unit
+        :site_ids: Only update these sites
+
+    """
+    sites = SeoSite.objects.filter(
+        seositefacet__facet_type=SeoSiteFacet.STANDARD)
+    if buid is not None:
+        sites = sites.filter(pk__in=_sites_with_buid(buid))
+    if site_ids is not None:
+        sites = sites.filter(pk__in=site_ids)
+
+    for site in sites.distinct():
+        try:
+            materialize_custom_facet_counts(site)
+        except Exception as e:
+            logging.error("Error counting custom facets for site: %s",
+                          site.domain)
+            logging.exception(e)
+
+
+def schedule_replicated_updates(buid):
+    """
+    Updates the custom facet counts, autocomplete suggestions, company
+    directories and sitemaps of the sites that include a business unit once
+    its newly imported jobs have been replicated.
+
+    """
+    task_update_custom_facet_counts.apply_async(
+        kwargs={'buid': buid}, countdown=settings.SOLR_REPLICATION_DELAY)
+    task_update_autocomplete.apply_async(
+        kwargs={'buid': buid}, countdown=settings.SOLR_REPLICATION_DELAY)
+    task_update_company_directories.apply_async(
+        kwargs={'buid': buid}, countdown=settings.SOLR_REPLICATION_DELAY)
+    if settings.BUILD_SITEMAPS:
+        task_build_sitemaps.apply_async(
+            kwargs={'buid': buid}, countdown=settings.SOLR_REPLICATION_DELAY)
+
+
+def _sites_with_buid(buid):
+    """
+    Returns the sites that include a business unit, or that include every
+    business unit.
+
+    """
+    return SeoSite.objects.filter(Q(business_units=buid) |
+                                  Q(business_units__isnull=True))
+
+
+@task(name='tasks.update_company_directories', ignore_result=True)
+def task_update_company_directories(buid=None, site_ids=None):
+    """
+    Rebuilds the company directories of sites (see
+    seo.cache.materialize_company_directory).
+
+    Inputs:
+        :buid: Only update sites that include this business unit, or that
+               include every business unit
+        :site_ids: Only update these sites
+
+    """
+    sites = SeoSite.objects.all()
+    if buid is not None:
+        sites = _sites_with_buid(buid)
+    if site_ids is not None:
+        sites = sites.filter(pk__in=site_ids)
+
+    for site in sites.distinct():
+        try:
+            materialize_company_directory(site)
+        except Exception as e:
+            logging.error("Error building company directory for site: %s",
+                          site.domain)
+            logging.exception(e)
+
+
+@task(name='tasks.update_autocomplete', ignore_result=True)
+def task_update_autocomplete(buid=None, site_ids=None):
+    """
+    Counts the autocomplete suggestions of sites (see
+    seo.autocomplete.build_site_autocomplete).
+
+    Inputs:
+        :buid: Only update sites that include this business unit, or that
+               include every business unit
+        :site_ids: Only update these sites
+
+    """
+    sites = SeoSite.objects.all()
+    if buid is not None:
+        sites = _sites_with_buid(buid)
+    if site_ids is not None:
+        sites = sites.filter(pk__in=site_ids)
+
+    for site in sites.distinct():
+        try:
+            build_site_autocomplete(site)
+        except Exception as e:
+            logging.error("Error counting autocomplete suggestions for "
+                          "site: %s", site.domain)
+            logging.exception(e)
+
+
+@task(name='tasks.build_sitemaps', ignore_result=True)
+def task_build_sitemaps(buid=None, site_ids=None):
+    """
+    Brings the built sitemaps of sites up to date (see
+    seo.sitemap.build_site_sitemaps), and submits those that changed to
+    Google.
+
+    Inputs:
+        :buid: Only update sites that include this business unit, or that
+               include every business unit
+        :site_ids: Only update these sites
+
+    """
+    sites = SeoSite.objects.all()
+    if buid is not None:
+        sites = _sites_with_buid(buid)
+    if site_ids is not None:
+        sites = sites.filter(pk__in=site_ids)
+
+    for site in sites.distinct():
+        try:
+            changed = build_site_sitemaps(site)
+        except Exception as e:
+            logging.error("Error building sitemaps for site: %s",
+                          site.domain)
+            logging.exception(e)
+        else:
+            if changed:
+                task_submit_sitemap.delay(site.domain)
 
 
 @task(name="tasks.task_clear_solr", ignore_result=True)
@@ -745,11 +966,20 @@ def task_submit_sitemap(domain):
     ping_google('http://{d}/sitemap.xml'.format(d=domain))
 
 
-@task(name="tasks.task_submit_all_sitemaps", ignore_result=True)
+@task(name="tasks.submit_all_sitemaps", ignore_result=True)
 def task_submit_all_sitemaps():
-    sites = SeoSite.objects.all()
-    for site in sites:
-        task_submit_sitemap.delay(site.domain)
+    """
+    Brings every site's built sitemaps up to date each day, as the index
+    moves on to a new day. Only the sites whose sitemaps changed are
+    submitted to Google. Without BUILD_SITEMAPS, every site is submitted.
+
+    """
+    if not settings.BUILD_SITEMAPS:
+        for site in SeoSite.objects.all():
+            task_submit_sitemap.delay(site.domain)
+        return
+    for site_id in SeoSite.objects.values_list('pk', flat=True):
+        task_build_sitemaps.delay(site_ids=[site_id])
 
 
 def get_event_list(events):
@@ -193,7 +193,7 @@ def transform_for_postajob(job):
     return solr_job
 
 
-def hr_xml_to_json(xml, business_unit):
+def hr_xml_to_json(xml, business_unit, moc_resolver=None):
     """
     Cleans a job coming from an HR-XML document. This should add any
     required fields, and re-format any fields that are not coming in
@@ -207,6 +207,9 @@ def hr_xml_to_json(xml, business_unit):
         :business unit: the business unit the job is coming from
         :create_redirect: flags whether or not a redirect for the job link
                           should be added to the redirect table
+        :moc_resolver: an optional xmlparse.MocResolver for business_unit,
+                       shared by every job in an import so that MOCs are
+                       not looked up one job at a time
 
     outputs:
         A solr-ready job as a dictionary
@@ -348,14 +351,17 @@ def hr_xml_to_json(xml, business_unit):
     job['onet'] = job['onet_exact'] = list(onets)
 
     # Standard Mocs
-    mocs = DEJobFeed.job_mocs({'onet_code': job['onet']})
-    moc_tups = DEJobFeed.moc_data(mocs)
+    if moc_resolver is not None:
+        moc_tups = moc_resolver.moc_data(job['onet'])
+    else:
+        mocs = DEJobFeed.job_mocs({'onet_code': job['onet']})
+        moc_tups = DEJobFeed.moc_data(mocs)
     job['moc'] = job['moc_exact'] = moc_tups.codes
     job['moc_slab'] = job['moc_slab_exact'] = moc_tups.slabs
     job['mocid'] = moc_tups.ids
 
     # Mapped Mocs
-    mapped_moc_tup = get_mapped_mocs(business_unit, onets)
+    mapped_moc_tup = get_mapped_mocs(business_unit, onets, moc_resolver)
     job['mapped_moc'] = job['mapped_moc_exact'] = mapped_moc_tup.codes
     job['mapped_moc_slab'] = job['mapped_moc_slab_exact'] = mapped_moc_tup.slabs
     job['mapped_mocid'] = mapped_moc_tup.ids
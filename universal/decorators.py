@@ -1,13 +1,13 @@
 from functools import partial, wraps
 
 from django.core.urlresolvers import reverse
-from django.conf import settings
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 
 from myjobs.models import User
 from universal.helpers import build_url, get_company
+from universal.site_settings import site_settings
 
 
 def company_has_access(perm_field):
@@ -55,7 +55,7 @@ def company_in_sitepackages(view_func):
     @wraps(view_func)
     def wrap(request, *args, **kwargs):
         if not request.user.is_anonymous() and not request.user.can_access_site(
-                settings.SITE):
+                site_settings.SITE):
             raise Http404
 
         return view_func(request, *args, **kwargs)
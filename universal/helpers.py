@@ -10,6 +10,8 @@ from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.core.mail import EmailMessage
 from django.http import QueryDict
 
+from universal.site_settings import site_settings
+
 
 def update_url_param(url, param, new_val):
     """
@@ -93,10 +95,10 @@ def get_company(request):
     if not request.user or request.user.is_anonymous():
         return None
 
-    # If settings.SITE is set we're on a microsite, so get the company
+    # If site_settings.SITE is set we're on a microsite, so get the company
     # based on the microsite we're on instead.
-    if settings.SITE.canonical_company:
-        company = settings.SITE.canonical_company
+    if site_settings.SITE.canonical_company:
+        company = site_settings.SITE.canonical_company
 
         if company.companyuser_set.filter(user=request.user).exists():
             return company
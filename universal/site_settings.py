@@ -0,0 +1,125 @@
+"""
+Settings that belong to the site of the current request.
+
+MultiHostMiddleware used to store the current site's settings (SITE,
+SITE_BUIDS, DEFAULT_FACET, etc.) on django.conf.settings, which is shared by
+every thread in the process. They are now kept for the current thread (or
+greenlet, once gevent has patched threading) only, and are read through
+`site_settings`:
+
+    from universal.site_settings import site_settings
+
+    buids = site_settings.SITE_BUIDS
+
+Anything that hasn't been set for the current thread falls back to
+django.conf.settings, so code running outside of a request still sees the
+defaults.
+
+This module is imported by the settings themselves (see SiteID), so it must
+not import anything that needs them to be configured.
+
+"""
+from contextlib import contextmanager
+import threading
+
+from django.conf import settings
+
+
+_local = threading.local()
+
+
+def _values():
+    try:
+        return _local.values
+    except AttributeError:
+        _local.values = {}
+        return _local.values
+
+
+def activate(values):
+    """
+    Replaces the current thread's site settings with `values`, a dictionary
+    of setting names and values.
+
+    """
+    _local.values = dict(values)
+
+
+def deactivate():
+    """Clears the current thread's site settings."""
+    _local.values = {}
+
+
+@contextmanager
+def override(values):
+    """
+    Replaces the current thread's site settings with `values` for the
+    duration of a with block, then restores the previous ones. Used to work
+    with a site's settings outside of a request to it.
+
+    """
+    previous = _values()
+    activate(values)
+    try:
+        yield
+    finally:
+        _local.values = previous
+
+
+class SiteSettings(object):
+    """
+    django.conf.settings, as seen by the current thread. Assigning to an
+    attribute only changes it for the current thread.
+
+    """
+    def __getattr__(self, name):
+        values = _values()
+        if name in values:
+            return values[name]
+        return getattr(settings, name)
+
+    def __setattr__(self, name, value):
+        _values()[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del _values()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+site_settings = SiteSettings()
+
+
+class SiteID(object):
+    """
+    A SITE_ID that is always the current thread's site_settings.SITE_ID, or
+    `default` when it hasn't been set.
+
+    Used as settings.SITE_ID so that the sites framework, and everything
+    built on it (Site.objects.get_current(), flatpages, redirects), follows
+    the current request without SITE_ID being changed for every thread.
+
+    """
+    def __init__(self, default):
+        self.default = default
+
+    def __int__(self):
+        value = _values().get('SITE_ID', self.default)
+        if isinstance(value, SiteID):
+            value = value.default
+        return int(value)
+
+    def __hash__(self):
+        return hash(int(self))
+
+    def __eq__(self, other):
+        return int(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(int(self))
+
+    __str__ = __repr__
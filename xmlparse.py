@@ -47,20 +47,30 @@ class JobFeed(object):
     datetime_pattern -- A string specifying the format of the datetime
     data in the feed. Should conform to the specification outlined here:
     http://docs.python.org/library/time.html#time.strftime
+    stream -- Boolean. If True, the feed is never loaded into a full DOM.
+    The file is validated and scanned once with `etree.iterparse` for its
+    document-level fields and job uids, and `iter_solr_jobs` parses it
+    again one job node at a time, discarding each node once it has been
+    turned into a Solr document.
     """
     def __init__(self, filepath, js_field=None, crawl_field=None, node_tag=None,
                  datetime_pattern=None, jsid=None, schema=None, markdown=True,
-                 company=None):
+                 company=None, stream=False):
         if None in (js_field, crawl_field, datetime_pattern):
             raise AttributeError("You must specify valid values for js_field, "
                                  "datetime_pattern and crawl_field.")
         self.filepath = filepath
         self.bu_mapped_mocs = None
-        self.parser = etree.XMLParser(recover=False, schema=schema)
-        self.doc = etree.parse(self.filepath, self.parser)
+        self.node_tag = node_tag
+        self.stream = stream
+        self.job_uids = []
+        if stream:
+            self.doc = self.scan_doc(schema)
+        else:
+            self.parser = etree.XMLParser(recover=False, schema=schema)
+            self.doc = etree.parse(self.filepath, self.parser)
         self.datetime_pattern = datetime_pattern
         self.jsid = jsid
-        self.node_tag = node_tag
         self.job_source_name = self.unescape(self.parse_doc(js_field))
         self.crawled_date = get_strptime(self.parse_doc(crawl_field),
                                          self.datetime_pattern)
@@ -75,6 +85,7 @@ class JobFeed(object):
 
         self.bu = (get_object_or_none(BusinessUnit, pk=self.jsid)
                    if self.jsid is not None else None)
+        self.moc_resolver = MocResolver(self.jsid)
 
 
     def jobparse(self):
@@ -96,8 +107,66 @@ class JobFeed(object):
         This method must return a list of dictionaries from solr_job_dict.
 
         """
-        return [self.solr_job_dict(node) for node in
-                self.doc.find(self.node_tag).iterchildren()]
+        return list(self.iter_solr_jobs())
+
+    def iter_solr_jobs(self):
+        """
+        Yields the dictionaries from solr_job_dict one job at a time. In
+        streaming mode only the job node currently being converted is held
+        in memory.
+
+        """
+        if self.stream:
+            context = etree.iterparse(self.filepath, events=('end',))
+            nodes = self.iter_job_nodes(context)
+        else:
+            nodes = self.doc.find(self.node_tag).iterchildren()
+        for node in nodes:
+            yield self.solr_job_dict(node)
+
+    def iter_job_nodes(self, context):
+        """
+        Yields each job node (the children of `node_tag`) from an
+        `etree.iterparse` context as soon as it has been completely read.
+
+        Once the caller is done with a node it is cleared and removed from
+        the tree along with any preceding siblings, so memory use does not
+        grow with the number of jobs in the feed. Everything outside of
+        `node_tag` is left intact and is available from `context.root`
+        once iteration has finished.
+
+        """
+        for event, elem in context:
+            parent = elem.getparent()
+            if parent is None or parent.tag != self.node_tag:
+                continue
+            yield elem
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    def scan_doc(self, schema=None):
+        """
+        Makes a single validating pass over the feed file in streaming mode.
+        Records the uid of every job in `self.job_uids` and returns an
+        ElementTree containing only the document-level tags, so that
+        `parse_doc` works the same way it does on a fully parsed feed.
+
+        A validation failure raises `etree.XMLSyntaxError`; the details are
+        in `self.parser.error_log`, as they are for a full parse.
+
+        """
+        self.parser = etree.iterparse(self.filepath, events=('end',),
+                                      schema=schema)
+        for node in self.iter_job_nodes(self.parser):
+            uid = node.find('uid')
+            if uid is not None:
+                self.job_uids.append(uid.text)
+        root = self.parser.root
+        jobs = root.find(self.node_tag)
+        if jobs is not None:
+            jobs.clear()
+        return etree.ElementTree(root)
 
     @staticmethod
     def moc_data(mocs):
@@ -343,9 +412,9 @@ class DEJobFeed(JobFeed):
         city_slab = self.city_slab(job_node)
         state_slab = self.state_slab(job_node)
         title_slab = self.title_slab(job_node)
-        mocs = self.job_mocs(job_node)
-        moc_tups = self.moc_data(mocs)
-        mapped_moc_tups = self.mapped_mocs(mocs, job_node)
+        moc_tups = self.moc_resolver.moc_data(job_node['onet_code'])
+        mapped_moc_tups = self.moc_resolver.mapped_moc_data(
+            job_node['onet_code'])
         
         job_dict['job_source_name'] = self.job_source_name
         job_dict['buid'] = self.jsid 
@@ -483,6 +552,9 @@ class DEv2JobFeed(DEJobFeed):
             self.error_messages = []
 
     def jobparse(self):
+        if self.stream:
+            return [{'uid': self.unescape(uid)} for uid in self.job_uids]
+
         joblist = []
         jobs = self.doc.find(self.node_tag).iterchildren()
 
@@ -514,13 +586,20 @@ def guid_from_link(link):
     return url.path.replace("/", "")[:32] if url and url.path else ''
 
 
-def get_mapped_mocs(bu, onets):
+def get_mapped_mocs(bu, onets, moc_resolver=None):
     """For a given job, determine any custom onet mappings that override the 
     defaults.
     Input:
         :bu: The businessUnit this job is associated with
         :onets: The onets associated with this job.
+        :moc_resolver: An optional MocResolver for `bu`. If provided, the
+            mappings are resolved from it instead of the database.
     """
+    if moc_resolver is not None:
+        mappings = set(moc_resolver.custom_mocs(onets))
+        original = set(moc_resolver.job_mocs(onets))
+        return DEJobFeed.moc_data(mappings | original)
+
     original = set(DEJobFeed.job_mocs({'onet_code': onets}))
     content_type = ContentType.objects.get_for_model(BusinessUnit)
     mappings = CustomCareer.objects.filter(object_id=bu.pk,
@@ -528,3 +607,115 @@ def get_mapped_mocs(bu, onets):
                                            onet__in=onets).select_related()
     mappings = set([map.moc for map in mappings])
     return DEJobFeed.moc_data(mappings | original)
+
+
+class MocResolver(object):
+    """
+    Resolves the O*NET codes of the jobs in a single import to MOC data
+    without querying the database once per job.
+
+    The first lookup loads the entire onet->MOC mapping and the business
+    unit's CustomCareer overrides in bulk. The resulting MocData tuples
+    are memoized per distinct set of onets, and are identical to the ones
+    built by `JobFeed.job_mocs`, `JobFeed.mapped_mocs` and
+    `get_mapped_mocs`.
+
+    args:
+    business_unit_id -- The id of the BusinessUnit whose CustomCareer
+    mappings should be applied, or None for no custom mappings.
+
+    """
+    def __init__(self, business_unit_id=None):
+        self.business_unit_id = business_unit_id
+        self.onet_mocs = None
+        self.custom_onet_mocs = None
+        self._moc_data = {}
+        self._mapped_moc_data = {}
+
+    def load(self):
+        """
+        Loads every Moc, the onet->MOC mapping and the business unit's
+        CustomCareer overrides.
+
+        """
+        mocs = dict((moc.id, moc) for moc in
+                    Moc.objects.only('id', 'code', 'branch', 'title'))
+
+        self.onet_mocs = {}
+        onet_mocs = Moc.onets.through.objects.values_list('onet_id', 'moc_id')
+        for onet, moc_id in onet_mocs:
+            self.onet_mocs.setdefault(onet, []).append(mocs[moc_id])
+        # Match the ordering of `Moc.Meta.ordering` so that the results are
+        # the same as those of `JobFeed.job_mocs`.
+        for moc_list in self.onet_mocs.values():
+            moc_list.sort(key=self._ordering)
+
+        self.custom_onet_mocs = {}
+        if self.business_unit_id is not None:
+            content_type = ContentType.objects.get_for_model(BusinessUnit)
+            custom = CustomCareer.objects.filter(
+                object_id=self.business_unit_id,
+                content_type=content_type).select_related('moc')
+            for mapping in custom:
+                self.custom_onet_mocs.setdefault(mapping.onet_id, []).append(
+                    mapping.moc)
+
+    @staticmethod
+    def _ordering(moc):
+        return moc.branch.lower(), moc.code.lower()
+
+    def ensure_loaded(self):
+        if self.onet_mocs is None:
+            self.load()
+
+    def job_mocs(self, onets):
+        """
+        Returns the same list of Moc instances as `JobFeed.job_mocs`,
+        including a Moc once for every one of `onets` it is mapped to.
+
+        """
+        self.ensure_loaded()
+        moc_list = []
+        for onet in set(onets or []):
+            moc_list.extend(self.onet_mocs.get(onet, []))
+        moc_list.sort(key=self._ordering)
+        return moc_list
+
+    def custom_mocs(self, onets):
+        """
+        Returns the set of Mocs the business unit has custom mapped to
+        any of `onets`.
+
+        """
+        self.ensure_loaded()
+        mocs = set()
+        for onet in set(onets or []):
+            mocs.update(self.custom_onet_mocs.get(onet, []))
+        return mocs
+
+    def moc_data(self, onets):
+        """
+        The MocData for the standard onet->MOC mapping of `onets`.
+
+        """
+        key = frozenset(onets or [])
+        if key not in self._moc_data:
+            self._moc_data[key] = JobFeed.moc_data(self.job_mocs(key))
+        return self._moc_data[key]
+
+    def mapped_moc_data(self, onets):
+        """
+        The MocData for `onets` including the business unit's CustomCareer
+        mappings. See `JobFeed.mapped_mocs`.
+
+        """
+        key = frozenset(onets or [])
+        if key not in self._mapped_moc_data:
+            self.ensure_loaded()
+            if not self.custom_onet_mocs:
+                data = self.moc_data(key)
+            else:
+                data = JobFeed.moc_data(set(self.job_mocs(key)) |
+                                        self.custom_mocs(key))
+            self._mapped_moc_data[key] = data
+        return self._mapped_moc_data[key]